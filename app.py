@@ -2,73 +2,552 @@
 DataTrack - Sistema de Conteo de Vehículos con YOLO11
 Servidor Flask principal
 """
-from flask import Flask, render_template, request, jsonify, send_file
+from functools import partial
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, stream_with_context
 import os
 import json
 import uuid
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import threading
-from modules import HardwareOptimizer, VideoProcessor, MultiprocessingManager
+import time
+from modules import JobScheduler, JobStore, ProcessingCancelled
+from modules.job_store import FINISHED_STATUSES
+from modules.metrics import CONTENT_TYPE, REGISTRY, STAGE_SECONDS, Counter, Gauge, Histogram
+from modules.progress import ProgressHub, ProgressMeter
+from modules.results_cache import ParsedResultsLRU, ResultsCache, cache_key
+from modules.timeline import query_timeline, spill_files
+from modules.detection_log import FORMATS as DETECTION_LOG_FORMATS, iter_detection_log
+from modules.uploads import UploadError, UploadManager, read_meta, save_and_hash, write_meta
+from modules.regions import ANCHORS
+from modules.startup import Lazy, Warmup
 import csv
-from io import StringIO, BytesIO
+from io import StringIO
 
 # Configuración
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['RESULTS_FOLDER'] = 'results'
 app.config['MAX_CONTENT_LENGTH'] = 2000 * 1024 * 1024  # 2GB máximo
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024  # Tamaño sugerido de cada parte
+app.config['MODEL_PATH'] = 'yolo11n.pt'
+app.config['MAX_CONCURRENT_JOBS'] = None  # None: según HardwareOptimizer.get_max_jobs()
+app.config['MODEL_POOL_SIZE'] = None  # Modelos por (modelo, dispositivo); None: uno por job simultáneo
+app.config['JOB_TIMEOUT'] = None  # Segundos máximos por job (None: sin límite)
+app.config['CHECKPOINT_EVERY'] = 900  # Frames de video entre checkpoints
+app.config['MAX_STORED_JOBS'] = 500  # Jobs terminados que se conservan
+app.config['MAX_JOB_AGE_DAYS'] = 30
+app.config['PROGRESS_INTERVAL'] = 0.5  # Segundos mínimos entre eventos de progreso
+app.config['RESULTS_CACHE_MAX_BYTES'] = 1024 ** 3  # Tamaño máximo del cache de resultados
+app.config['PARSED_RESULTS_MAX_BYTES'] = 64 * 1024 ** 2  # Resultados parseados en memoria
+app.config['MAX_STREAMS'] = 4  # Streams en vivo simultáneos (cada uno retiene un modelo de su pool)
+app.config['STREAM_MODEL_TIMEOUT'] = 10  # Segundos de espera por un modelo libre al iniciar un stream
+app.config['BATCH_ROOT'] = None  # Directorio del servidor para jobs por lote ('directory'); None: deshabilitado
+app.config['BATCH_PARALLEL'] = 4  # Videos de un lote abiertos a la vez (comparten las pasadas del modelo)
+app.config['MAX_BATCH_VIDEOS'] = 500
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+# Opciones que cada video de un lote puede fijar por su cuenta (p.ej. regiones de su cámara)
+BATCH_VIDEO_OPTIONS = ('regions', 'anchor', 'roi', 'roi_margin')
 
 # Crear carpetas
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
 
-# Inicializar hardware optimizer
-hw_optimizer = HardwareOptimizer()
-print(f"\n[HARDWARE] {json.dumps(hw_optimizer.get_info(), indent=2)}\n")
 
-# Estado de procesamientos
+def create_hw_optimizer():
+    """Sondea el hardware (con el perfil de `python -m modules.autotune` si existe)"""
+    from modules import HardwareOptimizer
+    optimizer = HardwareOptimizer()
+    optimizer.apply_threads()
+    print(f"\n[HARDWARE] {json.dumps(optimizer.get_info(), indent=2)}\n")
+    return optimizer
+
+
+def get_max_jobs():
+    """Jobs simultáneos acotados por el hardware"""
+    return app.config['MAX_CONCURRENT_JOBS'] or hw_optimizer.get_max_jobs()
+
+
+def create_model_pool(size=None):
+    """Pool de modelos en el backend del perfil (por defecto, el de los jobs)"""
+    from modules import ModelPool
+    from modules.model_pool import load_model
+    return ModelPool(
+        size=size or app.config['MODEL_POOL_SIZE'] or get_max_jobs(),
+        loader=partial(load_model, **hw_optimizer.inference_options())
+    )
+
+
+# Hardware y modelos se inicializan al primer uso (o durante el arranque en
+# segundo plano, ver `warmup`): importar la app no carga torch
+hw_optimizer = Lazy(create_hw_optimizer)
+model_pool = Lazy(create_model_pool)
+# Cada stream retiene su modelo mientras está activo: pool propio, acotado por
+# MAX_STREAMS, para que los streams no dejen sin modelo a los jobs
+stream_model_pool = Lazy(lambda: create_model_pool(app.config['MAX_STREAMS']))
+
+# Jobs persistentes (sobreviven a reinicios del servidor)
+job_store = JobStore(
+    os.path.join(app.config['RESULTS_FOLDER'], 'jobs.sqlite3'),
+    max_jobs=app.config['MAX_STORED_JOBS'],
+    max_age_days=app.config['MAX_JOB_AGE_DAYS']
+)
+
+# Resultados reutilizables por contenido del video + parámetros + modelo
+results_cache = ResultsCache(
+    os.path.join(app.config['RESULTS_FOLDER'], 'cache'),
+    max_bytes=app.config['RESULTS_CACHE_MAX_BYTES']
+)
+
+# Resultados parseados para /api/results y exportaciones
+parsed_results = ParsedResultsLRU(app.config['PARSED_RESULTS_MAX_BYTES'])
+
+# Subidas por partes reanudables
+upload_manager = UploadManager(app.config['UPLOAD_FOLDER'], max_size=app.config['MAX_CONTENT_LENGTH'])
+
+# Estado en vivo de los jobs en cola o en proceso
 processing_jobs = {}
 
+# Eventos de progreso para los clientes suscritos a /api/events
+progress_hub = ProgressHub()
+
+# Procesadores en uso por job (vista previa en vivo)
+live_processors = {}
+
+# Streams en vivo: {stream_id: {'source', 'status', 'stop_event', 'processor', ...}}
+live_streams = {}
+live_streams_lock = threading.Lock()
+
+
+# Métricas de la app (las de procesamiento y carga de modelos están en modules/metrics.py)
+HTTP_SECONDS = Histogram('datatrack_http_request_seconds', 'Duración de los requests HTTP (hasta el primer byte)',
+                         ['endpoint', 'method', 'status'])
+JOBS_FINISHED = Counter('datatrack_jobs_finished_total', 'Jobs terminados por estado final', ['status'])
+JOBS = Gauge('datatrack_jobs', 'Jobs en cola y en ejecución', ['state'])
+MODELS = Gauge('datatrack_models', 'Modelos cargados en el pool y prestados', ['state'])
+Gauge('datatrack_live_streams', 'Streams en vivo activos').labels().set_function(
+    lambda: sum(stream['status'] in ('starting', 'running') for stream in list(live_streams.values()))
+)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        HTTP_SECONDS.labels(
+            endpoint=request.endpoint or 'unmatched',
+            method=request.method,
+            status=response.status_code
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+def get_job(job_id):
+    """Job en curso (estado en vivo) o terminado (desde el job store)"""
+    return processing_jobs.get(job_id) or job_store.get(job_id)
+
+
+def publish_progress(job_id, job, **extra):
+    """Publica el estado actual del job a sus suscriptores"""
+    event = {
+        'status': job['status'],
+        'progress': job.get('progress', 0),
+        'queue_position': job_scheduler.get_position(job_id),
+        'error': job.get('error')
+    }
+    event.update(extra)
+    progress_hub.publish(job_id, event)
+
+
+def batch_status(results):
+    """Conteo de un lote terminado y el estado (o error) de cada video"""
+    statuses = {
+        video_id: {'status': video['status'], 'error': video.get('error')}
+        for video_id, video in results['videos'].items()
+    }
+    return {
+        'total': len(statuses),
+        'done': sum(video['status'] == 'completed' for video in statuses.values()),
+        'failed': sum(video['status'] == 'error' for video in statuses.values()),
+        'running': [],
+        'by_video': statuses
+    }
+
+
+def publish_queue_positions():
+    """Al salir un job de la cola, los que esperan avanzan de posición"""
+    for job_id, job in list(processing_jobs.items()):
+        if job['status'] == 'queued':
+            publish_progress(job_id, job)
+
+
+def results_cache_key(video_path, options):
+    """Clave del cache de resultados, o None si el video no tiene hash"""
+    meta = read_meta(video_path)
+    if meta is None:
+        return None
+    # El backend y la cuantización cambian las detecciones: son parte del modelo
+    inference = hw_optimizer.inference_options()
+    model = f"{app.config['MODEL_PATH']}:{inference['backend']}{'-int8' if inference['int8'] else ''}"
+    return cache_key(meta['sha256'], options, model)
+
+
+def timeline_file(results_file):
+    """Timeline .npz que acompaña a un archivo de resultados"""
+    return os.path.splitext(results_file)[0] + '.npz'
+
+
+def detections_file(results_file, fmt):
+    """Registro de detecciones que acompaña a un archivo de resultados"""
+    extension = '.ndjson' if fmt == 'ndjson' else '.bin'
+    return os.path.splitext(results_file)[0] + '.detections' + extension
+
+
+def annotated_file(results_file):
+    """Video anotado que acompaña a un archivo de resultados"""
+    return os.path.splitext(results_file)[0] + '.annotated.mp4'
+
+
+def output_files(results_file, options):
+    """Archivos que produce un job (los que guarda el cache de resultados)"""
+    files = [results_file, timeline_file(results_file)]
+    if options.get('detection_log'):
+        files.append(detections_file(results_file, options['detection_log']))
+    if options.get('render') is not None and options['render'].get('video', True):
+        files.append(annotated_file(results_file))
+    return files
+
+
+def remove_job_files(job):
+    """
+    Elimina los resultados de un job y sus videos subidos
+    
+    Un video subido puede ser la entrada de varios jobs (el mismo archivo
+    procesado con otras opciones, reintentos o jobs por retomar): solo se
+    borra si ningún otro job guardado lo usa. Los videos de un directorio del
+    servidor (BATCH_ROOT) no se tocan.
+    """
+    results_file = job.get('results_file') or ''
+    upload_folder = os.path.realpath(app.config['UPLOAD_FOLDER'])
+    videos = [job.get('video_path')] + [video['path'] for video in (job.get('options') or {}).get('videos', [])]
+    uploads = [video for video in dict.fromkeys(videos)
+               if video and os.path.dirname(os.path.realpath(video)) == upload_folder
+               and not job_store.uses_video(video, exclude_job_id=job.get('job_id'))]
+    
+    try:
+        for video in uploads:
+            for path in (video, video + '.meta.json'):
+                if os.path.isfile(path):
+                    os.remove(path)
+        for path in (results_file, timeline_file(results_file),
+                     *spill_files(timeline_file(results_file)),
+                     annotated_file(results_file),
+                     *(detections_file(results_file, fmt) for fmt in DETECTION_LOG_FORMATS)):
+            if os.path.isfile(path):
+                os.remove(path)
+        parsed_results.invalidate(results_file)
+    except Exception as e:
+        print(f"[CLEANUP] Error: {e}")
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def process_video_async(job_id, video_path, regions, conf_threshold, frame_skip):
-    """Procesa video en segundo plano"""
+def process_video_async(job_id, payload, cancel_event):
+    """
+    Procesa video en segundo plano (ejecutado por el scheduler)
+    
+    payload: {'video_path': ..., 'options': parámetros de VideoProcessor.process_video}
+    """
+    job = processing_jobs.get(job_id)
+    if job is None:  # Eliminado mientras esperaba en la cola
+        return
+    job['status'] = 'processing'
+    job['started_at'] = datetime.now().isoformat()
+    job_store.update(job_id, status='processing', started_at=job['started_at'])
+    publish_progress(job_id, job)
+    publish_queue_positions()
+    
+    # Reportes de progreso acotados a uno cada PROGRESS_INTERVAL segundos
+    meter = ProgressMeter(app.config['PROGRESS_INTERVAL'])
+    
     try:
-        processor = VideoProcessor(
-            device=hw_optimizer.device.type,
-        )
+        # Ya importados por el arranque en segundo plano (o al primer job)
+        from modules import MultiprocessingManager, VideoProcessor
         
-        def progress_callback(current, total):
-            processing_jobs[job_id]['progress'] = (current / total) * 100
+        device = hw_optimizer.device.type
+        video_path = payload['video_path']
+        options = dict(payload['options'])
+        videos = options.pop('videos', None)  # Job por lote (ver /api/batches)
         
-        results = processor.process_video(
-            video_path,
-            regions=regions,
-            conf_threshold=conf_threshold,
-            frame_skip=frame_skip,
-            on_progress=progress_callback
-        )
-        
-        # Guardar resultados
         results_file = os.path.join(
             app.config['RESULTS_FOLDER'],
             f"results_{job_id}.json"
         )
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        # Hilos de decodificación del perfil (no cambian los resultados)
+        options['decode_threads'] = hw_optimizer.profile['decode_threads']
+        # Timeline por intervalo de tiempo (columnas NumPy) junto a los resultados;
+        # en un lote cada video trae solo su resumen
+        if not videos:
+            options['timeline_path'] = timeline_file(results_file)
+        # Registro opcional de cada detección
+        log_format = options.pop('detection_log', None)
+        if log_format:
+            options['detection_log'] = detections_file(results_file, log_format)
+            options['detection_log_format'] = log_format
+        # Video anotado opcional (con 'video': false solo vista previa)
+        if options.get('render') is not None:
+            render = dict(options['render'])
+            if render.pop('video', True):
+                options['render_path'] = annotated_file(results_file)
+            options['render'] = render
+        
+        if videos:
+            # Varios videos sobre un modelo: cada pasada junta frames de todos
+            from modules.batching import process_videos
+            
+            parallel = min(app.config['BATCH_PARALLEL'], len(videos))
+            # batch_size es el tamaño de la pasada compartida; cada video aporta su parte
+            max_batch = options.pop('batch_size')
+            options['batch_size'] = max(1, -(-max_batch // parallel))
+            
+            def batch_progress(current, total, counts):
+                report = meter.update(current, total)
+                if report:
+                    job['progress'] = report['progress']
+                    job['videos'] = counts
+                    publish_progress(job_id, job, videos=counts, **report)
+            
+            with model_pool.lease(app.config['MODEL_PATH'], device) as model:
+                results = process_videos(
+                    videos,
+                    model,
+                    device=device,
+                    parallel=parallel,
+                    max_batch=max_batch,
+                    on_progress=batch_progress,
+                    cancel_event=cancel_event,
+                    **options
+                )
+        elif options.pop('sharded', False):
+            # Un video largo repartido en segmentos, un modelo por worker
+            def shard_progress(current, total):
+                report = meter.update(current, total)
+                if report:
+                    job['progress'] = report['progress']
+                    publish_progress(job_id, job, **report)
+            
+            manager = MultiprocessingManager(hw_optimizer.profile['workers'])
+            results = manager.process_video_sharded(
+                video_path,
+                model_path=app.config['MODEL_PATH'],
+                device=device,
+                on_progress=shard_progress,
+                cancel_event=cancel_event,
+                inference=hw_optimizer.inference_options(),
+                **options
+            )
+        else:
+            # Tras un reinicio se retoma desde el último checkpoint
+            resume = job_store.load_checkpoint(job_id)
+            
+            with model_pool.lease(app.config['MODEL_PATH'], device) as model:
+                processor = VideoProcessor(model=model, device=device)
+                live_processors[job_id] = processor
+                
+                def progress_callback(current, total):
+                    report = meter.update(current, total)
+                    if report is None:
+                        return
+                    job['progress'] = report['progress']
+                    job['queue_depths'] = processor.get_queue_depths()
+                    # Conteos parciales por tipo y región
+                    publish_progress(job_id, job, counts=processor.counter.summary(), **report)
+                
+                def save_checkpoint(checkpoint):
+                    job_store.save_checkpoint(job_id, checkpoint, progress=job['progress'])
+                
+                results = processor.process_video(
+                    video_path,
+                    on_progress=progress_callback,
+                    cancel_event=cancel_event,
+                    checkpoint=save_checkpoint,
+                    checkpoint_every=app.config['CHECKPOINT_EVERY'],
+                    resume=resume,
+                    **options
+                )
+        
+        # Guardar resultados
+        with STAGE_SECONDS.labels(stage='serialization').time(), open(results_file, 'w') as f:
+            json.dump(results, f, separators=(',', ':'))
+        
+        key = None if videos else results_cache_key(video_path, payload['options'])
+        if key:
+            results_cache.put(key, [path for path in output_files(results_file, payload['options'])
+                                    if os.path.exists(path)])
         
-        processing_jobs[job_id]['status'] = 'completed'
-        processing_jobs[job_id]['results_file'] = results_file
+        if videos:
+            job['videos'] = batch_status(results)
+        job['status'] = 'completed'
+        job['progress'] = 100
+        job['results_file'] = results_file
+        
+    except ProcessingCancelled:
+        if job_scheduler.timed_out(job_id):
+            job['status'] = 'error'
+            job['error'] = 'Job timed out'
+        else:
+            job['status'] = 'cancelled'
         
     except Exception as e:
-        processing_jobs[job_id]['status'] = 'error'
-        processing_jobs[job_id]['error'] = str(e)
+        job['status'] = 'error'
+        job['error'] = str(e)
         print(f"[ERROR] Job {job_id}: {e}")
+    
+    finally:
+        # Estado final al job store; en memoria solo quedan los jobs en curso
+        job_store.update(
+            job_id,
+            status=job['status'],
+            progress=job.get('progress', 0),
+            results_file=job.get('results_file'),
+            error=job.get('error'),
+            # Lotes: conteo final y estado de cada video (ver batch_status)
+            videos=dict(job['videos'], running=[]) if job.get('videos') else None,
+            finished_at=datetime.now().isoformat()
+        )
+        job_store.delete_checkpoint(job_id)
+        JOBS_FINISHED.labels(status=job['status']).inc()
+        publish_progress(job_id, job)
+        processing_jobs.pop(job_id, None)
+        live_processors.pop(job_id, None)
+
+
+def run_stream(stream_id, stream, source, options, model, device):
+    """
+    Procesa un stream en vivo hasta que se detiene (hilo propio por stream)
+    
+    stream: Entrada de live_streams (se recibe directo: un DELETE puede
+        quitarla antes de que arranque el hilo)
+    model: prestado por stream_model_pool al iniciar; se devuelve al terminar
+    """
+    try:
+        from modules import VideoProcessor
+        
+        processor = VideoProcessor(model=model, device=device)
+        stream['processor'] = processor
+        stream['status'] = 'running'
+        stream['final'] = processor.process_stream(source, stop_event=stream['stop_event'], **options)
+        stream['status'] = 'stopped'
+    except Exception as e:
+        stream['status'] = 'error'
+        stream['error'] = str(e)
+        print(f"[ERROR] Stream {stream_id}: {e}")
+    finally:
+        stream_model_pool.release(app.config['MODEL_PATH'], device, model)
+        stream['stopped_at'] = datetime.now().isoformat()
+
+
+def stream_info(stream_id, stream):
+    """Estado, conteos en ventanas deslizantes y estadísticas de un stream"""
+    processor = stream.get('processor')
+    info = {
+        'stream_id': stream_id,
+        'source': stream['source'],
+        'status': stream['status'],
+        'error': stream.get('error'),
+        'started_at': stream['started_at'],
+        'stopped_at': stream.get('stopped_at')
+    }
+    if stream.get('final') is not None:
+        info.update(stream['final'])
+    elif processor is not None and processor.stream_stats is not None:
+        info.update(processor.counter.summary())
+        info['stream'] = dict(processor.stream_stats, reader=dict(processor.stream_stats['reader']))
+    return info
+
+
+# Cola de jobs con workers acotados (en lugar de un hilo por request)
+job_scheduler = Lazy(lambda: JobScheduler(process_video_async, max_workers=get_max_jobs()))
+
+# Durante el arranque las métricas no esperan al sondeo del hardware
+for state in ('queued', 'running'):
+    JOBS.labels(state=state).set_function(
+        lambda state=state: job_scheduler.get_stats()[state] if job_scheduler.initialized else 0
+    )
+for state in ('loaded', 'in_use'):
+    MODELS.labels(state=state).set_function(
+        lambda state=state: sum(model[state] for pool in (model_pool, stream_model_pool) if pool.initialized
+                                for model in pool.get_stats()['models'].values())
+    )
+
+
+def resume_unfinished_jobs():
+    """Reencola los jobs que quedaron en cola o en proceso al detenerse el servidor"""
+    for job in job_store.unfinished():
+        job_id = job['job_id']
+        if job_id in processing_jobs:  # Encolado en este proceso durante el arranque
+            continue
+        if not job['video_path'] or not os.path.exists(job['video_path']):
+            job_store.update(job_id, status='error', error='Video not found',
+                             finished_at=datetime.now().isoformat())
+            continue
+        
+        # Solo los jobs de un video guardan checkpoints; por segmentos y por lote
+        # se procesan de nuevo desde el inicio
+        restart = bool(job['options'].get('sharded') or job['options'].get('videos'))
+        processing_jobs[job_id] = {
+            'status': 'queued',
+            'progress': 0 if restart else job['progress'] or 0,
+            'filename': job['filename'],
+            'created_at': job['created_at']
+        }
+        job_store.update(job_id, status='queued', progress=processing_jobs[job_id]['progress'])
+        job_scheduler.submit(
+            job_id,
+            {'video_path': job['video_path'], 'options': job['options']},
+            priority=job['priority'] or 0,
+            timeout=job['timeout']
+        )
+        publish_progress(job_id, processing_jobs[job_id])
+        print(f"[JOBS] Job {job_id} reencolado{' (desde el inicio)' if restart else ''}")
+
+
+def import_processing_modules():
+    """Importa torch, ultralytics y OpenCV antes del primer job"""
+    from modules import MultiprocessingManager, VideoProcessor  # noqa: F401
+
+
+def start_jobs():
+    """Crea el scheduler y reencola los jobs interrumpidos"""
+    job_scheduler.get()
+    resume_unfinished_jobs()
+
+
+def warm_models():
+    model_pool.warm(app.config['MODEL_PATH'], hw_optimizer.device.type)
+
+
+# Arranque en segundo plano: el servidor atiende /healthz desde el inicio y
+# /readyz responde 200 cuando el modelo está cargado y pre-calentado
+warmup = Warmup([
+    ('hardware', hw_optimizer.get),
+    ('jobs', start_jobs),
+    ('imports', import_processing_modules),
+    ('model', warm_models)
+])
+
+
+@app.before_request
+def ensure_warmup():
+    # Servidores WSGI importan la app sin pasar por __main__
+    warmup.start()
 
 
 @app.route('/')
@@ -83,6 +562,16 @@ def get_hardware_info():
     return jsonify(hw_optimizer.get_info())
 
 
+@app.route('/api/model-pool', methods=['GET'])
+def get_model_pool_stats():
+    """Estadísticas del pool de modelos"""
+    return jsonify({
+        'success': True,
+        'stats': model_pool.get_stats(),
+        'streams': stream_model_pool.get_stats() if stream_model_pool.initialized else None
+    })
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_video():
     """Sube un video"""
@@ -98,92 +587,412 @@ def upload_video():
     
     filename = secure_filename(f"{uuid.uuid4()}_{file.filename}")
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
     
-    # Información del video
-    import cv2
-    cap = cv2.VideoCapture(filepath)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    cap.release()
+    # Hash del contenido calculado mientras se escribe (clave del cache de resultados)
+    video_hash, size = save_and_hash(file.stream, filepath)
+    meta = write_meta(filepath, video_hash, size)
     
     return jsonify({
         'success': True,
         'filename': filename,
-        'video_info': {
-            'total_frames': total_frames,
-            'fps': fps,
-            'width': width,
-            'height': height,
-            'duration': total_frames / fps if fps > 0 else 0
-        }
+        'video_hash': video_hash,
+        'video_info': meta['video_info']
+    })
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    Inicia una subida por partes
+    
+    Body JSON: {"filename": ..., "size": bytes totales}. Las partes se envían
+    con PUT /api/uploads/<upload_id>?offset=N en el cuerpo crudo del request.
+    """
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    
+    if not filename:
+        return jsonify({'success': False, 'error': 'Empty filename'}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+    
+    # Mismo límite que una subida en un solo request
+    size = int(data.get('size', 0))
+    if size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'success': False,
+                        'error': f"File too large (max {app.config['MAX_CONTENT_LENGTH']} bytes)"}), 413
+    
+    try:
+        upload = upload_manager.create(filename, size)
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'chunk_size': app.config['UPLOAD_CHUNK_SIZE'], **upload})
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Bytes recibidos de una subida (para reanudarla tras un corte)"""
+    try:
+        upload = upload_manager.status(upload_id)
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    
+    return jsonify({'success': True, **upload})
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """
+    Recibe una parte que empieza en ?offset=N; al completar el tamaño
+    declarado retorna filename, video_hash y video_info como /api/upload
+    """
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'error': 'Missing offset'}), 400
+    
+    try:
+        # Cuerpo crudo leído por bloques: sin parseo multipart ni archivo en memoria
+        upload = upload_manager.append(upload_id, request.stream, offset)
+        if not upload['complete']:
+            return jsonify({'success': True, **upload})
+        
+        filename, meta = upload_manager.finish(upload_id)
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    
+    return jsonify({
+        'success': True,
+        **upload,
+        'filename': filename,
+        'video_hash': meta['sha256'],
+        'video_info': meta['video_info']
     })
 
 
+def parse_process_options(data):
+    """
+    Opciones de VideoProcessor.process_video de un request
+    
+    Returns:
+        (options, error): error es el mensaje si alguna opción es inválida
+    """
+    options = {
+        'regions': data.get('regions', []),
+        'conf_threshold': float(data.get('conf_threshold', hw_optimizer.profile['confidence'])),
+        'frame_skip': int(data.get('frame_skip', hw_optimizer.profile['frame_skip'])),
+        'batch_size': int(data.get('batch_size', hw_optimizer.profile['batch_size'])),
+        'imgsz': int(data.get('imgsz', hw_optimizer.profile['imgsz'])),
+        # Muestreo por tiempo (frames por segundo de video) en lugar de frame_skip
+        'sample_fps': float(data['sample_fps']) if data.get('sample_fps') else None,
+        'anchor': data.get('anchor', 'top_left'),
+        # Inferencia solo sobre el rectángulo que contiene las regiones
+        'roi': bool(data.get('roi', False)),
+        'roi_margin': int(data.get('roi_margin', 16)),
+        # Saltar inferencia en escenas estáticas (true o dict de opciones de MotionGate);
+        # desactivado por defecto: verificar conteos con benchmark --motion-gate --compare
+        'motion_gate': {} if data.get('motion_gate') is True else data.get('motion_gate') or None,
+        # Videos largos: segmentos temporales en paralelo (un proceso por worker);
+        # sin checkpoints: tras un reinicio se procesan desde el inicio
+        'sharded': bool(data.get('sharded', False)),
+        # Registro de cada detección: 'ndjson' (o true) o 'binary'
+        'detection_log': 'ndjson' if data.get('detection_log') is True else data.get('detection_log') or None,
+        # Video anotado: true o dict con scale, every y video (false: solo vista previa)
+        'render': {} if data.get('render') is True else data.get('render') or None
+    }
+    
+    if options['anchor'] not in ANCHORS:
+        return None, f'Invalid anchor, use one of {ANCHORS}'
+    
+    if options['detection_log'] and options['detection_log'] not in DETECTION_LOG_FORMATS:
+        return None, f'Invalid detection_log, use one of {DETECTION_LOG_FORMATS}'
+    
+    # Los segmentos no combinan registros de detecciones ni videos anotados
+    if options['sharded'] and (options['detection_log'] or options['render'] is not None):
+        return None, 'detection_log and render are not supported with sharded'
+    
+    return options, None
+
+
 @app.route('/api/process', methods=['POST'])
 def process_video_endpoint():
     """Procesa un video con parámetros"""
     data = request.get_json()
     
     filename = data.get('filename')
-    regions = data.get('regions', [])
-    conf_threshold = float(data.get('conf_threshold', hw_optimizer.profile['confidence']))
-    frame_skip = int(data.get('frame_skip', hw_optimizer.profile['frame_skip']))
-    
     if not filename:
         return jsonify({'success': False, 'error': 'No filename'}), 400
     
+    options, error = parse_process_options(data)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    priority = int(data.get('priority', 0))  # Menor valor = antes
+    timeout = data.get('timeout', app.config['JOB_TIMEOUT'])
+    timeout = float(timeout) if timeout else None
+    
     video_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
     if not os.path.exists(video_path):
         return jsonify({'success': False, 'error': 'Video not found'}), 404
     
-    # Crear job
+    # Retención: descartar jobs terminados antiguos y sus archivos
+    for evicted in job_store.evict():
+        remove_job_files(evicted)
+    
     job_id = str(uuid.uuid4())
+    
+    # Mismo video con los mismos parámetros: el job se completa sin procesar
+    key = results_cache_key(video_path, options)
+    results_file = os.path.join(app.config['RESULTS_FOLDER'], f"results_{job_id}.json")
+    if key and results_cache.get(key, output_files(results_file, options)):
+        now = datetime.now().isoformat()
+        job_store.create(
+            job_id,
+            status='completed',
+            progress=100,
+            filename=filename,
+            video_path=video_path,
+            options=options,
+            priority=priority,
+            timeout=timeout,
+            created_at=now,
+            finished_at=now,
+            results_file=results_file
+        )
+        progress_hub.publish(job_id, {'status': 'completed', 'progress': 100,
+                                      'queue_position': None, 'error': None})
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'queue_position': None,
+            'cached': True
+        })
+    
+    # Crear job
     processing_jobs[job_id] = {
-        'status': 'processing',
+        'status': 'queued',
         'progress': 0,
         'filename': filename,
         'created_at': datetime.now().isoformat()
     }
+    job_store.create(
+        job_id,
+        status='queued',
+        filename=filename,
+        video_path=video_path,
+        options=options,
+        priority=priority,
+        timeout=timeout,
+        created_at=processing_jobs[job_id]['created_at']
+    )
+    
+    # Encolar; el scheduler lo procesa cuando haya un worker libre
+    queue_position = job_scheduler.submit(
+        job_id,
+        {'video_path': video_path, 'options': options},
+        priority=priority,
+        timeout=timeout
+    )
+    publish_progress(job_id, processing_jobs[job_id])
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'queue_position': queue_position,
+        'cached': False
+    })
+
+
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """
+    Procesa varios videos en un solo job
+    
+    Los frames de todos los videos comparten las pasadas de un modelo; cada
+    video conserva su tracker, sus conteos y sus resultados. JSON:
+    'filenames' (videos subidos: nombres o dicts con 'filename' y opciones
+    propias del video, p.ej. 'regions') o 'directory' (relativo a
+    BATCH_ROOT), más las opciones de /api/process como opciones comunes.
+    """
+    data = request.get_json()
+    
+    options, error = parse_process_options(data)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    # Opciones de salida por archivo: solo en jobs de un video
+    for unsupported in ('sharded', 'detection_log', 'render'):
+        options.pop(unsupported)
+        if data.get(unsupported):
+            return jsonify({'success': False, 'error': f'{unsupported} is not supported in batch jobs'}), 400
+    
+    videos = []
+    if data.get('directory'):
+        root = app.config['BATCH_ROOT']
+        if not root:
+            return jsonify({'success': False, 'error': 'Server-side directories are disabled'}), 400
+        root = os.path.realpath(root)
+        directory = os.path.realpath(os.path.join(root, data['directory']))
+        if os.path.commonpath([root, directory]) != root or not os.path.isdir(directory):
+            return jsonify({'success': False, 'error': 'Directory not found'}), 404
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if allowed_file(name) and os.path.isfile(path):
+                videos.append({'video_id': name, 'path': path})
+    else:
+        for entry in data.get('filenames') or []:
+            entry = {'filename': entry} if isinstance(entry, str) else dict(entry)
+            filename = secure_filename(entry.pop('filename', '') or '')
+            path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            if not filename or not os.path.exists(path):
+                return jsonify({'success': False, 'error': f"Video not found: {filename}"}), 404
+            overrides = {key: entry[key] for key in BATCH_VIDEO_OPTIONS if key in entry}
+            if overrides.get('anchor', options['anchor']) not in ANCHORS:
+                return jsonify({'success': False, 'error': f'Invalid anchor, use one of {ANCHORS}'}), 400
+            videos.append({'video_id': filename, 'path': path, **overrides})
+    
+    if not videos:
+        return jsonify({'success': False, 'error': 'No videos'}), 400
+    if len({video['video_id'] for video in videos}) < len(videos):
+        return jsonify({'success': False, 'error': 'Duplicate video'}), 400
+    if len(videos) > app.config['MAX_BATCH_VIDEOS']:
+        return jsonify({'success': False,
+                        'error': f"Too many videos (max {app.config['MAX_BATCH_VIDEOS']})"}), 400
+    options['videos'] = videos
+    
+    priority = int(data.get('priority', 0))
+    timeout = data.get('timeout', app.config['JOB_TIMEOUT'])
+    timeout = float(timeout) if timeout else None
+    
+    for evicted in job_store.evict():
+        remove_job_files(evicted)
+    
+    job_id = str(uuid.uuid4())
+    processing_jobs[job_id] = {
+        'status': 'queued',
+        'progress': 0,
+        'filename': f'{len(videos)} videos',
+        'created_at': datetime.now().isoformat()
+    }
+    job_store.create(
+        job_id,
+        status='queued',
+        filename=processing_jobs[job_id]['filename'],
+        video_path=videos[0]['path'],
+        options=options,
+        priority=priority,
+        timeout=timeout,
+        created_at=processing_jobs[job_id]['created_at']
+    )
     
-    # Procesar en background
-    thread = threading.Thread(
-        target=process_video_async,
-        args=(job_id, video_path, regions, conf_threshold, frame_skip)
+    queue_position = job_scheduler.submit(
+        job_id,
+        {'video_path': videos[0]['path'], 'options': options},
+        priority=priority,
+        timeout=timeout
     )
-    thread.daemon = True
-    thread.start()
+    publish_progress(job_id, processing_jobs[job_id])
     
     return jsonify({
         'success': True,
-        'job_id': job_id
+        'job_id': job_id,
+        'videos': [video['video_id'] for video in videos],
+        'queue_position': queue_position
     })
 
 
 @app.route('/api/status/<job_id>', methods=['GET'])
 def get_status(job_id):
     """Estado del procesamiento"""
-    if job_id not in processing_jobs:
+    job = get_job(job_id)
+    if job is None:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
     
-    job = processing_jobs[job_id]
     return jsonify({
         'success': True,
         'status': job['status'],
         'progress': job.get('progress', 0),
+        'queue_position': job_scheduler.get_position(job_id),
+        'queue_depths': job.get('queue_depths', {}),
+        # Jobs por lote: videos terminados, con error y en curso; al terminar
+        # también el estado de cada video (se guarda en el job store)
+        'videos': job.get('videos'),
         'error': job.get('error')
     })
 
 
+@app.route('/api/events/<job_id>', methods=['GET'])
+def stream_events(job_id):
+    """
+    Progreso del job como Server-Sent Events
+    
+    Cada evento trae status, progress, frames, fps, eta_s y conteos parciales.
+    El stream termina cuando el job termina.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    # Al reconectar, EventSource envía el último id recibido
+    last_seq = request.headers.get('Last-Event-ID', 0, type=int)
+    
+    def stream():
+        # Jobs ya terminados (o de antes de un reinicio): un único evento
+        if job_id not in processing_jobs and progress_hub.wait(job_id, last_seq, timeout=0) is None:
+            data = {'status': job['status'], 'progress': job.get('progress') or 0, 'error': job.get('error')}
+            yield f"data: {json.dumps(data)}\n\n"
+            return
+        
+        seq = last_seq
+        yield 'retry: 2000\n\n'
+        while True:
+            item = progress_hub.wait(job_id, seq, timeout=15)
+            if item is None:
+                if get_job(job_id) is None:
+                    return
+                yield ': keepalive\n\n'
+                continue
+            
+            seq, event = item
+            yield f"id: {seq}\ndata: {json.dumps(event)}\n\n"
+            if event['status'] in FINISHED_STATUSES:
+                return
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/cancel/<job_id>', methods=['POST'])
+def cancel_job(job_id):
+    """Cancela un job en cola o en ejecución"""
+    if get_job(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    cancelled = job_scheduler.cancel(job_id)
+    if cancelled is None:
+        return jsonify({'success': False, 'error': 'Job already finished'}), 400
+    
+    if cancelled == 'queued':
+        job = processing_jobs.pop(job_id, None) or {}
+        job['status'] = 'cancelled'
+        job_store.update(job_id, status='cancelled', finished_at=datetime.now().isoformat())
+        JOBS_FINISHED.labels(status='cancelled').inc()
+        publish_progress(job_id, job)
+        publish_queue_positions()
+    
+    return jsonify({'success': True})
+
+
 @app.route('/api/results/<job_id>', methods=['GET'])
 def get_results(job_id):
     """Obtiene resultados"""
-    if job_id not in processing_jobs:
+    job = get_job(job_id)
+    if job is None:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
     
-    job = processing_jobs[job_id]
     if job['status'] != 'completed':
         return jsonify({'success': False, 'error': 'Not ready'}), 400
     
@@ -191,8 +1000,14 @@ def get_results(job_id):
     if not results_file or not os.path.exists(results_file):
         return jsonify({'success': False, 'error': 'Results file not found'}), 404
     
-    with open(results_file, 'r') as f:
-        results = json.load(f)
+    results = parsed_results.get(results_file)
+    
+    # Jobs por lote: ?video=<video_id> devuelve solo los resultados de ese video
+    video_id = request.args.get('video')
+    if video_id is not None:
+        results = results.get('videos', {}).get(video_id)
+        if results is None:
+            return jsonify({'success': False, 'error': 'Video not found'}), 404
     
     return jsonify({
         'success': True,
@@ -200,112 +1015,394 @@ def get_results(job_id):
     })
 
 
+@app.route('/api/timeline/<job_id>', methods=['GET'])
+def get_timeline(job_id):
+    """
+    Conteos por intervalo de tiempo
+    
+    Query: from / to (segundos de video) y bucket (segundos por intervalo,
+    múltiplo del intervalo base del timeline)
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    if job['status'] != 'completed':
+        return jsonify({'success': False, 'error': 'Not ready'}), 400
+    
+    path = timeline_file(job.get('results_file') or '')
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Timeline not found'}), 404
+    
+    start = request.args.get('from', type=float)
+    end = request.args.get('to', type=float)
+    bucket = request.args.get('bucket', type=float)
+    if bucket is not None and bucket <= 0:
+        return jsonify({'success': False, 'error': 'Invalid bucket'}), 400
+    
+    return jsonify({
+        'success': True,
+        'timeline': query_timeline(path, start, end, bucket)
+    })
+
+
+@app.route('/api/detections/<job_id>', methods=['GET'])
+def export_detections(job_id):
+    """
+    Registro de detecciones del job como stream
+    
+    Query: format=ndjson convierte un registro binario; sin format se envía
+    el archivo tal cual (binario: registros detection_log.RECORD_DTYPE)
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    if job['status'] != 'completed':
+        return jsonify({'success': False, 'error': 'Not ready'}), 400
+    
+    results_file = job.get('results_file') or ''
+    for fmt in DETECTION_LOG_FORMATS:
+        path = detections_file(results_file, fmt)
+        if os.path.exists(path):
+            break
+    else:
+        return jsonify({'success': False, 'error': 'Detection log not found'}), 404
+    
+    output = request.args.get('format') or fmt
+    if output not in (fmt, 'ndjson'):
+        return jsonify({'success': False, 'error': f'Cannot export {fmt} log as {output}'}), 400
+    
+    results = parsed_results.get(results_file)
+    log_info = results.get('detection_log') or {}
+    chunks = iter_detection_log(
+        path, fmt, output,
+        class_names={int(class_id): name for class_id, name in log_info.get('classes', {}).items()},
+        fps=results.get('fps', 0)
+    )
+    extension = 'ndjson' if output == 'ndjson' else 'bin'
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/x-ndjson' if output == 'ndjson' else 'application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename=detections_{job_id}.{extension}'}
+    )
+
+
+@app.route('/api/preview/<job_id>', methods=['GET'])
+def preview_stream(job_id):
+    """Vista previa MJPEG del job en proceso (requiere la opción render)"""
+    processor = live_processors.get(job_id)
+    renderer = processor.renderer if processor else None
+    if renderer is None:
+        return jsonify({'success': False, 'error': 'No preview for this job'}), 404
+    
+    def stream():
+        seq = 0
+        while True:
+            item = renderer.preview.wait(seq, timeout=10)
+            if item is None:
+                if renderer.preview.closed:
+                    return
+                continue
+            seq, jpeg = item
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\n'
+                   b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='multipart/x-mixed-replace; boundary=frame',
+        headers={'Cache-Control': 'no-cache'}
+    )
+
+
+@app.route('/api/annotated/<job_id>', methods=['GET'])
+def get_annotated_video(job_id):
+    """Descarga el video anotado de un job completado"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    if job['status'] != 'completed':
+        return jsonify({'success': False, 'error': 'Not ready'}), 400
+    
+    path = annotated_file(job.get('results_file') or '')
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Annotated video not found'}), 404
+    
+    return send_file(
+        os.path.abspath(path),
+        mimetype='video/mp4',
+        as_attachment=True,
+        download_name=f'annotated_{job_id}.mp4',
+        conditional=True
+    )
+
+
 @app.route('/api/export-csv/<job_id>', methods=['GET'])
 def export_csv(job_id):
     """Exporta resultados como CSV"""
-    if job_id not in processing_jobs:
+    job = get_job(job_id)
+    if job is None:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
     
-    job = processing_jobs[job_id]
     results_file = job.get('results_file')
     
     if not results_file or not os.path.exists(results_file):
         return jsonify({'success': False, 'error': 'Results not found'}), 404
     
-    with open(results_file, 'r') as f:
-        results = json.load(f)
-    
-    # Generar CSV
-    output = StringIO()
-    writer = csv.writer(output)
+    results = parsed_results.get(results_file)
     
-    writer.writerow(['DataTrack - Resultados de Conteo de Vehículos'])
-    writer.writerow(['Fecha', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-    writer.writerow([])
+    # CSV generado fila por fila mientras se envía
+    return Response(
+        stream_with_context(stream_csv(results_csv_rows(results))),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=results_{job_id}.csv'}
+    )
+
+
+def results_csv_rows(results):
+    """Filas del CSV de resultados"""
+    yield ['DataTrack - Resultados de Conteo de Vehículos']
+    yield ['Fecha', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+    yield []
     
-    writer.writerow(['Resumen General'])
-    writer.writerow(['Total de Vehículos Únicos', results.get('total_vehicles', 0)])
-    writer.writerow(['Total de Frames', results.get('total_frames', 0)])
-    writer.writerow(['FPS', results.get('fps', 0)])
-    writer.writerow([])
+    yield ['Resumen General']
+    yield ['Total de Vehículos Únicos', results.get('total_vehicles', 0)]
+    yield ['Total de Frames', results.get('total_frames', 0)]
+    yield ['FPS', results.get('fps', 0)]
+    yield []
     
-    writer.writerow(['Conteo de Vehículos ÚNICOS por Tipo'])
-    writer.writerow(['Tipo', 'Cantidad Única'])
+    yield ['Conteo de Vehículos ÚNICOS por Tipo']
+    yield ['Tipo', 'Cantidad Única']
     for vehicle_type, count in results.get('vehicles_by_type_unique', {}).items():
-        writer.writerow([vehicle_type.capitalize(), count])
-    writer.writerow([])
+        yield [vehicle_type.capitalize(), count]
+    yield []
     
-    writer.writerow(['Detecciones (Instancias) por Tipo'])
-    writer.writerow(['Tipo', 'Total de Detecciones'])
+    yield ['Detecciones (Instancias) por Tipo']
+    yield ['Tipo', 'Total de Detecciones']
     for vehicle_type, count in results.get('vehicles_by_type', {}).items():
-        writer.writerow([vehicle_type.capitalize(), count])
-    writer.writerow([])
+        yield [vehicle_type.capitalize(), count]
+    yield []
     
-    writer.writerow(['ACLARACIÓN:'])
-    writer.writerow(['Vehículos Únicos = Cantidad real de vehículos diferentes'])
-    writer.writerow(['Detecciones = Número de veces detectado (puede contar el mismo vehículo en múltiples frames)'])
-    writer.writerow([])
+    yield ['ACLARACIÓN:']
+    yield ['Vehículos Únicos = Cantidad real de vehículos diferentes']
+    yield ['Detecciones = Número de veces detectado (puede contar el mismo vehículo en múltiples frames)']
+    yield []
     
-    writer.writerow(['Conteo por Región'])
-    writer.writerow(['Región', 'Vehículos Únicos', 'Total Detecciones', 'Tipos'])
+    yield ['Conteo por Región']
+    yield ['Región', 'Vehículos Únicos', 'Total Detecciones', 'Tipos']
     for region, data in results.get('vehicles_by_region', {}).items():
         types_str = ', '.join([f"{t}: {c}" for t, c in data.get('types', {}).items()])
         unique_count = data.get('unique_count', 0)
         total_count = data.get('count', 0)
-        writer.writerow([region, unique_count, total_count, types_str])
+        yield [region, unique_count, total_count, types_str]
     
-    # Enviar archivo
-    csv_bytes = output.getvalue().encode('utf-8')
-    bytes_io = BytesIO(csv_bytes)
+    if results.get('videos'):
+        yield []
+        yield ['Conteo por Video']
+        yield ['Video', 'Estado', 'Vehículos Únicos', 'Total de Frames', 'Tipos']
+        for video_id, video in results['videos'].items():
+            types_str = ', '.join(f"{t}: {c}" for t, c in video.get('vehicles_by_type_unique', {}).items())
+            yield [video_id, video['status'], video.get('total_vehicles', 0), video.get('total_frames', 0),
+                   types_str or video.get('error', '')]
+
+
+def stream_csv(rows, batch_rows=256):
+    """Codifica filas como CSV en bloques de `batch_rows`, sin armar el archivo completo"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_rows:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode('utf-8')
+
+
+@app.route('/api/streams', methods=['POST'])
+def start_stream():
+    """
+    Inicia el conteo en vivo de un stream
     
-    return send_file(
-        bytes_io,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'results_{job_id}.csv'
-    )
+    Body JSON: {"source": URL rtsp/http o filename subido (se reproduce en
+    bucle), "regions", "conf_threshold", "anchor", "roi", "windows": [seg, ...],
+    "track_ttl": seg}
+    """
+    from modules.streams import DEFAULT_WINDOWS, STREAM_SCHEMES
+    
+    data = request.get_json() or {}
+    source = data.get('source') or ''
+    
+    if source.startswith(STREAM_SCHEMES):
+        loop = False
+    else:
+        # Archivo subido como sustituto de una cámara
+        source = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(source))
+        if not os.path.isfile(source):
+            return jsonify({'success': False, 'error': 'Video not found'}), 404
+        loop = bool(data.get('loop', True))
+    
+    options = {
+        'regions': data.get('regions', []),
+        'conf_threshold': float(data.get('conf_threshold', hw_optimizer.profile['confidence'])),
+        'anchor': data.get('anchor', 'top_left'),
+        'roi': bool(data.get('roi', False)),
+        'imgsz': int(data.get('imgsz', hw_optimizer.profile['imgsz'])),
+        'loop': loop,
+        'windows': [int(window) for window in data.get('windows', DEFAULT_WINDOWS)],
+        'track_ttl': float(data.get('track_ttl', 60))
+    }
+    
+    if options['anchor'] not in ANCHORS:
+        return jsonify({'success': False, 'error': f'Invalid anchor, use one of {ANCHORS}'}), 400
+    
+    if not options['windows'] or min(options['windows']) <= 0:
+        return jsonify({'success': False, 'error': 'Invalid windows'}), 400
+    
+    with live_streams_lock:
+        active = sum(1 for stream in live_streams.values() if stream['status'] in ('starting', 'running'))
+        if active >= app.config['MAX_STREAMS']:
+            return jsonify({'success': False, 'error': 'Too many active streams'}), 429
+        
+        stream_id = str(uuid.uuid4())
+        live_streams[stream_id] = stream = {
+            'source': data.get('source'),
+            'status': 'starting',
+            'stop_event': threading.Event(),
+            'processor': None,
+            'started_at': datetime.now().isoformat()
+        }
+    
+    # El modelo se reserva antes de aceptar el stream: sin uno libre, 503 en
+    # lugar de un stream colgado en 'starting'
+    device = hw_optimizer.device.type
+    try:
+        model = stream_model_pool.acquire(app.config['MODEL_PATH'], device,
+                                          timeout=app.config['STREAM_MODEL_TIMEOUT'])
+    except Exception as e:
+        with live_streams_lock:
+            live_streams.pop(stream_id, None)
+        error = 'No model available for streams' if isinstance(e, TimeoutError) else str(e)
+        return jsonify({'success': False, 'error': error}), 503
+    
+    threading.Thread(target=run_stream, args=(stream_id, stream, source, options, model, device),
+                     name=f'stream-{stream_id[:8]}', daemon=True).start()
+    
+    return jsonify({'success': True, 'stream_id': stream_id})
+
+
+@app.route('/api/streams', methods=['GET'])
+def list_streams():
+    """Lista los streams con sus conteos actuales"""
+    return jsonify({
+        'success': True,
+        'streams': {stream_id: stream_info(stream_id, stream)
+                    for stream_id, stream in list(live_streams.items())}
+    })
+
+
+@app.route('/api/streams/<stream_id>', methods=['GET'])
+def get_stream(stream_id):
+    """Conteos en ventanas deslizantes, latencia y frames descartados de un stream"""
+    stream = live_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Stream not found'}), 404
+    
+    return jsonify({'success': True, **stream_info(stream_id, stream)})
+
+
+@app.route('/api/streams/<stream_id>/stop', methods=['POST'])
+def stop_stream(stream_id):
+    """Detiene un stream; sus conteos finales quedan disponibles"""
+    stream = live_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Stream not found'}), 404
+    
+    stream['stop_event'].set()
+    return jsonify({'success': True})
+
+
+@app.route('/api/streams/<stream_id>', methods=['DELETE'])
+def delete_stream(stream_id):
+    """Detiene un stream y descarta su estado"""
+    stream = live_streams.pop(stream_id, None)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Stream not found'}), 404
+    
+    stream['stop_event'].set()
+    return jsonify({'success': True})
 
 
 @app.route('/api/jobs', methods=['GET'])
 def get_jobs():
-    """Lista todos los jobs"""
+    """Lista los jobs más recientes"""
+    limit = request.args.get('limit', 200, type=int)
+    jobs = {}
+    for stored in job_store.list(limit):
+        job = processing_jobs.get(stored['job_id'], stored)
+        jobs[stored['job_id']] = {
+            'status': job['status'],
+            'progress': job.get('progress') or 0,
+            'created_at': job['created_at']
+        }
+    
     return jsonify({
         'success': True,
-        'jobs': {
-            job_id: {
-                'status': job['status'],
-                'progress': job.get('progress', 0),
-                'created_at': job['created_at']
-            }
-            for job_id, job in processing_jobs.items()
-        }
+        'jobs': jobs,
+        'scheduler': job_scheduler.get_stats(),
+        'results_cache': results_cache.get_stats(),
+        'parsed_results': parsed_results.get_stats()
     })
 
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """El proceso está vivo (no espera al modelo)"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """200 cuando el modelo está cargado y pre-calentado; 503 mientras tanto o si falló"""
+    status = warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas en formato de texto Prometheus"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
 @app.route('/api/cleanup/<job_id>', methods=['DELETE'])
 def cleanup_job(job_id):
     """Limpia recursos de un job"""
-    if job_id not in processing_jobs:
+    job = get_job(job_id)
+    if job is None:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
     
-    job = processing_jobs[job_id]
-    
-    # Eliminar archivos
-    video_file = os.path.join(app.config['UPLOAD_FOLDER'], job.get('filename', ''))
-    results_file = job.get('results_file', '')
+    job_scheduler.cancel(job_id)
     
-    try:
-        if os.path.exists(video_file):
-            os.remove(video_file)
-        if os.path.exists(results_file):
-            os.remove(results_file)
-    except Exception as e:
-        print(f"[CLEANUP] Error: {e}")
+    # Eliminar archivos (el job store tiene las opciones, p.ej. los videos de un lote)
+    remove_job_files(job_store.get(job_id) or job)
     
-    del processing_jobs[job_id]
+    processing_jobs.pop(job_id, None)
+    job_store.delete(job_id)
+    progress_hub.discard(job_id)
     
     return jsonify({'success': True})
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000, threaded=True)
+    debug = True
+    
+    # Con el reloader de debug solo el proceso hijo atiende requests (y carga
+    # el modelo); el arranque corre en segundo plano mientras el servidor ya escucha
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warmup.start()
+    app.run(debug=debug, port=5000, threaded=True)
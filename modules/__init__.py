@@ -1,6 +1,29 @@
-"""DataTrack Modules"""
-from .hardware_optimizer import HardwareOptimizer
-from .video_processor import VideoProcessor
-from .multiprocessing_manager import MultiprocessingManager
+"""DataTrack Modules
 
-__all__ = ['HardwareOptimizer', 'VideoProcessor', 'MultiprocessingManager']
+Las clases se importan al usarlas: importar el paquete no carga torch ni
+ultralytics (ver startup.py).
+"""
+import importlib
+
+_EXPORTS = {
+    'HardwareOptimizer': 'hardware_optimizer',
+    'VideoProcessor': 'video_processor',
+    'MultiprocessingManager': 'multiprocessing_manager',
+    'ModelPool': 'model_pool',
+    'TrackerSession': 'tracking',
+    'FramePipeline': 'pipeline',
+    'ProcessingCancelled': 'errors',
+    'JobScheduler': 'job_scheduler',
+    'JobStore': 'job_store'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,322 @@
+"""
+Autotune - Benchmark corto en la máquina real para elegir el perfil de hardware
+
+Uso:
+    python -m modules.autotune [--model yolo11n.pt] [--device cpu] [--backends [--video clip.mp4]] [--dry-run]
+
+Mide frames/s con un video sintético barriendo hilos de torch, tamaño de
+lote, imgsz e hilos de decodificación, y guarda el perfil ganador en la
+sección `autotuned` de config/hardware_profiles.yaml. HardwareOptimizer lo
+aplica al iniciar si la huella de la máquina coincide.
+
+Con --backends compara además PyTorch, ONNX Runtime (FP32 e INT8) y
+OpenVINO lado a lado: frames/s y concordancia de detecciones con PyTorch.
+La concordancia se mide sobre un clip real (--video): el video sintético no
+tiene vehículos, así que sin --video solo se puede elegir PyTorch.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import torch
+import yaml
+
+from .benchmark import synthetic_video
+from .hardware_optimizer import PROFILES_PATH, HardwareOptimizer
+from .inference import BACKENDS, backend_available, load_exported
+from .model_pool import load_model
+
+_SECTION_COMMENT = '# Autotune (python -m modules.autotune)'
+
+
+def read_frames(path, limit=None):
+    """Frames decodificados de un video (para medir solo la inferencia)"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def benchmark_inference(model, frames, imgsz=384, batch_size=1, conf=0.5):
+    """Frames/s de model.predict sobre `frames` en lotes de batch_size"""
+    model.predict(frames[:batch_size], imgsz=imgsz, conf=conf, verbose=False)
+    started = time.perf_counter()
+    for start in range(0, len(frames), batch_size):
+        model.predict(frames[start:start + batch_size], imgsz=imgsz, conf=conf, verbose=False)
+    return len(frames) / (time.perf_counter() - started)
+
+
+def benchmark_decode(path, threads=None):
+    """Frames/s decodificando el video completo con `threads` hilos de FFmpeg"""
+    if threads:
+        cap = cv2.VideoCapture(path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, int(threads)])
+    else:
+        cap = cv2.VideoCapture(path)
+    count = 0
+    started = time.perf_counter()
+    while cap.read()[0]:
+        count += 1
+    elapsed = time.perf_counter() - started
+    cap.release()
+    return count / elapsed if elapsed > 0 else 0.0
+
+
+def _box_iou(a, b):
+    """IoU (N, M) entre cajas xyxy"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def detection_agreement(reference, candidate, iou=0.5):
+    """
+    F1 de las detecciones de `candidate` contra las de `reference`
+
+    Una detección coincide si es de la misma clase y tiene IoU >= `iou` con
+    una de referencia aún libre (emparejamiento voraz por IoU).
+    Sin detecciones de referencia no hay con qué validar: retorna None.
+    """
+    if sum(len(ref) for ref in reference) == 0:
+        return None
+    matched = total_ref = total_cand = 0
+    for ref, cand in zip(reference, candidate):
+        total_ref += len(ref)
+        total_cand += len(cand)
+        if len(ref) == 0 or len(cand) == 0:
+            continue
+        overlap = _box_iou(cand[:, :4], ref[:, :4])
+        overlap[cand[:, 5][:, None] != ref[:, 5][None, :]] = 0
+        while True:
+            row, col = np.unravel_index(np.argmax(overlap), overlap.shape)
+            if overlap[row, col] < iou:
+                break
+            matched += 1
+            overlap[row, :] = 0
+            overlap[:, col] = 0
+    return 2 * matched / (total_ref + total_cand)
+
+
+def _detections(model, frames, imgsz, conf):
+    return [result.boxes.data.cpu().numpy()
+            for result in model.predict(frames, imgsz=imgsz, conf=conf, verbose=False)]
+
+
+def compare_backends(model_path='yolo11n.pt', device='cpu', frames=None, imgsz=384, batch_size=1,
+                     conf=0.25, threads=None, video=None, log=print):
+    """
+    Frames/s y concordancia con PyTorch de cada backend instalado
+
+    Args:
+        frames: Frames para medir frames/s (por defecto, sintéticos)
+        video: Clip real para medir la concordancia; sin él se usa `frames`
+
+    Returns:
+        {nombre: {'fps', 'agreement'}} con nombres 'torch', 'onnx',
+        'onnx-int8', 'openvino' y 'openvino-int8' (los no disponibles se
+        omiten); 'agreement' es None si PyTorch no detectó nada en el clip
+    """
+    if frames is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            frames = read_frames(synthetic_video(os.path.join(tmp, 'backends.mp4'), frames=48))
+    check_frames = read_frames(video, len(frames)) if video else frames
+
+    reference_model = load_model(model_path, device)
+    reference = _detections(reference_model, check_frames, imgsz, conf)
+    if not any(len(ref) for ref in reference):
+        log("[AUTOTUNE] PyTorch no detectó nada en el clip: la concordancia no se puede "
+            "validar (usar --video con un clip con vehículos)")
+    results = {}
+    for backend in BACKENDS:
+        if not backend_available(backend):
+            log(f"[AUTOTUNE] backend {backend}: no instalado")
+            continue
+        for int8 in ((False,) if backend == 'torch' else (False, True)):
+            name = f"{backend}-int8" if int8 else backend
+            if backend == 'torch':
+                model = reference_model
+            else:
+                model = load_exported(model_path, device, backend, int8, intra_threads=threads)
+                if model is None:
+                    continue
+            fps = benchmark_inference(model, frames, imgsz=imgsz, batch_size=batch_size, conf=conf)
+            agreement = detection_agreement(reference, _detections(model, check_frames, imgsz, conf))
+            if agreement is not None:
+                agreement = round(agreement, 4)
+            results[name] = {'fps': round(fps, 2), 'agreement': agreement}
+            log(f"[AUTOTUNE] backend {name}: {fps:.1f} frames/s, concordancia "
+                f"{'sin validar' if agreement is None else f'{agreement:.3f}'}")
+    return results
+
+
+def autotune(model_path='yolo11n.pt', device='cpu', imgsz_options=(320, 384, 480, 640),
+             batch_sizes=None, thread_options=None, decode_thread_options=None,
+             frames=48, min_fps=30.0, backends=False, min_agreement=0.95, video=None, log=print):
+    """
+    Barre parámetros uno a la vez (hilos de torch → lote → imgsz) y los hilos
+    de decodificación por separado
+
+    imgsz no se elige por velocidad pura (el menor siempre gana): se toma el
+    mayor que sostiene `min_fps` frames/s, o el más rápido si ninguno lo hace.
+    Con `backends` se elige además el backend más rápido cuya concordancia
+    con PyTorch sobre `video` sea al menos `min_agreement`; si no se pudo
+    validar (sin video o sin detecciones) queda PyTorch.
+
+    Returns:
+        dict con 'profile', 'measurements', 'fingerprint' y 'tuned_at'
+    """
+    optimizer = HardwareOptimizer()
+    cores = optimizer.cpu_cores
+    if batch_sizes is None:
+        batch_sizes = (1, 4, 8, 16, 32) if device == 'cuda' else (1, 2, 4, 8)
+    if thread_options is None:
+        thread_options = sorted({1, max(1, cores // 4), max(1, cores // 2), cores})
+    if decode_thread_options is None:
+        decode_thread_options = sorted({0, 1, min(2, cores), min(4, cores)})
+
+    measurements = {'torch_threads': {}, 'batch_size': {}, 'imgsz': {}, 'decode_threads': {}}
+    original_threads = torch.get_num_threads()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Clip sintético para velocidad; `video` (real) solo para la concordancia
+        bench_video = synthetic_video(os.path.join(tmp, 'autotune.mp4'), frames=max(frames, 120))
+        sample = read_frames(bench_video, frames)
+        model = load_model(model_path, device)
+
+        def measure(name, value, **params):
+            fps = benchmark_inference(model, sample, **params)
+            measurements[name][value] = round(fps, 2)
+            log(f"[AUTOTUNE] {name}={value}: {fps:.1f} frames/s")
+            return fps
+
+        try:
+            base_batch = min(4, max(batch_sizes))
+            for threads in thread_options:
+                torch.set_num_threads(threads)
+                measure('torch_threads', threads, imgsz=384, batch_size=base_batch)
+            best_threads = max(measurements['torch_threads'], key=measurements['torch_threads'].get)
+            torch.set_num_threads(best_threads)
+
+            for batch_size in batch_sizes:
+                measure('batch_size', batch_size, imgsz=384, batch_size=batch_size)
+            best_batch = max(measurements['batch_size'], key=measurements['batch_size'].get)
+
+            for imgsz in imgsz_options:
+                measure('imgsz', imgsz, imgsz=imgsz, batch_size=best_batch)
+
+            by_imgsz = measurements['imgsz']
+            sustained = [imgsz for imgsz, fps in by_imgsz.items() if fps >= min_fps]
+            best_imgsz = max(sustained) if sustained else max(by_imgsz, key=by_imgsz.get)
+            if backends:
+                measurements['backends'] = compare_backends(
+                    model_path, device, sample, imgsz=best_imgsz, batch_size=best_batch,
+                    threads=best_threads, video=video, log=log
+                )
+        finally:
+            torch.set_num_threads(original_threads)
+
+        for threads in decode_thread_options:
+            fps = benchmark_decode(bench_video, threads)
+            measurements['decode_threads'][threads] = round(fps, 2)
+            log(f"[AUTOTUNE] decode_threads={threads}: {fps:.1f} frames/s")
+
+    best_decode = max(measurements['decode_threads'], key=measurements['decode_threads'].get)
+    profile = {
+        'torch_threads': int(best_threads),
+        'batch_size': int(best_batch),
+        'imgsz': int(best_imgsz),
+        'decode_threads': int(best_decode) or None,
+        'fps': by_imgsz[best_imgsz]
+    }
+
+    if backends:
+        # PyTorch es la referencia; los demás solo con concordancia validada
+        accepted = {name: result for name, result in measurements['backends'].items()
+                    if name == 'torch' or (result['agreement'] is not None
+                                           and result['agreement'] >= min_agreement)}
+        best_backend = max(accepted, key=lambda name: accepted[name]['fps'])
+        profile['backend'], _, quantized = best_backend.partition('-')
+        profile['int8'] = bool(quantized)
+        profile['fps'] = accepted[best_backend]['fps']
+
+    return {
+        'tuned_at': datetime.now().isoformat(timespec='seconds'),
+        'model': model_path,
+        'fingerprint': optimizer.fingerprint(),
+        'profile': profile,
+        'measurements': measurements
+    }
+
+
+def save_autotune(result, path=PROFILES_PATH):
+    """
+    Reemplaza la sección `autotuned` del YAML de perfiles
+
+    El resto del archivo (perfiles estáticos y comentarios) no se toca.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines(keepends=True)
+    except OSError:
+        lines = []
+
+    # La sección anterior va hasta la siguiente clave de primer nivel
+    kept = []
+    skipping = False
+    for line in lines:
+        if line.startswith((_SECTION_COMMENT, 'autotuned:')):
+            skipping = True
+            continue
+        if skipping and line.strip() and not line[0].isspace():
+            skipping = False
+        if not skipping:
+            kept.append(line)
+
+    section = yaml.safe_dump({'autotuned': result}, sort_keys=False, allow_unicode=True)
+    text = ''.join(kept).rstrip('\n') + f'\n\n{_SECTION_COMMENT}\n' + section
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mide esta máquina y guarda el mejor perfil')
+    parser.add_argument('--model', default='yolo11n.pt')
+    parser.add_argument('--device', default=None, help='cpu o cuda (por defecto el detectado)')
+    parser.add_argument('--frames', type=int, default=48, help='Frames por medición')
+    parser.add_argument('--min-fps', type=float, default=30.0,
+                        help='Frames/s que debe sostener el imgsz elegido')
+    parser.add_argument('--backends', action='store_true',
+                        help='Comparar PyTorch, ONNX Runtime y OpenVINO y elegir el más rápido')
+    parser.add_argument('--min-agreement', type=float, default=0.95,
+                        help='Concordancia mínima con PyTorch para aceptar un backend')
+    parser.add_argument('--video', default=None,
+                        help='Clip real con vehículos para validar la concordancia de los backends')
+    parser.add_argument('--config', default=PROFILES_PATH)
+    parser.add_argument('--dry-run', action='store_true', help='Medir sin guardar')
+    args = parser.parse_args(argv)
+    if args.video and not os.path.isfile(args.video):
+        parser.error(f'No existe el video: {args.video}')
+
+    device = args.device or HardwareOptimizer().device.type
+    result = autotune(args.model, device, frames=args.frames, min_fps=args.min_fps,
+                      backends=args.backends, min_agreement=args.min_agreement, video=args.video)
+    print(yaml.safe_dump(result['profile'], sort_keys=False))
+    if not args.dry_run:
+        save_autotune(result, args.config)
+        print(f"[AUTOTUNE] Perfil guardado en {args.config}")
+
+
+if __name__ == '__main__':
+    main()
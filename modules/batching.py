@@ -0,0 +1,275 @@
+"""
+Batching - Varios videos sobre un modelo con lotes de inferencia compartidos
+
+Cada video corre su propio process_video (pipeline, tracker y contadores
+propios) en un hilo; las llamadas a predict de todos pasan por un
+SharedBatchModel que las junta en una sola pasada del modelo. Así un lote de
+clips cortos mantiene el hardware ocupado con un único modelo en memoria.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+
+from .metrics import merge_stage_summaries
+from .pipeline import ProcessingCancelled
+from .video_processor import VideoProcessor
+
+
+class _Request:
+    __slots__ = ('frames', 'key', 'done', 'results', 'error')
+
+    def __init__(self, frames, key):
+        self.frames = frames
+        self.key = key
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class SharedBatchModel:
+    """
+    Modelo compartido por varios hilos con la interfaz de YOLO.predict
+
+    Un hilo de inferencia junta los pedidos pendientes con los mismos
+    parámetros (conf, imgsz) en una pasada de hasta `max_batch` frames y
+    devuelve a cada llamador sus resultados. Antes de lanzar la pasada espera
+    a los clientes activos que aún no pidieron, a lo sumo `max_wait` segundos.
+    """
+
+    def __init__(self, model, max_batch=16, max_wait=0.01):
+        self.model = model
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        self.stats = {'batches': 0, 'frames': 0, 'requests': 0, 'largest_batch': 0}
+        self._pending = deque()
+        self._clients = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='shared-batch', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def client(self):
+        """Registra un hilo que va a pedir inferencias (p.ej. un video)"""
+        with self._cond:
+            self._clients += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._clients -= 1
+                self._cond.notify_all()
+
+    def predict(self, source, conf=0.25, imgsz=640, verbose=False, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        request = _Request(frames, (conf, imgsz, tuple(sorted(kwargs.items()))))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SharedBatchModel cerrado")
+            self._pending.append(request)
+            self._cond.notify_all()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def summary(self):
+        """Estadísticas de los lotes, con el tamaño medio"""
+        stats = dict(self.stats)
+        stats['mean_batch'] = round(stats['frames'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _pending_frames(self, key):
+        return sum(len(request.frames) for request in self._pending if request.key == key)
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+            key = self._pending[0].key
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self._clients and self._pending_frames(key) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, frames = [], 0
+            for request in self._pending:
+                if request.key != key:
+                    continue
+                if batch and frames + len(request.frames) > self.max_batch:
+                    break
+                batch.append(request)
+                frames += len(request.frames)
+            for request in batch:
+                self._pending.remove(request)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            frames = [frame for request in batch for frame in request.frames]
+            conf, imgsz, extra = batch[0].key
+            try:
+                results = self.model.predict(frames, conf=conf, imgsz=imgsz, verbose=False, **dict(extra))
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            offset = 0
+            for request in batch:
+                request.results = results[offset:offset + len(request.frames)]
+                offset += len(request.frames)
+                request.done.set()
+            self.stats['batches'] += 1
+            self.stats['frames'] += len(frames)
+            self.stats['requests'] += len(batch)
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(frames))
+
+
+def frame_count(path):
+    """Frames declarados por el contenedor (0 si no se puede abrir)"""
+    cap = cv2.VideoCapture(path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    finally:
+        cap.release()
+
+
+def process_videos(videos, model, device='cpu', tracker_cfg='botsort.yaml', parallel=4, max_batch=16,
+                   max_wait=0.01, on_progress=None, cancel_event=None, **options):
+    """
+    Procesa varios videos con un solo modelo y lotes de inferencia compartidos
+
+    Args:
+        videos: Lista de rutas o de dicts {'path', 'video_id'?, ...opciones de
+            process_video propias del video, p.ej. 'regions' de su cámara}
+        model: Modelo ya cargado (p.ej. prestado por ModelPool)
+        parallel: Videos abiertos a la vez; cada uno con su pipeline y tracker
+        max_batch: Frames máximos por pasada del modelo
+        on_progress: Callback(frames, total_frames, batch) con el avance de
+            todos los videos y el conteo {'total', 'done', 'failed', 'running'}
+        options: Opciones de process_video comunes a todos los videos
+
+    Returns:
+        dict con 'videos' (resultados o error por video), totales agregados,
+        'stages' y 'batching'
+    """
+    entries = []
+    for index, video in enumerate(videos):
+        video = {'path': video} if isinstance(video, str) else dict(video)
+        video.setdefault('video_id', f'{index:03d}_{os.path.basename(video["path"])}')
+        entries.append(video)
+
+    totals = {video['video_id']: frame_count(video['path']) for video in entries}
+    done_frames = dict.fromkeys(totals, 0)
+    status = dict.fromkeys(totals, 'queued')
+    lock = threading.Lock()
+
+    def report():
+        if on_progress is None:
+            return
+        # Bajo el lock: el callback se llama desde los hilos de todos los videos
+        with lock:
+            counts = {
+                'total': len(status),
+                'done': sum(state == 'completed' for state in status.values()),
+                'failed': sum(state == 'error' for state in status.values()),
+                'running': [video_id for video_id, state in status.items() if state == 'processing']
+            }
+            on_progress(sum(done_frames.values()), sum(totals.values()), counts)
+
+    results = {}
+    todo = queue.Queue()
+    for video in entries:
+        todo.put(video)
+
+    def worker(batcher):
+        while not (cancel_event is not None and cancel_event.is_set()):
+            try:
+                video = todo.get_nowait()
+            except queue.Empty:
+                return
+            video = dict(video)
+            video_id = video.pop('video_id')
+            path = video.pop('path')
+
+            def on_video_progress(current, total, video_id=video_id):
+                with lock:
+                    done_frames[video_id] = current
+                report()
+
+            with lock:
+                status[video_id] = 'processing'
+            report()
+            processor = VideoProcessor(model=batcher, device=device, tracker_cfg=tracker_cfg)
+            try:
+                with batcher.client():
+                    result = processor.process_video(path, cancel_event=cancel_event,
+                                                     on_progress=on_video_progress, **dict(options, **video))
+                result.update(video_id=video_id, video_path=path, status='completed')
+            except ProcessingCancelled:
+                with lock:
+                    status[video_id] = 'cancelled'
+                return
+            except Exception as e:
+                print(f"[BATCH] Error en {path}: {e}")
+                result = {'video_id': video_id, 'video_path': path, 'status': 'error', 'error': str(e)}
+            with lock:
+                results[video_id] = result
+                status[video_id] = result['status']
+                if result['status'] == 'completed':
+                    done_frames[video_id] = totals[video_id] or done_frames[video_id]
+            report()
+
+    with SharedBatchModel(model, max_batch=max_batch, max_wait=max_wait) as batcher:
+        workers = [threading.Thread(target=worker, args=(batcher,), name=f'batch-video-{i}', daemon=True)
+                   for i in range(max(1, min(parallel, len(entries))))]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    if cancel_event is not None and cancel_event.is_set():
+        raise ProcessingCancelled()
+
+    completed = [results[video['video_id']] for video in entries if results[video['video_id']]['status'] == 'completed']
+    by_type = {}
+    for result in completed:
+        for vehicle_type, count in result.get('vehicles_by_type_unique', {}).items():
+            by_type[vehicle_type] = by_type.get(vehicle_type, 0) + count
+    return {
+        'videos': {video['video_id']: results[video['video_id']] for video in entries},
+        'video_count': len(entries),
+        'completed': len(completed),
+        'failed': len(entries) - len(completed),
+        'total_vehicles': sum(result.get('total_vehicles', 0) for result in completed),
+        'vehicles_by_type_unique': by_type,
+        'total_frames': sum(result.get('total_frames', 0) for result in completed),
+        'stages': merge_stage_summaries(result.get('stages', {}) for result in completed),
+        'batching': batcher.summary()
+    }
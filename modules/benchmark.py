@@ -0,0 +1,407 @@
+"""
+Benchmark - Suite reproducible de rendimiento con videos sintéticos
+
+Uso:
+    python -m modules.benchmark [--detector stub|yolo11n.pt] [--sizes 1280x720,1920x1080]
+                                [--densities 4,16] [--frames 300] [--output bench.json]
+                                [--motion-gate ['{"max_gap": 5}']] [--compare baseline.json]
+
+Genera videos deterministas (cajas de colores que cruzan la escena por
+carriles), corre VideoProcessor.process_video sobre cada combinación de
+resolución y densidad en un proceso nuevo y reporta en JSON frames/s por
+etapa y pico de RSS. Con el detector stub no hacen falta pesos ni red: las
+cajas se encuentran por color, así se miden decodificación, tracking,
+regiones y agregación sin el costo del modelo.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from ultralytics.engine.results import Boxes
+
+from .video_processor import VideoProcessor
+
+# Clase COCO -> (color BGR, (ancho, alto) a 720p, proporción en la escena)
+VEHICLE_STYLES = {
+    2: ((40, 40, 220), (110, 55), 0.6),   # car
+    3: ((40, 200, 40), (45, 30), 0.15),   # motorcycle
+    5: ((220, 60, 40), (210, 75), 0.1),   # bus
+    7: ((30, 200, 220), (160, 70), 0.15)  # truck
+}
+
+_PALETTE_HUES = {
+    class_id: int(cv2.cvtColor(np.uint8([[color]]), cv2.COLOR_BGR2HSV)[0, 0, 0])
+    for class_id, (color, _, _) in VEHICLE_STYLES.items()
+}
+
+# Métricas donde un valor menor es una regresión (el resto: mayor es peor)
+_HIGHER_IS_BETTER = ('fps',)
+
+
+def synthetic_video(path, frames=120, size=(1280, 720), fps=30.0, vehicles=6, seed=0):
+    """
+    Escribe un video determinista con vehículos (cajas de color por clase)
+    que cruzan la escena por carriles sobre un fondo gris con textura
+
+    El fondo no tiene saturación y cada clase tiene un tono propio, así
+    StubDetector encuentra las cajas sin un modelo.
+
+    Returns:
+        Ruta del video
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    scale = height / 720
+    background = rng.integers(60, 120, (height, width), dtype=np.uint8)
+    background = cv2.cvtColor(cv2.GaussianBlur(background, (0, 0), 3), cv2.COLOR_GRAY2BGR)
+
+    # Carriles separados: los vehículos de un carril no se tocan con los del otro
+    class_ids = list(VEHICLE_STYLES)
+    weights = np.array([VEHICLE_STYLES[class_id][2] for class_id in class_ids])
+    lane_height = 90 * scale
+    lanes = max(1, min(vehicles, int(0.9 * height / lane_height)))
+    lane_y = (height - lanes * lane_height) / 2 + np.arange(lanes) * lane_height
+    lane_speed = rng.uniform(3, 9, lanes) * scale * np.where(np.arange(lanes) % 2, -1, 1)
+    lane_phase = rng.uniform(0, width, lanes)
+    margin = int(220 * scale)
+    span = width + 2 * margin
+
+    fleet = []
+    for idx in range(vehicles):
+        lane = idx % lanes
+        per_lane = len(range(lane, vehicles, lanes))
+        class_id = class_ids[rng.choice(len(class_ids), p=weights / weights.sum())]
+        color, (box_w, box_h), _ = VEHICLE_STYLES[class_id]
+        fleet.append((lane, lane_phase[lane] + span * (idx // lanes) / per_lane, color,
+                      int(box_w * scale), int(box_h * scale)))
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for index in range(frames):
+        frame = background.copy()
+        for lane, start, color, box_w, box_h in fleet:
+            x = int((start + lane_speed[lane] * index) % span) - margin
+            y = int(lane_y[lane] + (lane_height - box_h) / 2)
+            cv2.rectangle(frame, (x, y), (x + box_w, y + box_h), color, -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+class StubDetector:
+    """
+    Detector sin pesos con la interfaz de YOLO.predict que usa VideoProcessor
+
+    Encuentra las cajas de synthetic_video por saturación (componentes
+    conexas sobre el frame reducido a `imgsz`) y asigna la clase por tono.
+    Con `latency_ms` simula además el tiempo de un modelo por frame.
+    """
+
+    def __init__(self, latency_ms=0.0, min_area=40, conf=0.9):
+        self.latency_ms = latency_ms
+        self.min_area = min_area
+        self.conf = conf
+        self._class_ids = np.array(list(_PALETTE_HUES))
+        self._hues = np.array(list(_PALETTE_HUES.values()))
+
+    def predict(self, source, conf=0.25, imgsz=640, verbose=False, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        started = time.perf_counter()
+        results = [SimpleNamespace(boxes=self._detect(frame, imgsz)) for frame in frames]
+
+        remaining = self.latency_ms * len(frames) / 1000 - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        return results
+
+    def _detect(self, frame, imgsz):
+        height, width = frame.shape[:2]
+        ratio = min(1.0, imgsz / max(height, width))
+        small = frame if ratio == 1.0 else cv2.resize(frame, None, fx=ratio, fy=ratio,
+                                                      interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        mask = (hsv[..., 1] > 100).astype(np.uint8)
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=4)
+
+        keep = stats[1:, cv2.CC_STAT_AREA] >= self.min_area * ratio * ratio
+        stats, centroids = stats[1:][keep], centroids[1:][keep]
+        hues = hsv[centroids[:, 1].astype(int), centroids[:, 0].astype(int), 0].astype(int)
+        distance = np.abs(hues[:, None] - self._hues[None, :])
+        distance = np.minimum(distance, 180 - distance)  # tono circular (0-179 en OpenCV)
+
+        x, y, w, h = (stats[:, column] for column in range(4))
+        data = np.column_stack([
+            x / ratio, y / ratio, (x + w) / ratio, (y + h) / ratio,
+            np.full(len(stats), self.conf), self._class_ids[np.argmin(distance, axis=1)]
+        ]).astype(np.float32).reshape(-1, 6)
+        return Boxes(data, (height, width))
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS, bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def processing_size(width, height):
+    """Tamaño al que process_video reduce los frames"""
+    if width > 1280 or height > 720:
+        return int(width * 0.5), int(height * 0.5)
+    return width, height
+
+
+def stripe_regions(width, height, count):
+    """`count` regiones verticales que cubren el frame de procesamiento"""
+    width, height = processing_size(width, height)
+    step = width / max(1, count)
+    return [
+        [int(idx * step), 0, int((idx + 1) * step), 0, int((idx + 1) * step), height, int(idx * step), height]
+        for idx in range(count)
+    ]
+
+
+def benchmark_case(video, detector='stub', device='cpu', tracker_cfg='botsort.yaml', regions=2,
+                   latency_ms=0.0, **options):
+    """
+    Corre process_video una vez en este proceso
+
+    Args:
+        video: Ruta del video
+        detector: 'stub' o ruta de pesos YOLO
+        regions: Cantidad de regiones verticales (ver stripe_regions)
+        latency_ms: Latencia simulada por frame del detector stub
+        options: Argumentos de process_video (batch_size, imgsz, frame_skip...)
+
+    Returns:
+        dict con frames/s totales y por etapa, RSS y conteos
+    """
+    cap = cv2.VideoCapture(video)
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    rss_before = peak_rss_mb()
+    model = StubDetector(latency_ms) if detector == 'stub' else None
+    processor = VideoProcessor(model_path=detector, device=device, model=model, tracker_cfg=tracker_cfg)
+    rss_loaded = peak_rss_mb()
+
+    started = time.perf_counter()
+    results = processor.process_video(video, regions=stripe_regions(width, height, regions), **options)
+    wall = time.perf_counter() - started
+
+    frames = results['decode']['decoded']
+    stages = {}
+    for stage, data in results['stages'].items():
+        stages[stage] = dict(data)
+        if stage not in ('wait', 'serialization'):
+            stages[stage]['fps'] = round(frames / data['seconds'], 1) if data['seconds'] > 0 else None
+
+    return {
+        'frames': frames,
+        'wall_s': round(wall, 3),
+        'fps': round(frames / wall, 2) if wall > 0 else None,
+        'stages': stages,
+        'rss_mb': {'start': rss_before, 'model': rss_loaded, 'peak': peak_rss_mb()},
+        'total_vehicles': results['total_vehicles'],
+        'vehicles_by_type_unique': results['vehicles_by_type_unique'],
+        'track_table': results['track_table'],
+        'motion_gate': results.get('motion_gate')
+    }
+
+
+def _run_isolated(kwargs):
+    # Un proceso por caso: el pico de RSS y las cachés no se arrastran entre casos
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(benchmark_case, kwds=kwargs)
+
+
+def run_suite(sizes=((1280, 720), (1920, 1080)), densities=(4, 16), frames=300, fps=30.0,
+              seed=0, repeat=1, workdir=None, isolate=True, log=print, **case_options):
+    """
+    Genera (o reutiliza) los videos sintéticos y corre un caso por
+    combinación de tamaño y densidad
+
+    Con `repeat` cada caso corre varias veces y se reporta la corrida de
+    frames/s mediana (las demás quedan en 'runs_fps'), para que el ruido de
+    la máquina no parezca una regresión.
+
+    Returns:
+        Reporte (dict serializable a JSON)
+    """
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__
+        },
+        'config': dict(case_options, frames=frames, fps=fps, seed=seed, repeat=repeat),
+        'cases': []
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for width, height in sizes:
+            for density in densities:
+                name = f'{width}x{height}-d{density}'
+                video = os.path.join(workdir, f'synthetic_{name}_{frames}f_{fps:g}fps_s{seed}.mp4')
+                if not os.path.exists(video):
+                    synthetic_video(video, frames, (width, height), fps, density, seed)
+
+                kwargs = dict(case_options, video=video)
+                runs = [_run_isolated(kwargs) if isolate else benchmark_case(**kwargs)
+                        for _ in range(max(1, repeat))]
+                runs.sort(key=lambda run: run['fps'] or 0)
+                case = dict(runs[len(runs) // 2], runs_fps=[run['fps'] for run in runs])
+                report['cases'].append(dict(name=name, width=width, height=height, density=density, **case))
+                log(f"[BENCHMARK] {name}: {case['fps']} frames/s, pico {case['rss_mb']['peak']} MB")
+    return report
+
+
+def compare_reports(current, baseline, tolerance=0.1):
+    """
+    Compara dos reportes caso a caso
+
+    Returns:
+        Lista de dicts (case, metric, baseline, current, change, regression);
+        es regresión si los frames/s bajan o el pico de RSS sube más de `tolerance`,
+        o si cambia el conteo de vehículos (p.ej. un reporte con --motion-gate
+        contra uno sin él). Las etapas con menos del 1% del tiempo total no se
+        comparan (ruido).
+    """
+    previous = {case['name']: case for case in baseline['cases']}
+    rows = []
+    for case in current['cases']:
+        before = previous.get(case['name'])
+        if before is None:
+            continue
+        # Optimizaciones que no deben cambiar resultados: el conteo es exacto
+        if 'total_vehicles' in before:
+            old, new = before['total_vehicles'], case['total_vehicles']
+            rows.append({
+                'case': case['name'],
+                'metric': 'total_vehicles',
+                'baseline': old,
+                'current': new,
+                'change': round((new - old) / old, 4) if old else float(new != old),
+                'regression': new != old
+            })
+        metrics = [('fps', before['fps'], case['fps']),
+                   ('peak_rss_mb', before['rss_mb']['peak'], case['rss_mb']['peak'])]
+        for stage, data in case['stages'].items():
+            if 'fps' in data and stage in before['stages'] and data['seconds'] >= 0.01 * case['wall_s']:
+                metrics.append((f'{stage}.fps', before['stages'][stage].get('fps'), data['fps']))
+
+        for metric, old, new in metrics:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric.endswith(_HIGHER_IS_BETTER) else change
+            rows.append({
+                'case': case['name'],
+                'metric': metric,
+                'baseline': old,
+                'current': new,
+                'change': round(change, 4),
+                'regression': worse > tolerance
+            })
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _parse_sizes(text):
+    return [tuple(int(v) for v in size.lower().split('x')) for size in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark reproducible con videos sintéticos')
+    parser.add_argument('--detector', default='stub', help="'stub' (sin pesos) o ruta del modelo")
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--tracker', default='botsort.yaml')
+    parser.add_argument('--sizes', default='1280x720,1920x1080', help='Resoluciones AnchoxAlto')
+    parser.add_argument('--densities', default='4,16', help='Vehículos en escena')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='Corridas por caso (se reporta la mediana)')
+    parser.add_argument('--regions', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--imgsz', type=int, default=384)
+    parser.add_argument('--frame-skip', type=int, default=1)
+    parser.add_argument('--motion-gate', nargs='?', const='{}', default=None,
+                        help='Activar MotionGate (opcional: JSON con sus opciones)')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='Latencia simulada por frame del detector stub')
+    parser.add_argument('--workdir', default=None, help='Carpeta para reutilizar los videos generados')
+    parser.add_argument('--in-process', action='store_true',
+                        help='No aislar cada caso en un proceso (el RSS pico se acumula)')
+    parser.add_argument('--output', default=None, help='Archivo JSON (por defecto, stdout)')
+    parser.add_argument('--compare', default=None, help='Reporte base para detectar regresiones')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    report = run_suite(
+        sizes=_parse_sizes(args.sizes),
+        densities=[int(v) for v in args.densities.split(',')],
+        frames=args.frames,
+        fps=args.fps,
+        seed=args.seed,
+        repeat=args.repeat,
+        workdir=args.workdir,
+        isolate=not args.in_process,
+        log=lambda message: print(message, file=sys.stderr),
+        detector=args.detector,
+        device=args.device,
+        tracker_cfg=args.tracker,
+        regions=args.regions,
+        latency_ms=args.latency_ms,
+        batch_size=args.batch_size,
+        imgsz=args.imgsz,
+        frame_skip=args.frame_skip,
+        motion_gate=json.loads(args.motion_gate) if args.motion_gate is not None else None
+    )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            rows = compare_reports(report, json.load(f), args.tolerance)
+        for row in rows:
+            flag = '  REGRESIÓN' if row['regression'] else ''
+            print(f"{row['case']:<20} {row['metric']:<20} {row['baseline']:>10} -> {row['current']:>10} "
+                  f"({row['change']:+.1%}){flag}", file=sys.stderr)
+        if any(row['regression'] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Counting - Acumulación de conteos de vehículos por tipo y región
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from .regions import RegionMask, anchor_points
+from .tracking import TrackTable
+
+
+class VehicleCounter:
+    """
+    Acumula vehículos únicos (por track ID) y detecciones por tipo y región
+
+    Los IDs no se guardan en sets que crecen todo el video: cada track activo
+    vive en una TrackTable compacta y al desalojarse solo quedan sus conteos
+    en los totales.
+    """
+
+    def __init__(self, vehicle_classes, regions=None, frame_size=None, anchor='top_left',
+                 evict_after=1800):
+        """
+        Args:
+            vehicle_classes: {class_id: tipo} de las clases que se cuentan
+            regions: Lista de polígonos en coordenadas de procesamiento
+            frame_size: (ancho, alto) de procesamiento, necesario si hay regiones
+            anchor: Punto de la caja usado para asignar regiones (ver regions.ANCHORS)
+            evict_after: Frames de video sin ver un track antes de desalojarlo
+                (None: nunca)
+        """
+        self.vehicle_classes = vehicle_classes
+        self.regions = regions or []
+        self.anchor = anchor
+        self._class_ids = np.array(sorted(vehicle_classes), dtype=np.int64)
+
+        # Regiones rasterizadas una vez por job
+        self.region_mask = RegionMask(self.regions, *frame_size) if self.regions else None
+
+        self.tracks = TrackTable(evict_after)
+        self.total_vehicles = 0
+        self.unique_by_type = defaultdict(int)
+        self.detections_by_type = defaultdict(int)
+        self.by_region = defaultdict(lambda: {'count': 0, 'types': {}, 'unique_count': 0})
+        self._last_frame = 0
+
+        # Timeline opcional (ver timeline.Timeline), alimentado en add_tracks
+        self.timeline = None
+
+    @property
+    def vehicle_types(self):
+        """Tipos en el orden de columnas del timeline (y de TrackRecord.type_bits)"""
+        return [self.vehicle_classes[int(class_id)] for class_id in self._class_ids]
+
+    def vehicle_tracks(self, tracks):
+        """Filas de `tracks` cuya clase es un tipo de vehículo contado"""
+        return tracks[np.isin(tracks[:, 6].astype(np.int64), self._class_ids)]
+
+    def add_tracks(self, tracks, frame_index=None):
+        """
+        Cuenta los tracks de un frame
+
+        Args:
+            tracks: np.ndarray (N, >=7) con [x1, y1, x2, y2, track_id, conf, cls, ...]
+            frame_index: Frame de los tracks (por defecto, el siguiente al anterior)
+        """
+        frame_index = self._last_frame + 1 if frame_index is None else frame_index
+        self._last_frame = frame_index
+        self.tracks.evict(frame_index)
+
+        tracks = self.vehicle_tracks(tracks)
+        if len(tracks) == 0:
+            return
+
+        track_ids = tracks[:, 4].astype(np.int64).tolist()
+        class_ids = tracks[:, 6].astype(np.int64)
+        type_idx = np.searchsorted(self._class_ids, class_ids)
+
+        records = []
+        new_ids, new_type_idx = [], []
+        for track_id, class_id, idx in zip(track_ids, class_ids.tolist(), type_idx.tolist()):
+            vehicle_type = self.vehicle_classes[class_id]
+            record = self.tracks.get(track_id)
+            if record is None:
+                record = self.tracks.add(track_id, frame_index, class_id)
+                self.total_vehicles += 1
+                new_ids.append(track_id)
+                new_type_idx.append(idx)
+            else:
+                self.tracks.touch(track_id, record, frame_index, class_id)
+            if not record.type_bits >> idx & 1:
+                record.type_bits |= 1 << idx
+                self.unique_by_type[vehicle_type] += 1
+            self.detections_by_type[vehicle_type] += 1
+            records.append(record)
+
+        if self.timeline is not None:
+            self.timeline.add_detections(frame_index, type_idx, new_ids, new_type_idx)
+
+        # Verificar regiones solo si existen: un lookup para todas las cajas
+        if self.region_mask is not None:
+            member = self.region_mask.lookup(anchor_points(tracks[:, :4], self.anchor))
+            for idx in np.flatnonzero(member.any(axis=1)).tolist():
+                selected = member[idx]
+                bit = 1 << idx
+                region_data = self.by_region[f'region_{idx}']
+                region_new = []
+                for row in np.flatnonzero(selected).tolist():
+                    if not records[row].region_bits & bit:
+                        records[row].region_bits |= bit
+                        region_new.append(track_ids[row])
+                if self.timeline is not None:
+                    self.timeline.add_region(frame_index, idx, int(selected.sum()), region_new)
+                region_data['count'] += int(selected.sum())
+                region_data['unique_count'] += len(region_new)
+                for class_id, count in zip(*np.unique(class_ids[selected], return_counts=True)):
+                    vehicle_type = self.vehicle_classes[int(class_id)]
+                    region_data['types'][vehicle_type] = region_data['types'].get(vehicle_type, 0) + int(count)
+
+    def summary(self):
+        """Retorna los conteos con el formato de resultados de VideoProcessor"""
+        by_region = {}
+        for region_key, data in self.by_region.items():
+            by_region[region_key] = {
+                'count': data['count'],
+                'types': dict(data['types']),
+                'unique_count': data['unique_count']
+            }
+
+        return {
+            # Total de vehículos únicos
+            'total_vehicles': self.total_vehicles,
+            # Detecciones (instancias) por tipo
+            'vehicles_by_type': dict(self.detections_by_type),
+            # Vehículos ÚNICOS por tipo
+            'vehicles_by_type_unique': dict(self.unique_by_type),
+            'vehicles_by_region': by_region
+        }
+
+    def get_state(self):
+        """Totales y tracks activos serializables, para combinar o retomar conteos"""
+        state = self.summary()
+        state.update({
+            'vehicle_types': self.vehicle_types,
+            'last_frame': self._last_frame,
+            'tracks': self.tracks.get_state()
+        })
+        return state
+
+    def load_state(self, state):
+        """Restaura un estado obtenido con get_state() (p.ej. desde un checkpoint)"""
+        self.total_vehicles = state['total_vehicles']
+        self.unique_by_type = defaultdict(int, state['vehicles_by_type_unique'])
+        self.detections_by_type = defaultdict(int, state['vehicles_by_type'])
+        self.by_region.clear()
+        for region_key, data in state['vehicles_by_region'].items():
+            self.by_region[region_key] = {
+                'count': data['count'],
+                'types': dict(data['types']),
+                'unique_count': data['unique_count']
+            }
+        self._last_frame = state['last_frame']
+        self.tracks.load_state(state['tracks'])
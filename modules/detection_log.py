@@ -0,0 +1,180 @@
+"""
+Detection Log - Registro de cada detección de vehículo escrito en segundo plano
+"""
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+# Registro binario de tamaño fijo (se lee con np.memmap / np.fromfile)
+RECORD_DTYPE = np.dtype([
+    ('frame', '<i4'), ('track_id', '<i4'), ('class_id', '<i2'), ('conf', '<f4'),
+    ('x1', '<f4'), ('y1', '<f4'), ('x2', '<f4'), ('y2', '<f4')
+])
+
+FORMATS = ('ndjson', 'binary')
+
+
+class DetectionLogWriter:
+    """
+    Escribe detecciones en un archivo append-only (NDJSON o binario)
+
+    El hilo de procesamiento solo acumula filas; cada `flush_rows` filas se
+    pasa un bloque a un hilo escritor por una cola acotada (si el disco no da
+    abasto, el procesamiento espera). La memoria usada no depende del largo
+    del video.
+    """
+
+    def __init__(self, path, fmt='ndjson', class_names=None, fps=0, scale=1.0,
+                 flush_rows=4096, queue_size=8, offset=None, rows=0):
+        """
+        Args:
+            path: Archivo de salida
+            fmt: 'ndjson' (una detección por línea) o 'binary' (RECORD_DTYPE)
+            class_names: {class_id: tipo} para el NDJSON
+            fps: FPS del video, para el tiempo de cada detección
+            scale: Factor para llevar las cajas a coordenadas del video original
+            offset: Al retomar, bytes válidos del archivo (se descarta el resto)
+            rows: Al retomar, detecciones ya registradas hasta `offset`
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato desconocido: {fmt} (opciones: {', '.join(FORMATS)})")
+        self.path = path
+        self.fmt = fmt
+        self.class_names = class_names or {}
+        self.fps = fps
+        self.scale = scale
+        self.flush_rows = flush_rows
+        self.rows = rows if offset is not None else 0
+
+        if offset is not None and os.path.exists(path):
+            self._file = open(path, 'r+b')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+        else:
+            self._file = open(path, 'wb')
+
+        self._pending = []
+        self._pending_rows = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='detection-log', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def write(self, frame_index, tracks):
+        """Agrega los tracks (N, >=7) de un frame"""
+        if len(tracks) == 0:
+            return
+        block = np.empty(len(tracks), dtype=RECORD_DTYPE)
+        block['frame'] = frame_index
+        block['track_id'] = tracks[:, 4]
+        block['class_id'] = tracks[:, 6]
+        block['conf'] = tracks[:, 5]
+        for column, name in enumerate(('x1', 'y1', 'x2', 'y2')):
+            block[name] = tracks[:, column] * self.scale
+        self._pending.append(block)
+        self._pending_rows += len(block)
+        if self._pending_rows >= self.flush_rows:
+            self._flush_pending()
+
+    def sync(self):
+        """
+        Espera a que todo lo escrito llegue al archivo
+
+        Returns:
+            Bytes escritos (offset para retomar)
+        """
+        self._flush_pending()
+        self._queue.join()
+        self._raise_error()
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        self._flush_pending()
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._raise_error()
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        self._raise_error()
+        self._queue.put(np.concatenate(self._pending))
+        self.rows += self._pending_rows
+        self._pending = []
+        self._pending_rows = 0
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            try:
+                if block is None:
+                    return
+                if self._error is None:
+                    self._file.write(self._encode(block))
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _encode(self, block):
+        if self.fmt == 'binary':
+            return block.tobytes()
+        return encode_ndjson(block, self.class_names, self.fps)
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+def encode_ndjson(block, class_names, fps):
+    """Bloque de RECORD_DTYPE a líneas NDJSON (bytes)"""
+    lines = []
+    for frame, track_id, class_id, conf, x1, y1, x2, y2 in block.tolist():
+        lines.append(json.dumps({
+            'frame': frame,
+            't': round((frame - 1) / fps, 3) if fps else None,
+            'track_id': track_id,
+            'class': class_names.get(class_id, class_id),
+            'conf': round(conf, 4),
+            'bbox': [round(x1, 1), round(y1, 1), round(x2, 1), round(y2, 1)]
+        }, separators=(',', ':')))
+    lines.append('')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def iter_detection_log(path, fmt, output=None, class_names=None, fps=0, chunk_size=1024 * 1024):
+    """
+    Lee un registro en bloques para enviarlo como stream
+
+    Args:
+        fmt: Formato del archivo
+        output: Formato de salida; 'ndjson' convierte un registro binario
+    """
+    if output in (None, fmt):
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    if fmt != 'binary' or output != 'ndjson':
+        raise ValueError(f'No se puede convertir {fmt} a {output}')
+    if os.path.getsize(path) == 0:
+        return
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+    rows = max(1, chunk_size // RECORD_DTYPE.itemsize)
+    for start in range(0, len(records), rows):
+        yield encode_ndjson(np.array(records[start:start + rows]), class_names or {}, fps)
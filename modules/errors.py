@@ -0,0 +1,7 @@
+"""
+Errors - Excepciones compartidas, sin dependencias pesadas (la app las importa al iniciar)
+"""
+
+
+class ProcessingCancelled(Exception):
+    """El procesamiento se canceló antes de terminar"""
@@ -4,18 +4,85 @@ Hardware Optimizer - Detección y optimización automática de hardware
 import torch
 import psutil
 import os
+import platform
+import yaml
 from multiprocessing import cpu_count
 
+from .inference import resolve_backend
+
+# Perfiles estáticos y resultado del autotune (ver modules/autotune.py)
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'config', 'hardware_profiles.yaml')
+
+# Valores de un perfil que se pueden ajustar desde el YAML
+_PROFILE_KEYS = ('batch_size', 'frame_skip', 'confidence', 'backend', 'int8', 'inter_threads')
+_TUNED_KEYS = ('batch_size', 'imgsz', 'torch_threads', 'decode_threads', 'backend', 'int8')
+
+
+def load_profiles(path=PROFILES_PATH):
+    """Contenido del YAML de perfiles, o {} si no existe o no se puede leer"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError):
+        return {}
+
 
 class HardwareOptimizer:
     """Detecta y optimiza según el hardware disponible"""
     
-    def __init__(self):
+    def __init__(self, profiles_path=PROFILES_PATH):
         self.device = self._detect_device()
         self.cpu_cores = cpu_count()
         self.ram_gb = psutil.virtual_memory().total / (1024 ** 3)
         self.vram_gb = self._get_vram()
+        self.config = load_profiles(profiles_path)
         self.profile = self._get_profile()
+        
+        # Valores medidos en esta máquina (python -m modules.autotune)
+        self.autotuned = self._get_autotuned()
+        if self.autotuned:
+            self.profile.update({key: self.autotuned['profile'][key]
+                                 for key in _TUNED_KEYS if key in self.autotuned['profile']})
+        
+        # Backend exportado sin sus dependencias instaladas: PyTorch
+        self.profile['backend'] = resolve_backend(self.profile['backend'])
+    
+    def fingerprint(self):
+        """Identifica la máquina: un autotune solo se aplica donde se midió"""
+        cpu = platform.processor()
+        try:
+            with open('/proc/cpuinfo') as f:
+                cpu = next((line.split(':', 1)[1].strip() for line in f
+                            if line.startswith('model name')), cpu)
+        except OSError:
+            pass
+        return {
+            'device': self.device.type,
+            'cpu': cpu,
+            'cpu_cores': self.cpu_cores,
+            'gpu': torch.cuda.get_device_name(0) if self.device.type == 'cuda' else None
+        }
+    
+    def apply_threads(self):
+        """Aplica los hilos de torch del perfil al proceso"""
+        if self.profile.get('torch_threads'):
+            torch.set_num_threads(int(self.profile['torch_threads']))
+        if self.profile.get('inter_threads'):
+            try:
+                torch.set_interop_threads(int(self.profile['inter_threads']))
+            except RuntimeError:
+                # Solo se puede fijar antes del primer trabajo en paralelo de torch
+                pass
+    
+    def inference_options(self):
+        """Opciones de backend para model_pool.load_model según el perfil"""
+        return {
+            'backend': self.profile['backend'],
+            'int8': bool(self.profile['int8']),
+            'intra_threads': self.profile['torch_threads'],
+            'inter_threads': self.profile['inter_threads']
+        }
     
     def _detect_device(self):
         """Detecta si hay GPU disponible"""
@@ -30,6 +97,26 @@ class HardwareOptimizer:
         return 0
     
     def _get_profile(self):
+        """Perfil según hardware, con los valores de config/hardware_profiles.yaml"""
+        profile = self._get_base_profile()
+        configured = (self.config.get('profiles') or {}).get(profile['name']) or {}
+        profile.update({key: configured[key] for key in _PROFILE_KEYS if key in configured})
+        profile.setdefault('backend', 'torch')
+        profile.setdefault('int8', False)
+        profile.setdefault('inter_threads', None)
+        profile.setdefault('imgsz', 384)
+        profile.setdefault('torch_threads', None)
+        profile.setdefault('decode_threads', None)
+        return profile
+    
+    def _get_autotuned(self):
+        """Resultado del autotune guardado para esta máquina, o None"""
+        tuned = self.config.get('autotuned')
+        if not tuned or tuned.get('fingerprint') != self.fingerprint():
+            return None
+        return tuned
+    
+    def _get_base_profile(self):
         """Define el perfil de optimización según hardware"""
         is_gpu = self.device.type == 'cuda'
         
@@ -72,6 +159,18 @@ class HardwareOptimizer:
                     'confidence': 0.7
                 }
     
+    def get_max_jobs(self):
+        """Jobs simultáneos recomendados según núcleos, RAM y VRAM"""
+        # ~2GB de RAM por job (modelo, colas de frames y resultados)
+        by_ram = max(1, int(self.ram_gb // 2))
+        if self.device.type == 'cuda':
+            # ~2GB de VRAM por modelo con sus activaciones
+            by_device = max(1, int(self.vram_gb // 2))
+        else:
+            # torch usa varios hilos por job; más jobs solo compiten por núcleos
+            by_device = max(1, self.cpu_cores // 4)
+        return max(1, min(self.profile['workers'], by_ram, by_device))
+    
     def get_info(self):
         """Retorna información del hardware"""
         return {
@@ -82,5 +181,12 @@ class HardwareOptimizer:
             'profile': self.profile['name'],
             'batch_size': self.profile['batch_size'],
             'workers': self.profile['workers'],
-            'frame_skip': self.profile['frame_skip']
+            'frame_skip': self.profile['frame_skip'],
+            'imgsz': self.profile['imgsz'],
+            'torch_threads': self.profile['torch_threads'],
+            'decode_threads': self.profile['decode_threads'],
+            'backend': self.profile['backend'],
+            'int8': self.profile['int8'],
+            'autotuned': self.autotuned.get('tuned_at') if self.autotuned else None,
+            'max_jobs': self.get_max_jobs()
         }
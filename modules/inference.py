@@ -0,0 +1,208 @@
+"""
+Inference - Backends de inferencia exportados (ONNX Runtime, OpenVINO) con la interfaz de YOLO.predict
+
+Los backends exportados son opcionales: requieren `onnx` y `onnxruntime`
+(ONNX) u `openvino` (OpenVINO). Sin ellos model_pool.load_model usa PyTorch.
+"""
+import ast
+import glob
+import importlib.util
+import os
+import shutil
+import threading
+
+import numpy as np
+import torch
+from ultralytics.data.augment import LetterBox
+from ultralytics.engine.results import Results
+from ultralytics.utils import ops, yaml_load
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+_REQUIREMENTS = {
+    'torch': (),
+    'onnx': ('onnx', 'onnxruntime'),
+    'openvino': ('openvino',)
+}
+
+# Una sola exportación a la vez por proceso (el artefacto se escribe junto a los pesos)
+_export_lock = threading.Lock()
+
+
+def backend_available(backend):
+    """True si las dependencias del backend están instaladas"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
+    return all(importlib.util.find_spec(name) is not None for name in _REQUIREMENTS[backend])
+
+
+def resolve_backend(backend):
+    """Backend que se usará realmente: el pedido o 'torch' si faltan dependencias"""
+    return backend if backend_available(backend) else 'torch'
+
+
+def artifact_path(model_path, backend, int8=False):
+    """Modelo exportado cacheado junto a los pesos"""
+    stem = os.path.splitext(model_path)[0]
+    suffix = '_int8' if int8 else ''
+    if backend == 'onnx':
+        return f'{stem}{suffix}.onnx'
+    if backend == 'openvino':
+        # Mismo nombre que usa ultralytics para el directorio exportado
+        return f'{stem}{suffix}_openvino_model'
+    raise ValueError(f"El backend {backend} no se exporta")
+
+
+def export_model(model_path, backend='onnx', int8=False, imgsz=640):
+    """
+    Exporta el modelo una vez y reutiliza el artefacto en las siguientes cargas
+
+    ONNX se exporta con ejes dinámicos (lote e imgsz libres); INT8 aplica
+    cuantización dinámica post-entrenamiento de ONNX Runtime sobre el modelo
+    FP32. OpenVINO INT8 usa la calibración de ultralytics (requiere nncf).
+
+    Returns:
+        Ruta del artefacto
+    """
+    path = artifact_path(model_path, backend, int8)
+    with _export_lock:
+        if os.path.exists(path):
+            return path
+
+        from ultralytics import YOLO
+        if backend == 'openvino':
+            exported = YOLO(model_path).export(format='openvino', dynamic=True, int8=int8, imgsz=imgsz)
+            if os.path.abspath(exported.rstrip(os.sep)) != os.path.abspath(path):
+                shutil.move(exported, path)
+            return path
+
+        import onnx
+        fp32_path = artifact_path(model_path, 'onnx')
+        if not os.path.exists(fp32_path):
+            exported = YOLO(model_path).export(format='onnx', dynamic=True, imgsz=imgsz, simplify=False)
+            # Un solo archivo (algunas versiones de torch guardan los pesos aparte)
+            tmp_path = fp32_path + '.tmp'
+            onnx.save(onnx.load(exported), tmp_path)
+            for leftover in (exported, exported + '.data'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            os.replace(tmp_path, fp32_path)
+
+        if int8:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            tmp_path = path + '.tmp'
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QUInt8)
+            os.replace(tmp_path, path)
+        return path
+
+
+class ExportedDetector:
+    """
+    Modelo exportado con la parte de YOLO.predict que usa VideoProcessor
+
+    Preprocesado (letterbox), NMS y escalado de cajas son los de ultralytics,
+    así los resultados son comparables con el backend PyTorch.
+    """
+
+    backend = None
+
+    def __init__(self, names, stride=32):
+        self.names = names
+        self.stride = stride
+
+    def predict(self, source, conf=0.25, imgsz=640, iou=0.7, max_det=300, verbose=False):
+        frames = source if isinstance(source, list) else [source]
+        same_shapes = all(frame.shape == frames[0].shape for frame in frames)
+        letterbox = LetterBox((imgsz, imgsz), auto=same_shapes, stride=self.stride)
+
+        batch = np.stack([letterbox(image=frame) for frame in frames])
+        batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2)).astype(np.float32)
+        batch *= 1 / 255
+
+        preds = ops.non_max_suppression(torch.from_numpy(self._infer(batch)), conf, iou, max_det=max_det)
+        results = []
+        for frame, pred in zip(frames, preds):
+            pred[:, :4] = ops.scale_boxes(batch.shape[2:], pred[:, :4], frame.shape)
+            results.append(Results(frame, path='', names=self.names, boxes=pred))
+        return results
+
+    def _infer(self, batch):
+        raise NotImplementedError
+
+
+class OnnxDetector(ExportedDetector):
+    """Modelo ONNX ejecutado con ONNX Runtime"""
+
+    backend = 'onnx'
+
+    def __init__(self, path, device='cpu', intra_threads=None, inter_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if intra_threads:
+            options.intra_op_num_threads = int(intra_threads)
+        if inter_threads:
+            options.inter_op_num_threads = int(inter_threads)
+            if int(inter_threads) > 1:
+                options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+
+        providers = ['CPUExecutionProvider']
+        if device == 'cuda' and 'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = onnxruntime.InferenceSession(path, options, providers=providers)
+        self._input = self.session.get_inputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        super().__init__(ast.literal_eval(metadata['names']), int(metadata.get('stride', 32)))
+
+    def _infer(self, batch):
+        return self.session.run(None, {self._input: batch})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    """Modelo OpenVINO IR ejecutado en CPU"""
+
+    backend = 'openvino'
+
+    def __init__(self, path, device='cpu', intra_threads=None, inter_threads=None):
+        from openvino.runtime import Core
+
+        config = {}
+        if intra_threads:
+            config['INFERENCE_NUM_THREADS'] = int(intra_threads)
+        if inter_threads:
+            config['NUM_STREAMS'] = int(inter_threads)
+
+        core = Core()
+        model = core.read_model(glob.glob(os.path.join(path, '*.xml'))[0])
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self._output = self.compiled.output(0)
+
+        metadata = yaml_load(os.path.join(path, 'metadata.yaml'))
+        super().__init__(metadata['names'], int(metadata.get('stride', 32)))
+
+    def _infer(self, batch):
+        return self.compiled([batch])[self._output]
+
+
+_DETECTORS = {'onnx': OnnxDetector, 'openvino': OpenVinoDetector}
+
+
+def load_exported(model_path, device='cpu', backend='onnx', int8=False, intra_threads=None,
+                  inter_threads=None):
+    """
+    Exporta (si hace falta) y carga el modelo en el backend pedido
+
+    Returns:
+        ExportedDetector, o None si el backend no está disponible o falla
+        (el llamador vuelve a PyTorch)
+    """
+    if not backend_available(backend):
+        print(f"[INFERENCE] Backend {backend} no instalado; se usa PyTorch")
+        return None
+    try:
+        path = export_model(model_path, backend, int8)
+        return _DETECTORS[backend](path, device, intra_threads, inter_threads)
+    except Exception as e:
+        print(f"[INFERENCE] No se pudo cargar {backend} ({e}); se usa PyTorch")
+        return None
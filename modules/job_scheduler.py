@@ -0,0 +1,142 @@
+"""
+Job Scheduler - Cola de jobs con control de admisión y workers acotados
+"""
+import heapq
+import itertools
+import threading
+
+
+class _Job:
+    __slots__ = ('job_id', 'payload', 'priority', 'timeout', 'cancel_event', 'timed_out', 'state')
+
+    def __init__(self, job_id, payload, priority, timeout):
+        self.job_id = job_id
+        self.payload = payload
+        self.priority = priority
+        self.timeout = timeout
+        self.cancel_event = threading.Event()
+        self.timed_out = False
+        self.state = 'queued'
+
+
+class JobScheduler:
+    """
+    Ejecuta jobs con un máximo de `max_workers` simultáneos
+
+    Los jobs esperan en una cola por prioridad (menor valor primero, FIFO a
+    igual prioridad). Cada job recibe un threading.Event que se activa al
+    cancelarlo o al vencer su timeout; el job debe terminar al verlo activo.
+    """
+
+    def __init__(self, run_job, max_workers=1):
+        """
+        Args:
+            run_job: Callable(job_id, payload, cancel_event) que procesa un job
+            max_workers: Jobs ejecutándose a la vez
+        """
+        self.run_job = run_job
+        self.max_workers = max(1, int(max_workers))
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._running = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'cancelled': 0, 'timed_out': 0}
+
+        for idx in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f'job-worker-{idx}', daemon=True).start()
+
+    def submit(self, job_id, payload, priority=0, timeout=None):
+        """Encola un job; retorna su posición en la cola (1 = siguiente)"""
+        job = _Job(job_id, payload, priority, timeout)
+        with self._cond:
+            self._jobs[job_id] = job
+            heapq.heappush(self._queue, (priority, next(self._seq), job_id))
+            self._stats['submitted'] += 1
+            self._cond.notify()
+            return self._position(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancela un job en cola o en ejecución
+
+        Returns:
+            'queued' si se sacó de la cola, 'running' si se pidió detenerlo,
+            o None si el job no está en el scheduler
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._stats['cancelled'] += 1
+            if job.state == 'queued':
+                self._queue = [entry for entry in self._queue if entry[2] != job_id]
+                heapq.heapify(self._queue)
+                del self._jobs[job_id]
+                return 'queued'
+            job.cancel_event.set()
+            return 'running'
+
+    def get_position(self, job_id):
+        """Posición en la cola (1 = siguiente), o None si no está en cola"""
+        with self._cond:
+            return self._position(job_id)
+
+    def timed_out(self, job_id):
+        """True si el job fue detenido por exceder su timeout"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return bool(job and job.timed_out)
+
+    def get_stats(self):
+        """Jobs en cola, en ejecución y totales"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'max_workers': self.max_workers,
+                'queued': len(self._queue),
+                'running': self._running
+            })
+            return stats
+
+    def _position(self, job_id):
+        order = sorted(self._queue)
+        for position, entry in enumerate(order, start=1):
+            if entry[2] == job_id:
+                return position
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs[job_id]
+                job.state = 'running'
+                self._running += 1
+
+            timer = None
+            if job.timeout:
+                timer = threading.Timer(job.timeout, self._expire, args=(job,))
+                timer.daemon = True
+                timer.start()
+
+            try:
+                self.run_job(job_id, job.payload, job.cancel_event)
+            except Exception as e:
+                print(f"[SCHEDULER] Job {job_id}: {e}")
+            finally:
+                if timer:
+                    timer.cancel()
+                with self._cond:
+                    self._running -= 1
+                    self._stats['completed'] += 1
+                    self._jobs.pop(job_id, None)
+
+    def _expire(self, job):
+        with self._cond:
+            job.timed_out = True
+            self._stats['timed_out'] += 1
+        job.cancel_event.set()
@@ -0,0 +1,196 @@
+"""
+Job Store - Persistencia de jobs y checkpoints en SQLite
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+_FIELDS = ('status', 'progress', 'filename', 'video_path', 'options', 'priority', 'timeout',
+           'created_at', 'started_at', 'finished_at', 'results_file', 'error', 'videos')
+
+# Campos guardados como JSON
+_JSON_FIELDS = ('options', 'videos')
+
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+
+
+class JobStore:
+    """
+    Metadatos de jobs y checkpoints de procesamiento en un archivo SQLite local
+
+    Sobrevive a reinicios del servidor: los jobs sin terminar se pueden
+    reencolar y retomar desde su último checkpoint. La retención limita la
+    cantidad y antigüedad de jobs terminados que se conservan.
+    """
+
+    def __init__(self, db_path, max_jobs=500, max_age_days=30):
+        self.db_path = db_path
+        self.max_jobs = max_jobs
+        self.max_age_days = max_age_days
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress REAL DEFAULT 0,
+                    filename TEXT,
+                    video_path TEXT,
+                    options TEXT,
+                    priority INTEGER DEFAULT 0,
+                    timeout REAL,
+                    created_at TEXT,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    results_file TEXT,
+                    error TEXT,
+                    videos TEXT
+                )
+            ''')
+            # Bases creadas antes de guardar el estado por video de los lotes
+            columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+            if 'videos' not in columns:
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN videos TEXT')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    job_id TEXT PRIMARY KEY,
+                    frame_index INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at TEXT
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at)')
+
+    def create(self, job_id, **fields):
+        """Registra un job nuevo"""
+        fields.setdefault('created_at', datetime.now().isoformat())
+        fields['options'] = fields.get('options') or {}
+        fields = self._encode(fields)
+        columns = ['job_id'] + [name for name in _FIELDS if name in fields]
+        values = [job_id] + [fields[name] for name in columns[1:]]
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                values
+            )
+
+    def update(self, job_id, **fields):
+        """Actualiza campos de un job"""
+        fields = {name: value for name, value in fields.items() if name in _FIELDS}
+        if not fields:
+            return
+        fields = self._encode(fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE job_id = ?",
+                list(fields.values()) + [job_id]
+            )
+
+    def get(self, job_id):
+        """Retorna el job como dict, o None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit=200):
+        """Jobs más recientes primero"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def unfinished(self):
+        """Jobs que quedaron en cola o en proceso (p.ej. tras un reinicio)"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status NOT IN ({', '.join('?' for _ in FINISHED_STATUSES)}) "
+                "ORDER BY created_at",
+                FINISHED_STATUSES
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def uses_video(self, video_path, exclude_job_id=None):
+        """True si algún job guardado (salvo `exclude_job_id`) procesa `video_path`, también dentro de un lote"""
+        # LIKE solo pre-filtra los lotes ('_' y '%' de la ruta son comodines); se confirma al parsear
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT job_id, video_path, options FROM jobs WHERE video_path = ? OR options LIKE ?',
+                (video_path, f'%{json.dumps(video_path)}%')
+            ).fetchall()
+        for row in rows:
+            if row['job_id'] == exclude_job_id:
+                continue
+            if row['video_path'] == video_path:
+                return True
+            videos = json.loads(row['options']).get('videos', []) if row['options'] else []
+            if any(video['path'] == video_path for video in videos):
+                return True
+        return False
+
+    def delete(self, job_id):
+        """Elimina un job y su checkpoint"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+            self._conn.execute('DELETE FROM checkpoints WHERE job_id = ?', (job_id,))
+
+    def save_checkpoint(self, job_id, checkpoint, progress=None):
+        """Guarda (reemplaza) el checkpoint de un job"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO checkpoints (job_id, frame_index, data, updated_at) '
+                'VALUES (?, ?, ?, ?)',
+                (job_id, checkpoint['frame_index'], json.dumps(checkpoint), datetime.now().isoformat())
+            )
+            if progress is not None:
+                self._conn.execute('UPDATE jobs SET progress = ? WHERE job_id = ?', (progress, job_id))
+
+    def load_checkpoint(self, job_id):
+        """Último checkpoint del job, o None"""
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM checkpoints WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def delete_checkpoint(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM checkpoints WHERE job_id = ?', (job_id,))
+
+    def evict(self):
+        """
+        Aplica la retención a los jobs terminados: más antiguos que max_age_days
+        o fuera de los max_jobs más recientes
+
+        Returns:
+            Lista de jobs eliminados (para borrar sus archivos)
+        """
+        cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+        placeholders = ', '.join('?' for _ in FINISHED_STATUSES)
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({placeholders}) AND ("
+                f"created_at < ? OR job_id NOT IN ("
+                f"SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT ?))",
+                FINISHED_STATUSES + (cutoff, self.max_jobs)
+            ).fetchall()
+            for row in rows:
+                self._conn.execute('DELETE FROM jobs WHERE job_id = ?', (row['job_id'],))
+                self._conn.execute('DELETE FROM checkpoints WHERE job_id = ?', (row['job_id'],))
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _encode(fields):
+        return {name: json.dumps(value) if name in _JSON_FIELDS and value is not None else value
+                for name, value in fields.items()}
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job['options'] = json.loads(job['options']) if job.get('options') else {}
+        job['videos'] = json.loads(job['videos']) if job.get('videos') else None
+        return job
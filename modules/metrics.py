@@ -0,0 +1,337 @@
+"""
+Metrics - Histogramas, contadores y gauges en memoria con salida en texto Prometheus
+
+Registro mínimo sin dependencias: cada observación es un bisect y una suma
+bajo un lock, así la instrumentación puede quedar siempre activa.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from .rolling import RollingCounts
+
+# Segundos: de 0.5 ms (decodificar un frame chico) a 10 s (cargar un modelo)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    """Familia de series con las mismas etiquetas"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, **labels):
+        """Serie de estas etiquetas (creada la primera vez); sin etiquetas, la única serie"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """El valor se lee de `function()` al exportar (estado de otro componente)"""
+        self._function = function
+
+    def get(self):
+        return self._function() if self._function is not None else self._value
+
+    def drain(self):
+        """Valor acumulado desde la última llamada (lo reinicia)"""
+        with self._lock:
+            value, self._value = self._value, 0.0
+        return value
+
+    def merge(self, value):
+        self.inc(value)
+
+    def render(self, name, labelnames, key):
+        return [f'{name}{_format_labels(labelnames, key)} {_format_value(self.get())}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._upper = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._upper, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def drain(self):
+        """(conteos por bucket, suma) desde la última llamada (los reinicia)"""
+        with self._lock:
+            counts, total = self._counts, self._sum
+            self._counts = [0] * len(counts)
+            self._sum = 0.0
+        return counts, total
+
+    def merge(self, value):
+        counts, total = value
+        with self._lock:
+            self._counts = [a + b for a, b in zip(self._counts, counts)]
+            self._sum += total
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        cumulative = 0
+        for upper, count in zip(self._upper + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, [('le', _format_value(upper))])
+            lines.append(f'{name}_bucket{labels} {cumulative}')
+        labels = _format_labels(labelnames, key)
+        lines.append(f'{name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+
+class Registry:
+    """Métricas del proceso, exportadas juntas por /api/metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics.append(metric)
+
+    def get(self, name):
+        """Métrica registrada con ese nombre, o None"""
+        with self._lock:
+            return next((metric for metric in self._metrics if metric.name == name), None)
+
+    def render(self):
+        """Todas las métricas en formato de texto Prometheus 0.0.4"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    'datatrack_stage_seconds',
+    'Duración de cada etapa del procesamiento (por frame; inferencia y espera por lote)',
+    ['stage']
+)
+FRAMES = Counter('datatrack_frames_processed_total', 'Frames inferidos', ['source'])
+MODEL_LOAD_SECONDS = Histogram(
+    'datatrack_model_load_seconds', 'Carga y pre-calentamiento de un modelo', ['backend'],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+class FrameRate:
+    """Frames/s de todo el proceso en una ventana deslizante"""
+
+    def __init__(self, window=10):
+        self.window = window
+        self._counts = RollingCounts(1, (window,))
+        self._lock = threading.Lock()
+
+    def add(self, frames):
+        with self._lock:
+            self._counts.add(time.time(), frames)
+
+    def get(self):
+        with self._lock:
+            return float(self._counts.totals(time.time())[self.window][0]) / self.window
+
+
+FRAME_RATE = FrameRate()
+Gauge('datatrack_frames_per_second', 'Frames inferidos por segundo (últimos 10 s)').labels().set_function(
+    FRAME_RATE.get
+)
+
+
+def count_frames(frames, source='video'):
+    """Suma frames inferidos al contador y a la tasa del proceso"""
+    FRAMES.labels(source=source).inc(frames)
+    FRAME_RATE.add(frames)
+
+
+def drain_samples(metrics=None):
+    """
+    Series de las métricas desde la última llamada, reiniciándolas
+
+    Los procesos worker las devuelven con sus resultados y el proceso
+    principal las suma con merge_samples: así /api/metrics incluye el
+    trabajo hecho fuera de él. Por defecto: etapas, frames y carga de modelos.
+    """
+    metrics = metrics or (STAGE_SECONDS, FRAMES, MODEL_LOAD_SECONDS)
+    return {
+        metric.name: [(key, child.drain()) for key, child in list(metric._children.items())]
+        for metric in metrics
+    }
+
+
+def merge_samples(samples, registry=None):
+    """Suma en este proceso las series de drain_samples (de otro proceso)"""
+    registry = registry if registry is not None else REGISTRY
+    for name, series in samples.items():
+        metric = registry.get(name)
+        if metric is None:
+            continue
+        for key, value in series:
+            metric.labels(**dict(zip(metric.labelnames, key))).merge(value)
+            if metric is FRAMES:
+                FRAME_RATE.add(int(value))
+
+
+class StageTimer:
+    """
+    Tiempos por etapa de un job
+
+    Cada medición va al histograma global (STAGE_SECONDS) y a una suma local
+    que queda en los resultados del job. Cada etapa se mide desde un solo
+    hilo (decodificación, preprocesado o inferencia), así las sumas locales
+    no necesitan lock.
+    """
+
+    def __init__(self, histogram=STAGE_SECONDS):
+        self._histogram = histogram
+        self._series = {}
+        self._seconds = {}
+        self._calls = {}
+        self._max = {}
+
+    def add(self, stage, seconds):
+        series = self._series.get(stage)
+        if series is None:
+            series = self._series[stage] = self._histogram.labels(stage=stage)
+        series.observe(seconds)
+        self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+        self._calls[stage] = self._calls.get(stage, 0) + 1
+        if seconds > self._max.get(stage, 0.0):
+            self._max[stage] = seconds
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def summary(self):
+        """{etapa: {'seconds', 'calls', 'mean_ms', 'max_ms'}}"""
+        return {
+            stage: {
+                'seconds': round(seconds, 4),
+                'calls': self._calls[stage],
+                'mean_ms': round(1000 * seconds / self._calls[stage], 3),
+                'max_ms': round(1000 * self._max[stage], 3)
+            }
+            for stage, seconds in list(self._seconds.items())
+        }
+
+
+def merge_stage_summaries(summaries):
+    """Suma los desgloses por etapa de varios segmentos (StageTimer.summary)"""
+    merged = {}
+    for summary in summaries:
+        for stage, data in summary.items():
+            entry = merged.setdefault(stage, {'seconds': 0.0, 'calls': 0, 'max_ms': 0.0})
+            entry['seconds'] += data['seconds']
+            entry['calls'] += data['calls']
+            entry['max_ms'] = max(entry['max_ms'], data['max_ms'])
+    for entry in merged.values():
+        entry['seconds'] = round(entry['seconds'], 4)
+        entry['mean_ms'] = round(1000 * entry['seconds'] / entry['calls'], 3) if entry['calls'] else 0.0
+    return merged
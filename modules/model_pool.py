@@ -0,0 +1,171 @@
+"""
+Model Pool - Pool de modelos YOLO pre-calentados compartido por el proceso
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+from ultralytics import YOLO
+
+from .inference import load_exported
+from .metrics import MODEL_LOAD_SECONDS
+
+
+def load_model(model_path='yolo11n.pt', device='cuda', backend='torch', int8=False,
+               intra_threads=None, inter_threads=None):
+    """
+    Carga un modelo YOLO en el dispositivo y lo pre-calienta
+
+    Args:
+        backend: 'torch', 'onnx' u 'openvino' (ver inference.py); si el backend
+            exportado no está disponible se usa PyTorch
+        int8: Cuantización INT8 del modelo exportado
+        intra_threads, inter_threads: Hilos del backend exportado (los de
+            PyTorch son globales, ver HardwareOptimizer.apply_threads)
+    """
+    started = time.perf_counter()
+    model = None
+    if backend != 'torch':
+        model = load_exported(model_path, device, backend, int8, intra_threads, inter_threads)
+    if model is None:
+        backend = 'torch'
+        model = YOLO(model_path)
+        model.to(device)
+
+    # Pre-compilar modelo para GPU
+    dummy_frame = np.zeros((640, 384, 3), dtype=np.uint8)
+    model.predict(dummy_frame, conf=0.5, verbose=False)
+    label = f'{backend}-int8' if int8 and backend != 'torch' else backend
+    MODEL_LOAD_SECONDS.labels(backend=label).observe(time.perf_counter() - started)
+    return model
+
+
+class ModelPool:
+    """Mantiene hasta N modelos pre-calentados por (model_path, device) y los presta a los jobs"""
+
+    def __init__(self, size=2, loader=load_model):
+        self.size = max(1, int(size))
+        self._loader = loader
+        self._cond = threading.Condition()
+        self._idle = defaultdict(list)
+        self._loaded = defaultdict(int)
+        self._in_use = defaultdict(int)
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
+
+    def warm(self, model_path, device, count=None):
+        """Pre-carga modelos para una clave hasta tener `count` (por defecto el tamaño del pool)"""
+        key = (model_path, device)
+        count = min(count or self.size, self.size)
+        while True:
+            with self._cond:
+                if self._loaded[key] >= count:
+                    return
+                self._loaded[key] += 1
+            model = self._load(key)
+            with self._cond:
+                self._idle[key].append(model)
+                self._cond.notify_all()
+
+    def acquire(self, model_path, device, timeout=None):
+        """
+        Presta un modelo libre; lo carga si el pool no está lleno o espera a que se libere uno
+
+        Raises:
+            TimeoutError: si no hay modelo disponible dentro de `timeout` segundos
+        """
+        key = (model_path, device)
+        start = time.perf_counter()
+        waited = False
+        model = None
+
+        with self._cond:
+            while True:
+                if self._idle[key]:
+                    model = self._idle[key].pop()
+                    break
+                if self._loaded[key] < self.size:
+                    self._loaded[key] += 1
+                    break
+
+                remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No hay modelos libres para {model_path} en {device}")
+                waited = True
+                self._cond.wait(remaining)
+
+            self._stats['hits' if model is not None else 'misses'] += 1
+            if waited:
+                self._stats['waits'] += 1
+            self._in_use[key] += 1
+
+        if model is None:
+            try:
+                model = self._load(key)
+            except Exception:
+                with self._cond:
+                    self._in_use[key] -= 1
+                    self._cond.notify_all()
+                raise
+
+        wait_time = time.perf_counter() - start
+        with self._cond:
+            self._stats['wait_time_total'] += wait_time
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+        return model
+
+    def release(self, model_path, device, model):
+        """Devuelve un modelo prestado al pool"""
+        key = (model_path, device)
+        with self._cond:
+            self._in_use[key] -= 1
+            self._idle[key].append(model)
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, model_path, device, timeout=None):
+        """Context manager: presta un modelo durante el bloque y lo devuelve al salir"""
+        model = self.acquire(model_path, device, timeout=timeout)
+        try:
+            yield model
+        finally:
+            self.release(model_path, device, model)
+
+    def get_stats(self):
+        """Retorna estadísticas de uso del pool"""
+        with self._cond:
+            leases = self._stats['hits'] + self._stats['misses']
+            return {
+                'size': self.size,
+                'hits': self._stats['hits'],
+                'misses': self._stats['misses'],
+                'hit_rate': round(self._stats['hits'] / leases, 4) if leases else 0,
+                'waits': self._stats['waits'],
+                'avg_wait_s': round(self._stats['wait_time_total'] / leases, 4) if leases else 0,
+                'max_wait_s': round(self._stats['wait_time_max'], 4),
+                'models': {
+                    f"{path}@{device}": {
+                        'loaded': self._loaded[(path, device)],
+                        'in_use': self._in_use[(path, device)]
+                    }
+                    for path, device in self._loaded
+                }
+            }
+
+    def _load(self, key):
+        """Carga un modelo; si falla libera el hueco reservado"""
+        try:
+            return self._loader(*key)
+        except Exception:
+            with self._cond:
+                self._loaded[key] -= 1
+                self._cond.notify_all()
+            raise
@@ -0,0 +1,93 @@
+"""
+Motion Gate - Salto adaptativo de frames según el movimiento de la escena
+"""
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decide qué frames necesitan inferencia comparando una versión reducida
+    contra el último frame inferido (máxima diferencia entre canales BGR)
+
+    Escena estática: solo se infiere cada `max_gap` frames candidatos (el tope
+    mantiene al tracker actualizado y los IDs estables). Cuando aparece
+    movimiento se infieren todos los candidatos durante al menos `hold` frames.
+    """
+
+    def __init__(self, threshold=0.001, pixel_delta=25, max_gap=10, hold=3, width=160,
+                 mask=None):
+        """
+        Args:
+            threshold: Fracción mínima de píxeles cambiados para considerar movimiento
+            pixel_delta: Diferencia (0-255) en algún canal para que un píxel cuente como cambiado
+            max_gap: Máximo de frames candidatos seguidos sin inferencia
+            hold: Frames candidatos que se infieren tras detectar movimiento
+            width: Ancho de la imagen reducida usada para comparar
+            mask: Máscara bool (alto, ancho) a resolución de procesamiento; limita
+                la comparación a esa zona (p.ej. la unión de regiones)
+        """
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.max_gap = max(1, int(max_gap))
+        self.hold = max(0, int(hold))
+        self.width = width
+        self.mask = mask
+
+        self._small_mask = None
+        self._reference = None
+        self._gap = 0
+        self._hold_left = 0
+        self.stats = {'checked': 0, 'gated': 0, 'motion': 0, 'forced': 0}
+
+    def check(self, frame):
+        """Retorna True si el frame debe pasar a inferencia"""
+        self.stats['checked'] += 1
+        small = self._downscale(frame)
+
+        if self._reference is None:
+            return self._accept(small)
+
+        # Máximo por canal: un vehículo con el mismo gris que el fondo también cambia
+        diff = cv2.absdiff(small, self._reference).max(axis=2) > self.pixel_delta
+        if self._small_mask is not None:
+            changed = np.count_nonzero(diff & self._small_mask) / max(1, np.count_nonzero(self._small_mask))
+        else:
+            changed = np.count_nonzero(diff) / diff.size
+
+        if changed >= self.threshold:
+            self.stats['motion'] += 1
+            self._hold_left = self.hold
+            return self._accept(small)
+
+        if self._hold_left > 0:
+            self._hold_left -= 1
+            return self._accept(small)
+
+        self._gap += 1
+        if self._gap >= self.max_gap:
+            self.stats['forced'] += 1
+            return self._accept(small)
+
+        self.stats['gated'] += 1
+        return False
+
+    def get_stats(self):
+        """Frames revisados, descartados, con movimiento y forzados por max_gap"""
+        stats = dict(self.stats)
+        stats['gated_ratio'] = round(stats['gated'] / stats['checked'], 4) if stats['checked'] else 0
+        return stats
+
+    def _accept(self, small):
+        self._reference = small
+        self._gap = 0
+        return True
+
+    def _downscale(self, frame):
+        height = max(1, int(round(frame.shape[0] * self.width / frame.shape[1])))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+
+        if self.mask is not None and self._small_mask is None:
+            self._small_mask = cv2.resize(self.mask.astype(np.uint8), (self.width, height),
+                                          interpolation=cv2.INTER_NEAREST).astype(bool)
+        return small
@@ -1,9 +1,21 @@
 """
 Multiprocessing Manager - Gestión de procesamiento paralelo
 """
-from multiprocessing import Pool, Process, Queue
+from multiprocessing import Pool, Process, Queue, get_context
 import os
 
+import cv2
+import numpy as np
+
+from .inference import export_model, resolve_backend
+from .metrics import drain_samples, merge_samples, merge_stage_summaries
+from .pipeline import ProcessingCancelled
+from .timeline import merge_timelines, save_timeline, timeline_summary
+from .tracking import match_tracks, record_boxes
+
+# Procesador del worker (un modelo propio por proceso)
+_worker_processor = None
+
 
 class MultiprocessingManager:
     """Gestiona procesamiento paralelo adaptativo"""
@@ -22,3 +34,240 @@ class MultiprocessingManager:
         with Pool(self.num_workers) as pool:
             results = pool.map(processor_func, regions)
         return results
+    
+    def process_video_sharded(self, video_path, model_path='yolo11n.pt', device='cpu',
+                              segments=None, overlap_seconds=2.0, on_progress=None,
+                              cancel_event=None, inference=None, **options):
+        """
+        Procesa un video largo dividiéndolo en segmentos temporales en paralelo
+
+        Cada worker tiene su propio modelo y procesa un segmento más `overlap`
+        frames previos que solo calientan el tracker. Los tracks de la zona de
+        solapamiento se emparejan por IoU entre segmentos vecinos para que un
+        vehículo que cruza un corte cuente una sola vez.
+
+        Args:
+            video_path: Ruta del video
+            model_path: Pesos del modelo a cargar en cada worker
+            device: Dispositivo de inferencia
+            segments: Número de segmentos (por defecto, uno por worker)
+            overlap_seconds: Solapamiento entre segmentos en segundos de video
+            on_progress: Callback(frames_hechos, total_frames)
+            cancel_event: threading.Event que cancela el procesamiento
+            inference: Opciones de backend de model_pool.load_model para cada worker
+            **options: Parámetros de VideoProcessor.process_video
+
+        No guarda checkpoints: un job por segmentos interrumpido se procesa de
+        nuevo desde el inicio.
+
+        Raises:
+            ProcessingCancelled: si se activa cancel_event
+            ValueError: si se pide checkpoint, resume, detection_log o render
+
+        Returns:
+            dict con el mismo formato que VideoProcessor.process_video
+        """
+        if options.get('checkpoint') or options.get('resume'):
+            raise ValueError("El procesamiento por segmentos no admite checkpoints ni retomar")
+        # El registro de detecciones y el video anotado no se combinan entre segmentos
+        if options.get('detection_log') or options.get('render') is not None or options.get('render_path'):
+            raise ValueError("El procesamiento por segmentos no admite detection_log ni render")
+        # El timeline combinado se guarda aquí, no en cada segmento
+        timeline_path = options.pop('timeline_path', None)
+        
+        cap = cv2.VideoCapture(video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+
+        segments = max(1, min(segments or self.num_workers, total_frames or 1))
+        overlap = int(round(overlap_seconds * fps)) if fps > 0 else 0
+        bounds = np.linspace(1, total_frames + 1, segments + 1).round().astype(int)
+        tasks = [
+            (idx, video_path, int(start), int(end) - 1, overlap, options)
+            for idx, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+            if end > start
+        ]
+
+        # Repartir los núcleos entre workers para no sobre-suscribir torch
+        workers = min(self.num_workers, len(tasks))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        
+        # El modelo se exporta aquí una vez; los workers solo lo cargan
+        inference = dict(inference or {}, intra_threads=threads)
+        backend = resolve_backend(inference.get('backend', 'torch'))
+        if backend != 'torch':
+            export_model(model_path, backend, inference.get('int8', False))
+
+        # spawn: cada worker inicializa torch/CUDA desde cero
+        ctx = get_context('spawn')
+        shards = []
+        done_frames = 0
+        with ctx.Pool(workers, initializer=_init_segment_worker,
+                      initargs=(model_path, device, threads, inference)) as pool:
+            pending = [pool.apply_async(_process_segment, (task,)) for task in tasks]
+            while pending:
+                # Al salir del with el pool se termina y mata a los workers
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ProcessingCancelled()
+
+                pending[0].wait(0.2)
+                for result in [r for r in pending if r.ready()]:
+                    pending.remove(result)
+                    shard = result.get()
+                    # Métricas del worker al registro de este proceso (/api/metrics)
+                    merge_samples(shard.pop('metrics'))
+                    shards.append(shard)
+                    done_frames += shard['end_frame'] - shard['start_frame'] + 1
+                    if on_progress:
+                        on_progress(done_frames, total_frames)
+
+        shards.sort(key=lambda shard: shard['segment'])
+        results = merge_segments(shards)
+        results['shards'] = {
+            'segments': len(shards),
+            'workers': workers,
+            'overlap_frames': overlap,
+            'stitched_tracks': results.pop('stitched_tracks')
+        }
+        
+        timeline = results.pop('timeline_state')
+        results['timeline'] = timeline_summary(timeline) if timeline is not None else None
+        if timeline_path and timeline is not None:
+            save_timeline(timeline_path, timeline)
+        return results
+
+
+def _init_segment_worker(model_path, device, threads, inference=None):
+    """Inicializa el modelo una vez por proceso worker"""
+    global _worker_processor
+    import torch
+    from .video_processor import VideoProcessor
+
+    torch.set_num_threads(threads)
+    _worker_processor = VideoProcessor(model_path=model_path, device=device, inference=inference)
+
+
+def _process_segment(task):
+    """Procesa un segmento y guarda las cajas de las zonas de solapamiento"""
+    idx, video_path, start, end, overlap, options = task
+    lead = {}
+    tail = {}
+
+    def record_tracks(frame_index, tracks):
+        # Solapamiento con el segmento anterior (calentamiento) y con el siguiente
+        if frame_index < start:
+            record_boxes(lead, frame_index, tracks)
+            # Sus registros hacen falta al unir segmentos aunque se desalojen
+            _worker_processor.counter.tracks.retain.update(int(i) for i in tracks[:, 4])
+        elif frame_index > end - overlap:
+            record_boxes(tail, frame_index, tracks)
+
+    results = _worker_processor.process_video(
+        video_path,
+        start_frame=max(1, start - overlap),
+        end_frame=end,
+        count_start=start,
+        on_tracks=record_tracks,
+        **options
+    )
+
+    return {
+        'segment': idx,
+        'start_frame': start,
+        'end_frame': end,
+        'results': results,
+        'state': _worker_processor.counter.get_state(),
+        'timeline': _worker_processor.timeline.get_state(),
+        'lead': lead,
+        'tail': tail,
+        'metrics': drain_samples()
+    }
+
+
+def merge_segments(shards, iou_threshold=0.5):
+    """
+    Combina los resultados de segmentos consecutivos uniendo los tracks que
+    coinciden en el solapamiento, para no contar dos veces un mismo vehículo
+    """
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    stitched_pairs = []
+    for prev_idx in range(len(shards) - 1):
+        pairs = match_tracks(shards[prev_idx]['tail'], shards[prev_idx + 1]['lead'], iou_threshold)
+        for prev_id, next_id in pairs:
+            parent[find((prev_idx + 1, next_id))] = find((prev_idx, prev_id))
+        stitched_pairs.append(pairs)
+
+    states = [shard['state'] for shard in shards]
+    tracks = [{int(track_id): values for track_id, values in state['tracks'].items()}
+              for state in states]
+    vehicle_types = states[0]['vehicle_types'] if states else []
+
+    # Un track unido con el del segmento anterior ya se contó ahí: se resta
+    # una vez del total y de cada tipo y región en que se contó en ambos
+    duplicates = {'total': 0, 'types': {}, 'regions': {}}
+    for prev_idx in range(len(shards) - 1):
+        for prev_id, next_id in stitched_pairs[prev_idx]:
+            prev_record = tracks[prev_idx].get(prev_id)
+            next_record = tracks[prev_idx + 1].get(next_id)
+            if prev_record is None or next_record is None:
+                continue
+            duplicates['total'] += 1
+            for bits_field, key, names in ((3, 'types', vehicle_types), (4, 'regions', None)):
+                shared = prev_record[bits_field] & next_record[bits_field]
+                for bit in range(shared.bit_length()):
+                    if shared >> bit & 1:
+                        name = names[bit] if names else f'region_{bit}'
+                        duplicates[key][name] = duplicates[key].get(name, 0) + 1
+
+    vehicles_by_type = {}
+    vehicles_by_type_unique = {}
+    for state in states:
+        for vehicle_type, count in state['vehicles_by_type'].items():
+            vehicles_by_type[vehicle_type] = vehicles_by_type.get(vehicle_type, 0) + count
+        for vehicle_type, count in state['vehicles_by_type_unique'].items():
+            vehicles_by_type_unique[vehicle_type] = vehicles_by_type_unique.get(vehicle_type, 0) + count
+    for vehicle_type, count in duplicates['types'].items():
+        vehicles_by_type_unique[vehicle_type] -= count
+
+    vehicles_by_region = {}
+    region_keys = sorted({key for state in states for key in state['vehicles_by_region']},
+                         key=lambda key: int(key.split('_')[1]))
+    for region_key in region_keys:
+        merged = {'count': 0, 'types': {}, 'unique_count': -duplicates['regions'].get(region_key, 0)}
+        for state in states:
+            data = state['vehicles_by_region'].get(region_key)
+            if data:
+                merged['count'] += data['count']
+                merged['unique_count'] += data['unique_count']
+                for vehicle_type, n in data['types'].items():
+                    merged['types'][vehicle_type] = merged['types'].get(vehicle_type, 0) + n
+        vehicles_by_region[region_key] = merged
+
+    results = dict(shards[0]['results']) if shards else {}
+    for key in ('pipeline', 'decode', 'motion_gate', 'track_table'):
+        results.pop(key, None)
+    # Tiempo por etapa sumado entre segmentos (de trabajo, no de reloj)
+    results['stages'] = merge_stage_summaries(shard['results'].get('stages', {}) for shard in shards)
+    results.update({
+        'total_vehicles': sum(state['total_vehicles'] for state in states) - duplicates['total'],
+        'vehicles_by_type': vehicles_by_type,
+        'vehicles_by_type_unique': dict(sorted(vehicles_by_type_unique.items())),
+        'vehicles_by_region': vehicles_by_region,
+        'stitched_tracks': sum(len(pairs) for pairs in stitched_pairs),
+        # Un vehículo que cruza un corte aporta un solo evento de vehículo nuevo
+        'timeline_state': merge_timelines(
+            [shard.get('timeline') for shard in shards],
+            track_key=lambda idx, track_id: find((idx, track_id))
+        )
+    })
+    return results
+
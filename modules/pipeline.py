@@ -0,0 +1,281 @@
+"""
+Pipeline - Decodificación y preprocesado de frames en hilos con colas acotadas
+"""
+import queue
+import threading
+import time
+
+import cv2
+
+from .errors import ProcessingCancelled
+from .metrics import StageTimer
+
+_END = object()
+
+
+class _StageQueue(queue.Queue):
+    """Cola acotada que registra su ocupación para detectar cuellos de botella"""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize=maxsize)
+        self.samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def sample(self):
+        depth = self.qsize()
+        self.samples += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def get_stats(self):
+        return {
+            'depth': self.qsize(),
+            'capacity': self.maxsize,
+            'avg_depth': round(self.depth_total / self.samples, 2) if self.samples else 0,
+            'max_depth': self.depth_max
+        }
+
+
+class FramePipeline:
+    """
+    Pipeline por etapas para un video:
+    decodificación (hilo) → preprocesado y lotes (hilo) → consumidor (inferencia)
+
+    Las colas acotadas aplican backpressure: si la inferencia se atrasa, las
+    etapas anteriores se bloquean en lugar de acumular frames en memoria.
+    Una cola de decodificación llena indica que el preprocesado es el cuello
+    de botella; una cola de lotes llena, que lo es la inferencia.
+    """
+
+    def __init__(self, cap, frame_skip=1, size=None, batch_size=1, queue_size=16,
+                 cancel_event=None, sample_fps=None, decode_mode='sparse', seek_threshold=300,
+                 gate=None, start_frame=1, end_frame=None, timer=None):
+        """
+        Args:
+            cap: cv2.VideoCapture abierto (el pipeline lo libera al terminar)
+            frame_skip: Procesar cada N frames
+            sample_fps: Frames por segundo de video a procesar (reemplaza frame_skip)
+            decode_mode: 'sparse' (grab sin decodificar los frames saltados) o 'full'
+            seek_threshold: Saltos de al menos N frames se hacen con seek al keyframe
+                (solo en modo 'sparse'; None lo desactiva)
+            gate: Objeto con check(frame) -> bool (p.ej. MotionGate); los frames
+                rechazados no llegan a la inferencia
+            start_frame: Primer frame (base 1) del rango a procesar
+            end_frame: Último frame (inclusive) del rango, o None hasta el final
+            size: (ancho, alto) de procesamiento, o None para no redimensionar
+            batch_size: Frames por lote entregado al consumidor
+            queue_size: Capacidad de la cola de frames decodificados
+            cancel_event: threading.Event externo para cancelar
+            timer: metrics.StageTimer donde registrar 'decode', 'resize' y 'motion_gate'
+        """
+        self.cap = cap
+        self.frame_skip = max(1, int(frame_skip))
+        self.sample_fps = sample_fps
+        self.decode_mode = decode_mode
+        self.seek_threshold = seek_threshold
+        self.size = size
+        self.gate = gate
+        self.start_frame = max(1, int(start_frame))
+        self.end_frame = end_frame
+        self.batch_size = max(1, int(batch_size))
+        self.cancel_event = cancel_event or threading.Event()
+
+        self.decoded = _StageQueue(max(1, queue_size))
+        self.batches = _StageQueue(max(2, queue_size // self.batch_size))
+        self.frames_read = 0
+        self.decode_stats = {'mode': decode_mode, 'decoded': 0, 'grabbed': 0, 'seeks': 0}
+        # Tiempo de trabajo de cada etapa (sin contar esperas en las colas)
+        self.timer = timer or StageTimer()
+
+        self._stop = threading.Event()
+        self._error = None
+        self._threads = [
+            threading.Thread(target=self._run_stage, args=(self._decode,), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._preprocess,), daemon=True)
+        ]
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __iter__(self):
+        """Entrega lotes [(frame_index, frame), ...] en orden hasta el final del video"""
+        while not self.cancel_event.is_set():
+            self.decoded.sample()
+            self.batches.sample()
+            batch = self._get(self.batches)
+            if batch is _END:
+                break
+            yield batch
+
+        if self._error is not None:
+            raise self._error
+        if self.cancel_event.is_set():
+            raise ProcessingCancelled()
+
+    def stop(self):
+        """Detiene las etapas, vacía las colas y libera el video"""
+        self._stop.set()
+        for q in (self.decoded, self.batches):
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+        for thread in self._threads:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=5)
+        self.cap.release()
+
+    def get_queue_depths(self):
+        """Ocupación actual y media de cada cola entre etapas"""
+        return {
+            'decode': self.decoded.get_stats(),
+            'batch': self.batches.get_stats()
+        }
+
+    def get_decode_stats(self):
+        """Frames decodificados, saltados con grab y seeks realizados"""
+        return dict(self.decode_stats)
+
+    def target_frames(self):
+        """Índices (base 1) de los frames a procesar, en orden, dentro del rango"""
+        end = self.end_frame
+        for target in self._sampled_frames():
+            if end is not None and target > end:
+                return
+            if target >= self.start_frame:
+                yield target
+
+    def _sampled_frames(self):
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if self.sample_fps and fps > 0:
+            # Muestreo temporal: un frame cada 1/sample_fps segundos de video
+            step = fps / float(self.sample_fps)
+            last = 0
+            k = max(0, int((self.start_frame - 1) // step) - 1)
+            while True:
+                target = int(round(k * step)) + 1
+                k += 1
+                if target > last:
+                    last = target
+                    yield target
+        else:
+            # Alineado a múltiplos de frame_skip aunque el rango empiece a mitad
+            k = max(1, -(-self.start_frame // self.frame_skip))
+            while True:
+                yield k * self.frame_skip
+                k += 1
+
+    def _stopped(self):
+        return self._stop.is_set() or self.cancel_event.is_set()
+
+    def _put(self, q, item):
+        while not self._stopped():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopped():
+                    return _END
+
+    def _run_stage(self, stage):
+        try:
+            stage()
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+
+    def _decode(self):
+        """Etapa 1: decodifica solo los frames a procesar"""
+        try:
+            for target in self.target_frames():
+                started = time.perf_counter()
+                if self._stopped() or not self._advance_to(target):
+                    break
+
+                success, frame = self.cap.read()
+                self.timer.add('decode', time.perf_counter() - started)
+                if not success:
+                    break
+                self.frames_read = target
+                self.decode_stats['decoded'] += 1
+
+                if not self._put(self.decoded, (target, frame)):
+                    return
+        finally:
+            self._put(self.decoded, _END)
+
+    def _advance_to(self, target):
+        """Avanza el video hasta justo antes del frame `target` sin decodificar lo saltado"""
+        gap = target - self.frames_read - 1
+        if gap <= 0:
+            return True
+
+        if self.decode_mode == 'full':
+            for _ in range(gap):
+                success, _frame = self.cap.read()
+                if not success:
+                    return False
+                self.frames_read += 1
+            return True
+
+        # Saltos largos: seek (FFmpeg busca el keyframe previo y decodifica desde ahí)
+        if self.seek_threshold is not None and gap >= self.seek_threshold:
+            if self.cap.set(cv2.CAP_PROP_POS_FRAMES, target - 1):
+                self.decode_stats['seeks'] += 1
+                self.frames_read = min(int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)), target - 1)
+
+        # grab() demultiplexa el frame sin convertirlo a imagen
+        for _ in range(target - self.frames_read - 1):
+            if self._stopped() or not self.cap.grab():
+                return False
+            self.frames_read += 1
+            self.decode_stats['grabbed'] += 1
+        return True
+
+    def _preprocess(self):
+        """Etapa 2: redimensiona, filtra con el gate y agrupa frames en lotes"""
+        batch = []
+        try:
+            while True:
+                item = self._get(self.decoded)
+                if item is _END:
+                    break
+
+                frame_index, frame = item
+                if self.size is not None:
+                    started = time.perf_counter()
+                    frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_LINEAR)
+                    self.timer.add('resize', time.perf_counter() - started)
+
+                if self.gate is not None:
+                    started = time.perf_counter()
+                    passed = self.gate.check(frame)
+                    self.timer.add('motion_gate', time.perf_counter() - started)
+                    if not passed:
+                        continue
+
+                batch.append((frame_index, frame))
+                if len(batch) == self.batch_size:
+                    if not self._put(self.batches, batch):
+                        return
+                    batch = []
+
+            if batch:
+                self._put(self.batches, batch)
+        finally:
+            self._put(self.batches, _END)
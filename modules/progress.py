@@ -0,0 +1,106 @@
+"""
+Progress - Eventos de progreso por job para clientes suscritos (SSE)
+"""
+import threading
+import time
+
+from .job_store import FINISHED_STATUSES
+
+
+class ProgressMeter:
+    """
+    Limita la frecuencia de los reportes de progreso y calcula velocidad y ETA
+
+    `update` es barato cuando no toca reportar, así el callback por lote no
+    agrega costo al procesamiento.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._start_time = None
+        self._start_frame = 0
+        self._last_report = 0.0
+
+    def update(self, current, total, force=False):
+        """
+        Returns:
+            dict con progress, frames, total_frames, fps y eta_s, o None si aún
+            no pasó `interval` desde el último reporte
+        """
+        now = time.monotonic()
+        if self._start_time is None:
+            # Primer frame procesado (puede no ser el 1 al retomar)
+            self._start_time = now
+            self._start_frame = current
+        if not force and now - self._last_report < self.interval:
+            return None
+        self._last_report = now
+
+        elapsed = now - self._start_time
+        fps = (current - self._start_frame) / elapsed if elapsed > 0 else 0.0
+        return {
+            'progress': (current / total) * 100 if total else 0,
+            'frames': current,
+            'total_frames': total,
+            'fps': round(fps, 1),
+            'eta_s': round((total - current) / fps, 1) if fps > 0 else None
+        }
+
+
+class ProgressHub:
+    """
+    Último evento de progreso de cada job
+
+    Los publicadores reemplazan el evento y los suscriptores esperan a que
+    cambie, en lugar de consultar el estado periódicamente. Cada evento lleva
+    un número de secuencia creciente (sirve como id de SSE para reconectar).
+    """
+
+    def __init__(self, keep_seconds=300):
+        """
+        Args:
+            keep_seconds: Tiempo que se conserva el evento final de un job terminado
+        """
+        self.keep_seconds = keep_seconds
+        self._cond = threading.Condition()
+        self._events = {}
+        self._seq = 0
+
+    def publish(self, job_id, event):
+        """Reemplaza el evento del job y despierta a sus suscriptores"""
+        with self._cond:
+            self._seq += 1
+            self._events[job_id] = (self._seq, dict(event), time.monotonic())
+            self._prune()
+            self._cond.notify_all()
+
+    def wait(self, job_id, after=0, timeout=15):
+        """
+        Espera un evento más nuevo que `after`
+
+        Returns:
+            (seq, event), o None si no hubo cambios en `timeout` segundos
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                entry = self._events.get(job_id)
+                if entry is not None and entry[0] > after:
+                    return entry[0], entry[1]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def discard(self, job_id):
+        with self._cond:
+            self._events.pop(job_id, None)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.keep_seconds
+        stale = [
+            job_id for job_id, (_, event, published) in self._events.items()
+            if event.get('status') in FINISHED_STATUSES and published < cutoff
+        ]
+        for job_id in stale:
+            del self._events[job_id]
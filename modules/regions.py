@@ -0,0 +1,88 @@
+"""
+Regions - Regiones rasterizadas para asignar detecciones con lookups de NumPy
+
+OpenCV se importa al rasterizar: la app importa ANCHORS al iniciar.
+"""
+import numpy as np
+
+# Punto de la caja que se usa para decidir en qué región está un vehículo
+ANCHORS = ('top_left', 'center', 'bottom_center')
+
+
+def anchor_points(boxes_xyxy, anchor='top_left'):
+    """Retorna el punto ancla (M, 2) de cada caja [x1, y1, x2, y2]"""
+    if anchor == 'top_left':
+        return boxes_xyxy[:, :2]
+    center_x = (boxes_xyxy[:, 0] + boxes_xyxy[:, 2]) / 2
+    if anchor == 'center':
+        return np.stack([center_x, (boxes_xyxy[:, 1] + boxes_xyxy[:, 3]) / 2], axis=1)
+    if anchor == 'bottom_center':
+        return np.stack([center_x, boxes_xyxy[:, 3]], axis=1)
+    raise ValueError(f"Ancla desconocida: {anchor} (opciones: {', '.join(ANCHORS)})")
+
+
+def roi_bounds(regions, width, height, margin=0):
+    """
+    Rectángulo que contiene la unión de las regiones, con margen y recortado al frame
+
+    Returns:
+        (x0, y0, x1, y1) o None si no hay regiones
+    """
+    if not regions:
+        return None
+    points = np.concatenate([np.asarray(region, dtype=np.float64).reshape(-1, 2) for region in regions])
+    x0 = int(max(0, np.floor(points[:, 0].min()) - margin))
+    y0 = int(max(0, np.floor(points[:, 1].min()) - margin))
+    x1 = int(min(width, np.ceil(points[:, 0].max()) + margin + 1))
+    y1 = int(min(height, np.ceil(points[:, 1].max()) + margin + 1))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+
+class RegionMask:
+    """
+    Polígonos rasterizados una sola vez a la resolución de procesamiento
+
+    Cada píxel guarda un bit por región (8 regiones por plano uint8), así las
+    regiones pueden solaparse y la pertenencia de todas las detecciones de un
+    frame a todas las regiones se resuelve con un único indexado.
+    """
+
+    def __init__(self, regions, width, height):
+        import cv2
+
+        self.count = len(regions)
+        self.width = width
+        self.height = height
+
+        self.bits = np.zeros(((self.count + 7) // 8, height, width), dtype=np.uint8)
+        layer = np.zeros((height, width), dtype=np.uint8)
+        for idx, region in enumerate(regions):
+            points = np.asarray(region, dtype=np.float64).reshape(-1, 2).round().astype(np.int32)
+            layer[:] = 0
+            cv2.fillPoly(layer, [points], 1)
+            self.bits[idx // 8] |= layer << (idx % 8)
+
+    def lookup(self, points):
+        """
+        Pertenencia de puntos a regiones
+
+        Args:
+            points: np.ndarray (M, 2) con coordenadas (x, y)
+
+        Returns:
+            np.ndarray bool (N_regiones, M)
+        """
+        xs = np.floor(points[:, 0]).astype(np.int64)
+        ys = np.floor(points[:, 1]).astype(np.int64)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+
+        packed = self.bits[:, np.clip(ys, 0, self.height - 1), np.clip(xs, 0, self.width - 1)]
+        member = np.unpackbits(packed[:, np.newaxis, :], axis=1, bitorder='little')
+        member = member.reshape(-1, len(points))[:self.count].astype(bool)
+        return member & inside
+
+    def union(self):
+        """Máscara bool (alto, ancho) de los píxeles que caen en alguna región"""
+        return np.bitwise_or.reduce(self.bits, axis=0) != 0
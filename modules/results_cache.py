@@ -0,0 +1,178 @@
+"""
+Results Cache - Resultados reutilizables por contenido del video y parámetros
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+# Opciones que no cambian los resultados y no deben separar entradas del cache
+_IGNORED_OPTIONS = ('batch_size',)
+
+
+def cache_key(video_hash, options, model_path):
+    """Hash canónico del contenido del video, los parámetros y el modelo"""
+    params = {name: value for name, value in options.items() if name not in _IGNORED_OPTIONS}
+    canonical = json.dumps(
+        {'video': video_hash, 'model': model_path, 'options': params},
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultsCache:
+    """
+    Archivos de resultados en disco indexados por cache_key(), con desalojo
+    LRU cuando el total supera `max_bytes`
+
+    Cada entrada agrupa los archivos de un job por extensión (resultados
+    .json, timeline .npz). El orden de uso se reconstruye al iniciar a partir
+    del mtime de los archivos, que se actualiza en cada acierto.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        found = {}
+        for name in os.listdir(cache_dir):
+            key, ext = os.path.splitext(name)
+            stat = os.stat(os.path.join(cache_dir, name))
+            mtime, files = found.setdefault(key, [0, {}])
+            found[key][0] = max(mtime, stat.st_mtime)
+            files[ext] = stat.st_size
+        for key, (_, files) in sorted(found.items(), key=lambda item: item[1][0]):
+            self._entries[key] = files
+            self._total += sum(files.values())
+
+    def get(self, key, dest_paths):
+        """
+        Copia los archivos de la entrada a `dest_paths` (uno por extensión)
+
+        Returns:
+            True en un acierto (la entrada tiene todas las extensiones pedidas)
+        """
+        with self._lock:
+            files = self._entries.get(key)
+            if files is None or any(os.path.splitext(dest)[1] not in files for dest in dest_paths):
+                self.stats['misses'] += 1
+                return False
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            for dest in dest_paths:
+                path = self._path(key, os.path.splitext(dest)[1])
+                os.utime(path)
+                _link_or_copy(path, dest)
+            return True
+
+    def put(self, key, paths):
+        """Agrega los archivos de resultados de un job y desaloja los menos usados si hace falta"""
+        with self._lock:
+            self._remove(key)
+            files = {}
+            for src in paths:
+                ext = os.path.splitext(src)[1]
+                path = self._path(key, ext)
+                _link_or_copy(src, path)
+                files[ext] = os.path.getsize(path)
+            self._entries[key] = files
+            self._total += sum(files.values())
+            self._evict()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({'entries': len(self._entries), 'bytes': self._total,
+                          'max_bytes': self.max_bytes})
+            return stats
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+
+    def _remove(self, key):
+        files = self._entries.pop(key, None) or {}
+        self._total -= sum(files.values())
+        for ext in files:
+            try:
+                os.remove(self._path(key, ext))
+            except OSError:
+                pass
+
+    def _path(self, key, ext):
+        return os.path.join(self.cache_dir, f'{key}{ext}')
+
+
+class ParsedResultsLRU:
+    """
+    Resultados ya parseados en memoria, acotados por `max_bytes`
+
+    Cada entrada se contabiliza por el tamaño de su archivo JSON y se
+    invalida si el archivo cambia (mtime o tamaño).
+    """
+
+    def __init__(self, max_bytes=64 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, path):
+        """Resultados parseados del archivo (desde memoria si no cambió)"""
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(path)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+
+        with open(path, 'r') as f:
+            results = json.load(f)
+
+        with self._lock:
+            self._discard(path)
+            # Un archivo más grande que todo el cache no se guarda
+            if stat.st_size <= self.max_bytes:
+                self._entries[path] = (version, results)
+                self._total += stat.st_size
+                while self._total > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+                    self.stats['evictions'] += 1
+        return results
+
+    def invalidate(self, path):
+        with self._lock:
+            self._discard(path)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({'entries': len(self._entries), 'bytes': self._total,
+                          'max_bytes': self.max_bytes})
+            return stats
+
+    def _discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._total -= entry[0][1]
+
+
+def _link_or_copy(src, dst):
+    # Hard link: borrar la copia del job no afecta al cache (ni al revés)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
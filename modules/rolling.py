@@ -0,0 +1,60 @@
+"""
+Rolling - Sumas en ventanas deslizantes de tiempo
+
+Sin OpenCV: lo usan también las métricas, que se importan con la app.
+"""
+import numpy as np
+
+# Ventanas por defecto: últimos 1, 5 y 15 minutos
+DEFAULT_WINDOWS = (60, 300, 900)
+
+
+class RollingCounts:
+    """
+    Sumas de columnas en ventanas deslizantes de tiempo
+
+    Un único anillo de buckets de `resolution` segundos cubre la ventana más
+    larga; cada ventana mantiene su suma y al avanzar el tiempo resta el
+    bucket que sale de ella. La memoria es fija y cada actualización cuesta
+    O(1) por ventana, sin importar el tráfico.
+    """
+
+    def __init__(self, columns, windows=DEFAULT_WINDOWS, resolution=1.0):
+        self.windows = tuple(sorted(int(window) for window in windows))
+        self.resolution = resolution
+        self._sizes = [max(1, int(round(window / resolution))) for window in self.windows]
+        self._ring = np.zeros((max(self._sizes), columns), dtype=np.int64)
+        self._sums = np.zeros((len(self.windows), columns), dtype=np.int64)
+        self._head = None
+
+    def add(self, timestamp, values):
+        """Suma `values` (una fila de columnas) en el instante `timestamp`"""
+        self.advance(timestamp)
+        self._ring[self._head % len(self._ring)] += values
+        self._sums += values
+
+    def advance(self, timestamp):
+        """Mueve las ventanas hasta `timestamp` (descarta lo que quedó fuera)"""
+        bucket = int(timestamp // self.resolution)
+        if self._head is None:
+            self._head = bucket
+            return
+        if bucket <= self._head:
+            return
+        if bucket - self._head >= len(self._ring):
+            self._ring[:] = 0
+            self._sums[:] = 0
+            self._head = bucket
+            return
+        length = len(self._ring)
+        for step in range(self._head + 1, bucket + 1):
+            for idx, size in enumerate(self._sizes):
+                self._sums[idx] -= self._ring[(step - size) % length]
+            self._ring[step % length] = 0
+        self._head = bucket
+
+    def totals(self, timestamp=None):
+        """{ventana_segundos: array de sumas por columna}"""
+        if timestamp is not None:
+            self.advance(timestamp)
+        return {window: self._sums[idx].copy() for idx, window in enumerate(self.windows)}
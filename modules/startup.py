@@ -0,0 +1,104 @@
+"""
+Startup - Inicialización diferida y pre-calentamiento en segundo plano
+
+Importar la app no debe cargar torch ni sondear el hardware: los objetos
+pesados se construyen al primer uso (Lazy) y el arranque los prepara en un
+hilo de fondo (Warmup) mientras el servidor ya atiende /healthz.
+"""
+import threading
+import time
+from datetime import datetime
+
+
+class Lazy:
+    """
+    Objeto construido con `factory()` la primera vez que se usa
+
+    Los atributos se delegan al objeto construido. Si varios hilos lo piden
+    a la vez, uno lo construye y el resto espera.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._initialized = False
+
+    @property
+    def initialized(self):
+        """True si ya se construyó (no bloquea)"""
+        return self._initialized
+
+    def get(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._value = self._factory()
+                    self._initialized = True
+        return self._value
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+class Warmup:
+    """
+    Pasos de arranque ejecutados en orden en un hilo de fondo
+
+    `ready` se activa cuando terminan todos; si uno falla, los siguientes no
+    se ejecutan y el error queda en status().
+    """
+
+    def __init__(self, steps):
+        """
+        Args:
+            steps: Lista de (nombre, callable)
+        """
+        self.steps = list(steps)
+        self.ready = threading.Event()
+        self.started_at = None
+        self.error = None
+        self._state = {name: {'status': 'pending'} for name, _ in self.steps}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Inicia el hilo de arranque (solo la primera llamada)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.started_at = datetime.now().isoformat()
+            self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def status(self):
+        """Estado de cada paso, para /readyz"""
+        with self._lock:
+            steps = {name: dict(state) for name, state in self._state.items()}
+        return {
+            'ready': self.ready.is_set(),
+            'started_at': self.started_at,
+            'error': self.error,
+            'steps': steps
+        }
+
+    def _run(self):
+        for name, step in self.steps:
+            with self._lock:
+                self._state[name]['status'] = 'running'
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                with self._lock:
+                    self._state[name].update(status='error', error=str(e))
+                    self.error = f'{name}: {e}'
+                print(f"[STARTUP] Falló '{name}': {e}")
+                return
+            with self._lock:
+                self._state[name].update(status='done', seconds=round(time.perf_counter() - started, 3))
+        self.ready.set()
+        print("[STARTUP] Listo")
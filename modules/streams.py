@@ -0,0 +1,234 @@
+"""
+Streams - Lectura de streams en vivo y conteos en ventanas deslizantes
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .regions import RegionMask, anchor_points
+from .rolling import DEFAULT_WINDOWS, RollingCounts
+
+STREAM_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://')
+
+
+class LatestFrameReader:
+    """
+    Lee un stream en un hilo propio y conserva solo el frame más reciente
+
+    Si el procesamiento va más lento que el stream, los frames que no se
+    alcanzaron a tomar se descartan (contados en `dropped`) en lugar de
+    acumular latencia. Con `loop` un archivo local se reproduce en bucle al
+    ritmo de su FPS, como sustituto de una cámara.
+    """
+
+    def __init__(self, source, loop=False, reconnect_delay=2.0, max_reconnects=None):
+        """
+        Args:
+            source: URL (RTSP/HTTP) o ruta de un archivo local
+            loop: Reproducir el archivo en bucle a tiempo real
+            reconnect_delay: Segundos de espera antes de reabrir un stream caído
+            max_reconnects: Reintentos seguidos antes de terminar (None: sin límite)
+        """
+        self.source = source
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnects = max_reconnects
+
+        self.cap = self._open()
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._taken = 0
+        self._stop = threading.Event()
+        self.finished = False
+        self.error = None
+        self.stats = {'read': 0, 'taken': 0, 'dropped': 0, 'reconnects': 0, 'loops': 0}
+        self._thread = threading.Thread(target=self._run, name='stream-reader', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def get(self, timeout=1.0):
+        """
+        Returns:
+            (frame_index, timestamp, frame) más nuevo que el último entregado,
+            o None si no llegó uno dentro de `timeout`
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._has_new() or self.finished, timeout)
+            if not self._has_new():
+                return None
+            self._taken = self._latest[0]
+            self.stats['taken'] += 1
+            return self._latest
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.cap.release()
+
+    def _has_new(self):
+        return self._latest is not None and self._latest[0] > self._taken
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise IOError(f"No se pudo abrir el stream: {self.source}")
+        return cap
+
+    def _run(self):
+        index = 0
+        failures = 0
+        interval = 1.0 / self.fps if self.loop and self.fps > 0 else 0
+        next_time = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                success, frame = self.cap.read()
+                if not success:
+                    if self.loop and index > 0:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        self.stats['loops'] += 1
+                        continue
+                    failures += 1
+                    if self.max_reconnects is not None and failures > self.max_reconnects:
+                        break
+                    # Stream caído: reabrir tras una pausa
+                    if self._stop.wait(self.reconnect_delay):
+                        break
+                    self.cap.release()
+                    self.cap = cv2.VideoCapture(self.source)
+                    self.stats['reconnects'] += 1
+                    continue
+                failures = 0
+
+                # Archivo en bucle: al ritmo del video, como una cámara
+                if interval:
+                    next_time += interval
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_time = time.monotonic()
+
+                index += 1
+                with self._cond:
+                    if self._has_new():
+                        self.stats['dropped'] += 1
+                    self._latest = (index, time.time(), frame)
+                    self.stats['read'] += 1
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+
+
+class RollingVehicleCounter:
+    """
+    Vehículos nuevos y detecciones por tipo y región en ventanas deslizantes
+
+    A diferencia de VehicleCounter no guarda todos los IDs vistos: un track
+    que no aparece en `track_ttl` segundos se olvida, así la memoria no crece
+    con las horas de stream.
+    """
+
+    def __init__(self, vehicle_classes, regions=None, frame_size=None, anchor='top_left',
+                 windows=DEFAULT_WINDOWS, track_ttl=60.0):
+        self.vehicle_classes = vehicle_classes
+        self.regions = regions or []
+        self.anchor = anchor
+        self.track_ttl = track_ttl
+        self._class_ids = np.array(sorted(vehicle_classes), dtype=np.int64)
+        self.vehicle_types = [vehicle_classes[int(class_id)] for class_id in self._class_ids]
+        self.region_mask = RegionMask(self.regions, *frame_size) if self.regions else None
+
+        # Columnas: vehículos nuevos por tipo y por región
+        self.vehicles = RollingCounts(len(self.vehicle_types) + len(self.regions), windows)
+        self.detections = RollingCounts(len(self.vehicle_types), windows)
+        self.total_vehicles = 0
+        self.expired = 0
+        # track_id -> (último instante visto, regiones donde ya se contó)
+        self._tracks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_tracks(self, tracks, timestamp):
+        """Cuenta los tracks (N, >=7) de un frame capturado en `timestamp`"""
+        tracks = tracks[np.isin(tracks[:, 6].astype(np.int64), self._class_ids)]
+        with self._lock:
+            self._expire(timestamp)
+            if len(tracks) == 0:
+                return
+
+            type_idx = np.searchsorted(self._class_ids, tracks[:, 6].astype(np.int64))
+            if self.region_mask is not None:
+                member = self.region_mask.lookup(anchor_points(tracks[:, :4], self.anchor)).T
+            else:
+                member = np.zeros((len(tracks), 0), dtype=bool)
+
+            type_count = len(self.vehicle_types)
+            new = np.zeros(type_count + len(self.regions), dtype=np.int64)
+            for row, track_id in enumerate(tracks[:, 4].astype(np.int64).tolist()):
+                entry = self._tracks.pop(track_id, None)
+                if entry is None:
+                    entry = (timestamp, set())
+                    new[type_idx[row]] += 1
+                    self.total_vehicles += 1
+                seen_regions = entry[1]
+                for region_idx in np.flatnonzero(member[row]).tolist():
+                    if region_idx not in seen_regions:
+                        seen_regions.add(region_idx)
+                        new[type_count + region_idx] += 1
+                self._tracks[track_id] = (timestamp, seen_regions)
+
+            self.vehicles.add(timestamp, new)
+            self.detections.add(timestamp, np.bincount(type_idx, minlength=type_count))
+
+    def summary(self, timestamp=None):
+        """Conteos por ventana con nombres de tipo y región"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._expire(timestamp)
+            vehicles = self.vehicles.totals(timestamp)
+            detections = self.detections.totals(timestamp)
+            active = len(self._tracks)
+        type_count = len(self.vehicle_types)
+
+        windows = {}
+        for window, counts in vehicles.items():
+            windows[f'{window}s'] = {
+                'vehicles': int(counts[:type_count].sum()),
+                'vehicles_by_type': dict(zip(self.vehicle_types, counts[:type_count].tolist())),
+                'detections_by_type': dict(zip(self.vehicle_types, detections[window].tolist())),
+                'vehicles_by_region': {
+                    f'region_{idx}': int(count) for idx, count in enumerate(counts[type_count:].tolist())
+                }
+            }
+        return {
+            'windows': windows,
+            'total_vehicles': self.total_vehicles,
+            'active_tracks': active,
+            'expired_tracks': self.expired
+        }
+
+    def _expire(self, timestamp):
+        # Orden de último uso: los más viejos quedan al inicio
+        cutoff = timestamp - self.track_ttl
+        while self._tracks:
+            track_id, (last_seen, _) = next(iter(self._tracks.items()))
+            if last_seen >= cutoff:
+                break
+            del self._tracks[track_id]
+            self.expired += 1
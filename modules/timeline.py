@@ -0,0 +1,394 @@
+"""
+Timeline - Conteos por intervalo de tiempo en formato columnar (NumPy / .npz)
+"""
+import os
+
+import numpy as np
+
+# Columnas que se vuelcan a disco y su tipo (ver Timeline.get_state)
+_SPILL_COLUMNS = {
+    'detections': np.int32,
+    'region_detections': np.int32,
+    'vehicle_event_frame': np.int32,
+    'vehicle_event_track': np.int64,
+    'vehicle_event_type': np.int16,
+    'region_event_frame': np.int32,
+    'region_event_track': np.int64,
+    'region_event_region': np.int16
+}
+
+
+class Timeline:
+    """
+    Serie temporal de conteos construida durante el procesamiento
+
+    Columnas por intervalo de `interval` segundos de video:
+        detections (intervalos, tipos) y region_detections (intervalos, regiones)
+    Eventos de vehículo nuevo (primera vez que aparece un track ID):
+        vehicle_events: frame, track_id, tipo
+        region_events: frame, track_id, región
+    Los conteos de vehículos nuevos por intervalo se derivan de los eventos,
+    así se pueden re-agrupar a cualquier resolución y combinar segmentos.
+
+    Con `spill_path` los intervalos cerrados y los eventos se agregan a
+    archivos binarios por columna a medida que se acumulan: en memoria queda
+    solo una ventana acotada y un checkpoint guarda offsets más esa ventana,
+    así memoria y checkpoints no crecen con la duración del video.
+    """
+
+    def __init__(self, vehicle_types, region_count, fps, interval=1.0, total_frames=0,
+                 spill_path=None, flush_rows=256, flush_events=4096):
+        self.vehicle_types = list(vehicle_types)
+        self.region_count = region_count
+        self.fps = fps if fps > 0 else 30.0
+        self.interval = interval
+        self._frames_per_bucket = self.fps * interval
+
+        rows = max(1, int(np.ceil(total_frames / self._frames_per_bucket))) if total_frames else 64
+        # Con la duración conocida el timeline cubre todo el video, haya o no detecciones
+        self.buckets = rows if total_frames else 0
+
+        self.spill_path = spill_path
+        self.flush_rows = flush_rows
+        self.flush_events = flush_events
+        # Intervalos y eventos ya escritos en disco; la ventana en memoria
+        # empieza en el intervalo `spilled_rows`
+        self.spilled_rows = 0
+        self.spilled_events = {'vehicle': 0, 'region': 0}
+        self._spill_ready = False
+        self._last_row = 0
+
+        capacity = min(rows, 2 * flush_rows) if spill_path else rows
+        self.detections = np.zeros((capacity, len(self.vehicle_types)), dtype=np.int32)
+        self.region_detections = np.zeros((capacity, region_count), dtype=np.int32)
+        self.vehicle_events = ([], [], [])
+        self.region_events = ([], [], [])
+
+    def bucket(self, frame_index):
+        """Intervalo al que pertenece un frame (1-based)"""
+        return int((frame_index - 1) // self._frames_per_bucket)
+
+    def add_detections(self, frame_index, type_idx, new_ids, new_type_idx):
+        """
+        Args:
+            type_idx: Índice de tipo de cada detección del frame
+            new_ids, new_type_idx: Track IDs vistos por primera vez y su tipo
+        """
+        row = self._row(frame_index)
+        np.add.at(self.detections[row], type_idx, 1)
+        self._add_events(self.vehicle_events, frame_index, new_ids, new_type_idx)
+
+    def add_region(self, frame_index, region_idx, count, new_ids):
+        """Detecciones de un frame en una región y los IDs nuevos en ella"""
+        self.region_detections[self._row(frame_index), region_idx] += count
+        self._add_events(self.region_events, frame_index, new_ids, [region_idx] * len(new_ids))
+
+    def get_state(self):
+        """Columnas usadas y eventos como arrays (para guardar o combinar), incluido lo volcado a disco"""
+        window = max(0, self.buckets - self.spilled_rows)
+        state = {
+            'fps': np.float64(self.fps),
+            'interval': np.float64(self.interval),
+            'vehicle_types': np.array(self.vehicle_types, dtype=str)
+        }
+        for name in ('detections', 'region_detections'):
+            column = getattr(self, name)
+            memory = np.zeros((window, column.shape[1]), dtype=np.int32)
+            used = min(window, len(column))
+            memory[:used] = column[:used]
+            state[name] = np.concatenate([self._read_spill(name, self.spilled_rows), memory])
+        for prefix, events in (('vehicle', self.vehicle_events), ('region', self.region_events)):
+            for (column, dtype), values in zip(self._event_columns(prefix), events):
+                state[column] = np.concatenate([
+                    self._read_spill(column, self.spilled_events[prefix]),
+                    np.array(values, dtype=dtype)
+                ])
+        return state
+
+    def load_state(self, state):
+        """
+        Restaura un estado de get_state() o de checkpoint_state() (arrays o
+        listas, p.ej. desde JSON)
+        """
+        spilled = state.get('spilled')
+        if spilled:
+            # Lo escrito en disco después del checkpoint se descarta al escribir
+            self.spilled_rows = spilled['rows']
+            self.spilled_events = {'vehicle': spilled['vehicle_events'], 'region': spilled['region_events']}
+            self.buckets = spilled['buckets']
+        detections = np.asarray(state['detections'], dtype=np.int32).reshape(-1, len(self.vehicle_types))
+        if not spilled:
+            self.buckets = len(detections)
+        self._ensure_rows(len(detections))
+        self.detections[:len(detections)] = detections
+        self.region_detections[:len(detections)] = np.asarray(
+            state['region_detections'], dtype=np.int32).reshape(len(detections), self.region_count)
+        if spilled:
+            self._last_row = spilled['open_row']
+        else:
+            # Estado completo: el intervalo abierto es el último con datos
+            used = np.flatnonzero(detections.any(axis=1) | self.region_detections[:len(detections)].any(axis=1))
+            self._last_row = int(used[-1]) if len(used) else 0
+        self.vehicle_events = tuple(list(np.asarray(state[f'vehicle_event_{name}']).tolist())
+                                    for name in ('frame', 'track', 'type'))
+        self.region_events = tuple(list(np.asarray(state[f'region_event_{name}']).tolist())
+                                   for name in ('frame', 'track', 'region'))
+
+    def to_json_state(self):
+        """get_state() con listas en lugar de arrays (serializable en JSON)"""
+        return {name: value.tolist() for name, value in self.get_state().items()}
+
+    def checkpoint_state(self):
+        """
+        Estado serializable en JSON para retomar
+
+        Con spill_path vuelca a disco los intervalos cerrados y los eventos, y
+        solo guarda los offsets y la ventana abierta; sin él, to_json_state().
+        """
+        if not self.spill_path:
+            return self.to_json_state()
+        self.flush()
+        window = max(0, min(self._last_row + 1, self.buckets) - self.spilled_rows)
+        return {
+            'spilled': {
+                'rows': self.spilled_rows,
+                'open_row': self._last_row,
+                'vehicle_events': self.spilled_events['vehicle'],
+                'region_events': self.spilled_events['region'],
+                'buckets': self.buckets
+            },
+            'detections': self.detections[:window].tolist(),
+            'region_detections': self.region_detections[:window].tolist(),
+            **{column: list(values) for (column, _), values in
+               zip(self._event_columns('vehicle') + self._event_columns('region'),
+                   self.vehicle_events + self.region_events)}
+        }
+
+    def flush(self):
+        """Vuelca a disco los intervalos cerrados (antes del último usado) y los eventos"""
+        if not self.spill_path:
+            return
+        self._spill_rows(self._last_row)
+        for prefix, events in (('vehicle', self.vehicle_events), ('region', self.region_events)):
+            if not events[0]:
+                continue
+            for (column, dtype), values in zip(self._event_columns(prefix), events):
+                self._append_spill(column, np.array(values, dtype=dtype))
+                values.clear()
+            self.spilled_events[prefix] = self._spill_count(self._event_columns(prefix)[0][0])
+
+    def discard_spill(self):
+        """Elimina los archivos volcados (después de guardar el .npz)"""
+        for path in spill_files(self.spill_path):
+            os.remove(path)
+        self._spill_ready = False
+
+    def save(self, path):
+        save_timeline(path, self.get_state())
+
+    def summary(self):
+        return timeline_summary(self.get_state())
+
+    def _row(self, frame_index):
+        row = self.bucket(frame_index)
+        if row >= self.buckets:
+            self.buckets = row + 1
+        self._last_row = max(self._last_row, row)
+        if self.spill_path and row - self.spilled_rows >= 2 * self.flush_rows:
+            self._spill_rows(row)
+        self._ensure_rows(row - self.spilled_rows + 1)
+        return row - self.spilled_rows
+
+    def _ensure_rows(self, rows):
+        if rows <= len(self.detections):
+            return
+        capacity = max(rows, 2 * len(self.detections))
+        for name in ('detections', 'region_detections'):
+            column = getattr(self, name)
+            grown = np.zeros((capacity, column.shape[1]), dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _add_events(self, events, frame_index, track_ids, values):
+        frames, tracks, column = events
+        frames.extend([frame_index] * len(track_ids))
+        tracks.extend(track_ids)
+        column.extend(values)
+        if self.spill_path and len(frames) >= self.flush_events:
+            self.flush()
+
+    def _spill_rows(self, upto):
+        """Escribe los intervalos [spilled_rows, upto) y corre la ventana"""
+        count = min(upto - self.spilled_rows, len(self.detections))
+        if count <= 0:
+            return
+        for name in ('detections', 'region_detections'):
+            column = getattr(self, name)
+            self._append_spill(name, column[:count])
+            column[:-count] = column[count:].copy()
+            column[-count:] = 0
+        self.spilled_rows += count
+
+    @staticmethod
+    def _event_columns(prefix):
+        return [(name, dtype) for name, dtype in _SPILL_COLUMNS.items() if name.startswith(f'{prefix}_event_')]
+
+    def _spill_file(self, name):
+        return f'{self.spill_path}.{name}.bin'
+
+    def _spill_width(self, name):
+        return {'detections': len(self.vehicle_types), 'region_detections': self.region_count}.get(name, 1)
+
+    def _spill_count(self, name):
+        """Filas (o eventos) de la columna ya en disco"""
+        itemsize = np.dtype(_SPILL_COLUMNS[name]).itemsize * self._spill_width(name)
+        return os.path.getsize(self._spill_file(name)) // itemsize if itemsize else 0
+
+    def _prepare_spill(self):
+        # Al primer volcado los archivos se recortan a lo que cubre el estado
+        # actual (vacíos al empezar; al retomar, lo que guardó el checkpoint)
+        expected = {'detections': self.spilled_rows, 'region_detections': self.spilled_rows}
+        for prefix in ('vehicle', 'region'):
+            for name, _ in self._event_columns(prefix):
+                expected[name] = self.spilled_events[prefix]
+        for name, dtype in _SPILL_COLUMNS.items():
+            with open(self._spill_file(name), 'ab') as f:
+                f.truncate(expected[name] * np.dtype(dtype).itemsize * self._spill_width(name))
+        self._spill_ready = True
+
+    def _append_spill(self, name, values):
+        if not self._spill_ready:
+            self._prepare_spill()
+        with open(self._spill_file(name), 'ab') as f:
+            np.ascontiguousarray(values, dtype=_SPILL_COLUMNS[name]).tofile(f)
+
+    def _read_spill(self, name, count):
+        width = self._spill_width(name)
+        shape = (0, width) if name in ('detections', 'region_detections') else (0,)
+        if not count:
+            return np.zeros(shape, dtype=_SPILL_COLUMNS[name])
+        values = np.fromfile(self._spill_file(name), dtype=_SPILL_COLUMNS[name], count=count * width)
+        return values.reshape(-1, width) if len(shape) == 2 else values
+
+
+def spill_files(spill_path):
+    """Archivos de volcado de un Timeline con ese spill_path (los que existan)"""
+    if not spill_path:
+        return []
+    return [path for path in (f'{spill_path}.{name}.bin' for name in _SPILL_COLUMNS) if os.path.exists(path)]
+
+
+def save_timeline(path, state):
+    """Guarda un estado de Timeline como .npz sin comprimir"""
+    np.savez(path, **state)
+
+
+def timeline_summary(state):
+    """Metadatos del timeline que se incluyen en los resultados"""
+    return {
+        'interval': float(state['interval']),
+        'buckets': len(state['detections']),
+        'new_vehicle_events': len(state['vehicle_event_frame'])
+    }
+
+
+def merge_timelines(states, track_key=None):
+    """
+    Suma los estados de varios segmentos del mismo video
+
+    Args:
+        states: Lista de Timeline.get_state() (en orden de segmento)
+        track_key: Callable(segmento, track_id) -> identidad del vehículo entre
+            segmentos; se conserva solo el primer evento de cada vehículo
+            (y de cada vehículo en cada región)
+    """
+    states = [state for state in states if state is not None]
+    if not states:
+        return None
+    merged = dict(states[0])
+    buckets = max(len(state['detections']) for state in states)
+    for name in ('detections', 'region_detections'):
+        total = np.zeros((buckets, states[0][name].shape[1]), dtype=np.int32)
+        for state in states:
+            total[:len(state[name])] += state[name]
+        merged[name] = total
+
+    for prefix, columns, per_value in (('vehicle_event', ('frame', 'track', 'type'), False),
+                                       ('region_event', ('frame', 'track', 'region'), True)):
+        seen = set()
+        masks = []
+        for idx, state in enumerate(states):
+            mask = []
+            for track_id, value in zip(state[f'{prefix}_track'].tolist(),
+                                       state[f'{prefix}_{columns[2]}'].tolist()):
+                key = track_key(idx, track_id) if track_key else (idx, track_id)
+                if per_value:
+                    key = (key, value)
+                mask.append(key not in seen)
+                seen.add(key)
+            masks.append(np.array(mask, dtype=bool))
+        for column in columns:
+            name = f'{prefix}_{column}'
+            merged[name] = np.concatenate([state[name][mask] for state, mask in zip(states, masks)])
+    return merged
+
+
+def query_timeline(path, start=None, end=None, bucket=None, region_names=None):
+    """
+    Consulta un rango de tiempo de un timeline guardado, re-agrupado a `bucket`
+
+    Lee el .npz del timeline, sin cargar los resultados del job.
+
+    Args:
+        start, end: Segundos de video (None: desde el inicio / hasta el final)
+        bucket: Segundos por intervalo de salida (múltiplo del intervalo base)
+
+    Returns:
+        dict columnar: inicio de cada intervalo y conteos por tipo y región
+    """
+    with np.load(path, allow_pickle=False) as data:
+        interval = float(data['interval'])
+        fps = float(data['fps'])
+        vehicle_types = [str(name) for name in data['vehicle_types']]
+
+        step = max(1, int(round((bucket or interval) / interval)))
+        first = max(0, int((start or 0) // interval))
+        detections = data['detections']
+        last = len(detections) if end is None else min(len(detections), int(np.ceil(end / interval)))
+        last = max(first, last)
+        out_rows = -(-(last - first) // step)
+
+        def rebucket(column):
+            sliced = column[first:last]
+            padded = np.zeros((out_rows * step, sliced.shape[1]), dtype=np.int64)
+            padded[:len(sliced)] = sliced
+            return padded.reshape(out_rows, step, sliced.shape[1]).sum(axis=1)
+
+        def event_counts(frames, values, width):
+            rows = ((frames - 1) // (fps * interval)).astype(np.int64)
+            selected = (rows >= first) & (rows < last)
+            out_idx = (rows[selected] - first) // step
+            counts = np.zeros((out_rows, width), dtype=np.int64)
+            np.add.at(counts, (out_idx, values[selected].astype(np.int64)), 1)
+            return counts
+
+        type_detections = rebucket(detections)
+        type_new = event_counts(data['vehicle_event_frame'], data['vehicle_event_type'], len(vehicle_types))
+        region_detections = rebucket(data['region_detections'])
+        region_new = event_counts(data['region_event_frame'], data['region_event_region'],
+                                  region_detections.shape[1])
+
+    region_names = region_names or [f'region_{idx}' for idx in range(region_detections.shape[1])]
+    return {
+        'interval': interval * step,
+        'start': [round((first + row * step) * interval, 3) for row in range(out_rows)],
+        'detections': {name: type_detections[:, idx].tolist() for idx, name in enumerate(vehicle_types)},
+        'new_vehicles': {name: type_new[:, idx].tolist() for idx, name in enumerate(vehicle_types)},
+        'regions': {
+            name: {
+                'detections': region_detections[:, idx].tolist(),
+                'new_vehicles': region_new[:, idx].tolist()
+            }
+            for idx, name in enumerate(region_names)
+        }
+    }
@@ -0,0 +1,215 @@
+"""
+Tracking - Estado de tracking aislado por job
+"""
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
+
+
+class Detections:
+    """Detecciones de un frame con la interfaz que esperan los trackers (xyxy, conf, cls)"""
+
+    __slots__ = ('xyxy', 'conf', 'cls')
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    @classmethod
+    def from_boxes(cls, boxes, offset=(0, 0)):
+        """Crea detecciones desde ultralytics Boxes, desplazadas por offset (x, y)"""
+        boxes = boxes.cpu().numpy()
+        xyxy = boxes.xyxy
+        if offset != (0, 0):
+            xyxy = xyxy + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=xyxy.dtype)
+        return cls(xyxy, boxes.conf, boxes.cls)
+
+
+class TrackerSession:
+    """Tracker (BoT-SORT/ByteTrack) propio de un job"""
+
+    def __init__(self, tracker_cfg='botsort.yaml', frame_rate=30, first_id=1):
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_cfg)))
+        self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+
+        # ultralytics numera los tracks con un contador global (BaseTrack._count)
+        # compartido por todo el proceso; cada sesión usa su propio contador
+        # para que jobs concurrentes nunca mezclen IDs
+        self._ids = itertools.count(first_id)
+        self.last_id = first_id - 1
+        base_init_track = self.tracker.init_track
+
+        def init_track(dets, scores, cls, img=None):
+            tracks = base_init_track(dets, scores, cls, img)
+            for track in tracks:
+                track.next_id = self._next_id
+            return tracks
+
+        self.tracker.init_track = init_track
+
+    def _next_id(self):
+        self.last_id = next(self._ids)
+        return self.last_id
+
+    def update(self, boxes, frame):
+        """
+        Actualiza el tracker con las detecciones de un frame
+
+        Args:
+            boxes: Detecciones con atributos xyxy, conf y cls (Detections o Boxes en numpy)
+            frame: Imagen del frame (usada por la compensación de movimiento)
+
+        Returns:
+            np.ndarray (N, 8): [x1, y1, x2, y2, track_id, conf, cls, idx]
+        """
+        # Igual que ultralytics: los frames sin detecciones no avanzan el tracker
+        if len(boxes) == 0:
+            return np.empty((0, 8), dtype=np.float32)
+        tracks = self.tracker.update(boxes, frame)
+        return tracks.reshape(-1, 8)
+
+
+class TrackRecord:
+    """Estado compacto de un track contado"""
+
+    __slots__ = ('first_frame', 'last_frame', 'class_id', 'type_bits', 'region_bits')
+
+    def __init__(self, first_frame, last_frame, class_id, type_bits=0, region_bits=0):
+        self.first_frame = first_frame
+        self.last_frame = last_frame
+        self.class_id = class_id
+        # Un bit por índice de tipo y por región en que ya se contó el track
+        self.type_bits = type_bits
+        self.region_bits = region_bits
+
+    def to_list(self):
+        return [self.first_frame, self.last_frame, self.class_id, self.type_bits, self.region_bits]
+
+
+class TrackTable:
+    """
+    Tracks activos ordenados por último frame visto
+
+    Un track que no aparece en `evict_after` frames de video se desaloja (sus
+    conteos ya están en los totales del contador), así la memoria depende de
+    los vehículos en escena y no del largo del video. Si el tracker recupera
+    un track desalojado se cuenta de nuevo: `evict_after` debe superar el
+    tiempo que el tracker conserva los tracks perdidos.
+    """
+
+    def __init__(self, evict_after=1800):
+        self.evict_after = evict_after
+        self._records = OrderedDict()
+        # IDs cuyo registro se conserva al desalojarlos (p.ej. para unir segmentos)
+        self.retain = set()
+        self.retained = {}
+        self.evicted = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, track_id):
+        return self._records.get(track_id)
+
+    def add(self, track_id, frame_index, class_id):
+        record = TrackRecord(frame_index, frame_index, class_id)
+        self._records[track_id] = record
+        self.peak = max(self.peak, len(self._records))
+        return record
+
+    def touch(self, track_id, record, frame_index, class_id):
+        """Marca el track como visto en `frame_index`"""
+        record.last_frame = frame_index
+        record.class_id = class_id
+        self._records.move_to_end(track_id)
+
+    def evict(self, frame_index):
+        """Desaloja los tracks no vistos desde frame_index - evict_after"""
+        if self.evict_after is None:
+            return
+        cutoff = frame_index - self.evict_after
+        while self._records:
+            track_id, record = next(iter(self._records.items()))
+            if record.last_frame >= cutoff:
+                break
+            del self._records[track_id]
+            if track_id in self.retain:
+                self.retained[track_id] = record
+            self.evicted += 1
+
+    def items(self):
+        return self._records.items()
+
+    def get_state(self):
+        """{track_id: [first_frame, last_frame, class_id, type_bits, region_bits]} activos y retenidos"""
+        state = {track_id: record.to_list() for track_id, record in self.retained.items()}
+        state.update((track_id, record.to_list()) for track_id, record in self._records.items())
+        return state
+
+    def load_state(self, state):
+        """Restaura un estado de get_state() (claves str si viene de JSON)"""
+        self._records = OrderedDict(sorted(
+            ((int(track_id), TrackRecord(*values)) for track_id, values in state.items()),
+            key=lambda item: item[1].last_frame
+        ))
+        self.peak = max(self.peak, len(self._records))
+
+    def get_stats(self):
+        return {'active': len(self._records), 'peak': self.peak, 'evicted': self.evicted,
+                'evict_after': self.evict_after}
+
+
+def record_boxes(boxes_by_track, frame_index, tracks):
+    """Agrega las cajas de un frame a {track_id: {frame_index: [x1, y1, x2, y2]}}"""
+    for row in tracks:
+        boxes_by_track.setdefault(int(row[4]), {})[frame_index] = row[:4].tolist()
+
+
+def match_tracks(prev_boxes, next_boxes, iou_threshold=0.5):
+    """
+    Empareja tracks de dos corridas del tracker sobre los mismos frames
+
+    Args:
+        prev_boxes, next_boxes: {track_id: {frame_index: [x1, y1, x2, y2]}}
+
+    Returns:
+        Lista de (prev_id, next_id) emparejados 1 a 1 por IoU medio, mayor primero
+    """
+    candidates = []
+    for prev_id, prev_track in prev_boxes.items():
+        for next_id, next_track in next_boxes.items():
+            common = prev_track.keys() & next_track.keys()
+            if not common:
+                continue
+            score = np.mean([box_iou(prev_track[f], next_track[f]) for f in common])
+            if score >= iou_threshold:
+                candidates.append((score, prev_id, next_id))
+
+    pairs = []
+    used_prev, used_next = set(), set()
+    for _, prev_id, next_id in sorted(candidates, reverse=True):
+        if prev_id in used_prev or next_id in used_next:
+            continue
+        used_prev.add(prev_id)
+        used_next.add(next_id)
+        pairs.append((prev_id, next_id))
+    return pairs
+
+
+def box_iou(box_a, box_b):
+    """IoU entre dos cajas [x1, y1, x2, y2]"""
+    inter_w = max(0.0, min(box_a[2], box_b[2]) - max(box_a[0], box_b[0]))
+    inter_h = max(0.0, min(box_a[3], box_b[3]) - max(box_a[1], box_b[1]))
+    inter = inter_w * inter_h
+    union = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) + \
+        (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - inter
+    return inter / union if union > 0 else 0.0
@@ -0,0 +1,240 @@
+"""
+Uploads - Subidas por partes, reanudables, con hash y metadatos en una sola pasada
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from werkzeug.utils import secure_filename
+
+
+class UploadError(Exception):
+    """Subida inexistente, offset inválido o tamaño inconsistente"""
+
+
+def save_and_hash(stream, path, chunk_size=1024 * 1024):
+    """
+    Guarda un stream en disco calculando su SHA-256 en la misma pasada
+
+    Returns:
+        (hexdigest, bytes escritos)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def probe_video(path):
+    """Lee frames, fps y tamaño del video (una sola apertura)"""
+    import cv2
+    cap = cv2.VideoCapture(path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    return {
+        'total_frames': total_frames,
+        'fps': fps,
+        'width': width,
+        'height': height,
+        'duration': total_frames / fps if fps > 0 else 0
+    }
+
+
+def write_meta(video_path, video_hash, size):
+    """Guarda hash y metadatos junto al video (<video>.meta.json)"""
+    meta = {'sha256': video_hash, 'size': size, 'video_info': probe_video(video_path)}
+    with open(video_path + '.meta.json', 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def read_meta(video_path):
+    """Metadatos guardados con write_meta, o None"""
+    try:
+        with open(video_path + '.meta.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class _Upload:
+    __slots__ = ('upload_id', 'filename', 'size', 'offset', 'digest', 'lock', 'updated')
+
+    def __init__(self, upload_id, filename, size, offset=0, digest=None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.offset = offset
+        self.digest = digest or hashlib.sha256()
+        self.lock = threading.Lock()
+        self.updated = time.time()
+
+
+class UploadManager:
+    """
+    Subidas en partes consecutivas escritas directo a disco
+
+    Cada parte se lee del request en bloques de `chunk_size` (memoria acotada)
+    y actualiza el SHA-256 incremental. Si la conexión se corta, el cliente
+    consulta el offset y continúa desde ahí; si el servidor se reinició, el
+    hash se reconstruye leyendo una vez lo ya recibido.
+    """
+
+    def __init__(self, upload_dir, chunk_size=1024 * 1024, max_age_hours=24, max_size=None):
+        """
+        Args:
+            max_size: Bytes máximos por subida (None: sin límite); cada parte
+                es un request chico, así que el límite de Flask no alcanza
+        """
+        self.upload_dir = upload_dir
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.max_age_hours = max_age_hours
+        self._lock = threading.Lock()
+        self._uploads = {}
+
+    def create(self, filename, size):
+        """Inicia una subida; retorna su estado"""
+        if size <= 0:
+            raise UploadError('Invalid size')
+        if self.max_size is not None and size > self.max_size:
+            raise UploadError(f'Upload too large (max {self.max_size} bytes)')
+        self.cleanup_stale()
+
+        upload_id = str(uuid.uuid4())
+        upload = _Upload(upload_id, filename, size)
+        with open(self._part_path(upload_id), 'wb'):
+            pass
+        with open(self._state_path(upload_id), 'w') as f:
+            json.dump({'filename': filename, 'size': size}, f)
+        with self._lock:
+            self._uploads[upload_id] = upload
+        return self._status(upload)
+
+    def status(self, upload_id):
+        """Offset recibido y tamaño total (para reanudar)"""
+        return self._status(self._get(upload_id))
+
+    def append(self, upload_id, stream, offset):
+        """
+        Escribe una parte que empieza en `offset`
+
+        Returns:
+            Estado de la subida tras escribir la parte
+        """
+        upload = self._get(upload_id)
+        with upload.lock:
+            if offset != upload.offset:
+                raise UploadError(f'Expected offset {upload.offset}')
+
+            with open(self._part_path(upload_id), 'ab') as f:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    if upload.offset + len(chunk) > upload.size:
+                        raise UploadError('Upload exceeds declared size')
+                    f.write(chunk)
+                    upload.digest.update(chunk)
+                    upload.offset += len(chunk)
+            upload.updated = time.time()
+            return self._status(upload)
+
+    def finish(self, upload_id):
+        """
+        Mueve la subida completa a su nombre final y guarda hash y metadatos
+
+        Returns:
+            (filename, meta)
+        """
+        upload = self._get(upload_id)
+        with upload.lock:
+            if upload.offset != upload.size:
+                raise UploadError(f'Incomplete upload ({upload.offset}/{upload.size} bytes)')
+
+            filename = secure_filename(f"{upload_id}_{upload.filename}")
+            video_path = os.path.join(self.upload_dir, filename)
+            os.replace(self._part_path(upload_id), video_path)
+            os.remove(self._state_path(upload_id))
+            meta = write_meta(video_path, upload.digest.hexdigest(), upload.size)
+
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        return filename, meta
+
+    def cleanup_stale(self):
+        """Elimina subidas abandonadas por más de max_age_hours"""
+        cutoff = time.time() - self.max_age_hours * 3600
+        for name in os.listdir(self.upload_dir):
+            if not name.endswith('.upload.json'):
+                continue
+            upload_id = name[:-len('.upload.json')]
+            part_path = self._part_path(upload_id)
+            updated = os.path.getmtime(part_path) if os.path.exists(part_path) else 0
+            if updated < cutoff:
+                with self._lock:
+                    self._uploads.pop(upload_id, None)
+                for path in (part_path, self._state_path(upload_id)):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def _get(self, upload_id):
+        try:
+            upload_id = str(uuid.UUID(upload_id))
+        except ValueError:
+            raise UploadError('Upload not found')
+
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+        if upload is None:
+            restored = self._restore(upload_id)
+            with self._lock:
+                upload = self._uploads.setdefault(upload_id, restored)
+        return upload
+
+    def _restore(self, upload_id):
+        # Subida iniciada antes de un reinicio: rehacer el hash de lo recibido
+        try:
+            with open(self._state_path(upload_id)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('Upload not found')
+
+        digest = hashlib.sha256()
+        offset = 0
+        with open(self._part_path(upload_id), 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                offset += len(chunk)
+        return _Upload(upload_id, state['filename'], state['size'], offset, digest)
+
+    def _status(self, upload):
+        return {
+            'upload_id': upload.upload_id,
+            'offset': upload.offset,
+            'size': upload.size,
+            'complete': upload.offset == upload.size
+        }
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.upload_dir, f'{upload_id}.part')
+
+    def _state_path(self, upload_id):
+        return os.path.join(self.upload_dir, f'{upload_id}.upload.json')
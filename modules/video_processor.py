@@ -3,18 +3,35 @@ Video Processor - Procesamiento de video con YOLO11
 """
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from collections import defaultdict
+from collections import deque
+from contextlib import nullcontext
 import os
+import threading
+import time
+
+from .counting import VehicleCounter
+from .detection_log import DetectionLogWriter
+from .metrics import StageTimer, count_frames
+from .model_pool import load_model
+from .motion_gate import MotionGate
+from .pipeline import FramePipeline
+from .regions import roi_bounds
+from .streams import DEFAULT_WINDOWS, LatestFrameReader, RollingVehicleCounter
+from .timeline import Timeline
+from .video_writer import AnnotatedVideoWriter
+from .tracking import Detections, TrackerSession, match_tracks, record_boxes
 
 
 class VideoProcessor:
     """Procesa videos y detecta vehículos con YOLO11"""
     
-    def __init__(self, model_path='yolo11n.pt', device='cuda'):
-        self.model = YOLO(model_path)
-        self.model.to(device)
+    def __init__(self, model_path='yolo11n.pt', device='cuda', model=None,
+                 tracker_cfg='botsort.yaml', inference=None):
+        # Un modelo prestado por ModelPool ya viene cargado y pre-calentado;
+        # inference: opciones de backend de load_model (backend, int8, hilos)
+        self.model = model if model is not None else load_model(model_path, device, **(inference or {}))
         self.device = device
+        self.tracker_cfg = tracker_cfg
         
         # Clases de vehículos COCO
         self.vehicle_classes = {
@@ -24,14 +41,29 @@ class VideoProcessor:
             7: 'truck'
         }
         
-        # Pre-compilar modelo para GPU
-        dummy_frame = np.zeros((640, 384, 3), dtype=np.uint8)
-        self.model.predict(dummy_frame, conf=0.5, verbose=False)
-        
-        self.track_history = defaultdict(lambda: [])
+        self.tracker = TrackerSession(tracker_cfg)
+        self.pipeline = None
+        self.counter = None
+        self.timeline = None
+        self.detection_log = None
+        self.renderer = None
+        self.stream_stats = None
+        self.stage_timer = None
+    
+    @property
+    def track_history(self):
+        """Tracks activos del último video (tracking.TrackTable), o None"""
+        return getattr(self.counter, 'tracks', None)
     
     def process_video(self, video_path, regions=None, conf_threshold=0.5, 
-                     frame_skip=1, on_progress=None):
+                     frame_skip=1, on_progress=None, batch_size=1, queue_size=16,
+                     cancel_event=None, sample_fps=None, decode_mode='sparse',
+                     seek_threshold=300, anchor='top_left', roi=False, roi_margin=16,
+                     motion_gate=None, start_frame=1, end_frame=None, count_start=None,
+                     on_tracks=None, checkpoint=None, checkpoint_every=900, resume=None,
+                     timeline_interval=1.0, timeline_path=None, detection_log=None,
+                     detection_log_format='ndjson', render=None, render_path=None,
+                     evict_after=1800, imgsz=384, decode_threads=None):
         """
         Procesa un video y detecta vehículos
         
@@ -41,11 +73,49 @@ class VideoProcessor:
             conf_threshold: Confianza mínima de detección
             frame_skip: Procesar cada N frames
             on_progress: Callback para progreso
+            batch_size: Frames por pasada del modelo (ver perfil de hardware)
+            queue_size: Capacidad de la cola de frames decodificados
+            cancel_event: threading.Event que cancela el procesamiento
+            sample_fps: Frames por segundo de video a procesar (reemplaza frame_skip)
+            decode_mode: 'sparse' no decodifica los frames saltados; 'full' sí
+            seek_threshold: Saltos de al menos N frames usan seek al keyframe
+            anchor: Punto de la caja para asignar regiones ('top_left', 'center', 'bottom_center')
+            roi: Detectar solo dentro del rectángulo que contiene las regiones
+            roi_margin: Margen en píxeles alrededor de ese rectángulo
+            motion_gate: dict con opciones de MotionGate (o {} para los valores por
+                defecto) para saltar la inferencia en escenas estáticas; con
+                'regions_only' (por defecto True) solo se mira dentro de las regiones
+            start_frame: Primer frame (base 1) a procesar
+            end_frame: Último frame (inclusive) a procesar, o None hasta el final
+            count_start: Los frames anteriores solo alimentan al tracker y no se
+                cuentan (calentamiento del tracker en segmentos)
+            on_tracks: Callback(frame_index, tracks) por cada frame inferido
+            checkpoint: Callback(dict) con el estado para retomar, cada
+                `checkpoint_every` frames de video
+            resume: Checkpoint desde el que continuar un procesamiento interrumpido
+            timeline_interval: Segundos de video por intervalo del timeline
+            timeline_path: Archivo .npz donde guardar el timeline (ver timeline.Timeline)
+            detection_log: Archivo donde registrar cada detección de vehículo contada
+            detection_log_format: 'ndjson' o 'binary' (ver detection_log.RECORD_DTYPE)
+            render: dict con opciones de AnnotatedVideoWriter (o {} para los valores
+                por defecto) para dibujar tracks y regiones en un hilo codificador;
+                habilita la vista previa JPEG en self.renderer.preview
+            render_path: Archivo del video anotado (None: solo vista previa)
+            evict_after: Frames de video sin ver un track antes de desalojarlo del
+                contador (ver tracking.TrackTable); acota la memoria en videos largos
+            imgsz: Tamaño de entrada del modelo (ver perfil de hardware)
+            decode_threads: Hilos de FFmpeg para decodificar (None: los de OpenCV)
+        
+        Raises:
+            ProcessingCancelled: si se activa cancel_event
         
         Returns:
             dict con resultados
         """
-        cap = cv2.VideoCapture(video_path)
+        if decode_threads:
+            cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, int(decode_threads)])
+        else:
+            cap = cv2.VideoCapture(video_path)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         fps = cap.get(cv2.CAP_PROP_FPS)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -66,155 +136,356 @@ class VideoProcessor:
             'total_vehicles': 0,
             'vehicles_by_type': {},
             'vehicles_by_type_unique': {},
-            'vehicles_by_region': defaultdict(lambda: {'count': 0, 'types': {}, 'unique_ids': set()}),
-            'timeline': []
+            'vehicles_by_region': {},
+            'timeline': None
         }
         
-        frame_count = 0
-        vehicle_ids = set()
-        vehicle_ids_by_type = defaultdict(set)
-        vehicle_detections_by_type = defaultdict(int)
+        self.counter = counter = VehicleCounter(
+            self.vehicle_classes, regions, (width, height), anchor, evict_after
+        )
+        # Conteos por intervalo de tiempo, en columnas NumPy; con timeline_path
+        # los intervalos cerrados se vuelcan a disco junto al .npz
+        self.timeline = counter.timeline = Timeline(
+            counter.vehicle_types, len(counter.regions), fps, timeline_interval, total_frames,
+            spill_path=timeline_path
+        )
+        count_start = count_start or start_frame
         
-        # Pre-compilar regiones si existen
-        polygon_points = None
-        if regions:
-            polygon_points = [np.array([region], np.int32) for region in regions]
+        # Retomar: se restauran los conteos y se re-procesan sin contar los
+        # últimos frames del checkpoint para emparejar los tracks en curso con
+        # sus IDs originales (así no se cuentan dos veces)
+        first_id = 1
+        resume_tail = None
+        warmup_boxes = {}
+        id_map = {}
+        if resume:
+            counter.load_state(resume['state'])
+            if resume.get('timeline'):
+                self.timeline.load_state(resume['timeline'])
+            first_id = resume['next_id']
+            count_start = resume['frame_index'] + 1
+            resume_tail = {
+                int(track_id): {int(f): box for f, box in boxes.items()}
+                for track_id, boxes in resume['tail'].items()
+            }
+            tail_frames = [f for boxes in resume_tail.values() for f in boxes]
+            start_frame = min(tail_frames) if tail_frames else count_start
+            results['resumed_from'] = resume['frame_index']
         
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
-            
-            frame_count += 1
-            
-            # Saltar frames según configuración
-            if frame_count % frame_skip != 0:
-                continue
-            
-            # Redimensionar si es necesario
-            if scale_factor < 1.0:
-                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
-            
-            # Detectar con imgsz optimizado
-            detections = self.model.track(
-                frame, 
-                persist=True, 
-                conf=conf_threshold,
-                imgsz=384,  # Tamaño optimizado para velocidad
-                verbose=False
+        # Registro de detecciones (cajas en coordenadas del video original)
+        self.detection_log = None
+        self.renderer = None
+        if detection_log:
+            self.detection_log = DetectionLogWriter(
+                detection_log,
+                detection_log_format,
+                class_names=self.vehicle_classes,
+                fps=fps,
+                scale=1.0 / scale_factor,
+                offset=resume.get('detection_log_offset') if resume else None,
+                rows=resume.get('detection_log_rows', 0) if resume else 0
             )
-            
-            if detections and len(detections) > 0:
-                result = detections[0]
+        
+        # Video anotado y vista previa: dibujo y codificación fuera de este hilo
+        self.renderer = None
+        if render is not None:
+            render_options = dict(render)
+            processed_fps = sample_fps or (fps / max(1, frame_skip) if fps > 0 else 30.0)
+            self.renderer = AnnotatedVideoWriter(
+                lambda frame, tracks: self.annotate_frame(frame, tracks, regions),
+                path=render_path,
+                fps=processed_fps / max(1, int(render_options.get('every', 1))),
+                source_fps=fps if fps > 0 else None,
+                size=(width, height),
+                **render_options
+            )
+        
+        # Tracker nuevo por video: los IDs no se comparten entre jobs
+        self.tracker = TrackerSession(self.tracker_cfg, first_id=first_id)
+        recent_tracks = deque(maxlen=5)
+        last_checkpoint = count_start
+        
+        # ROI: la inferencia solo ve el recorte que contiene las regiones, con
+        # imgsz reducido en proporción para mantener la escala de los vehículos
+        crop = roi_bounds(regions, width, height, roi_margin) if roi else None
+        if crop:
+            x0, y0, x1, y1 = crop
+            fraction = max(x1 - x0, y1 - y0) / max(width, height)
+            imgsz = max(32, int(np.ceil(imgsz * fraction / 32)) * 32)
+            results['roi'] = list(crop)
+        
+        gate = None
+        if motion_gate is not None:
+            gate_options = dict(motion_gate)
+            regions_only = gate_options.pop('regions_only', True)
+            mask = counter.region_mask.union() if regions_only and counter.region_mask else None
+            gate = MotionGate(mask=mask, **gate_options)
+        
+        # Tiempos por etapa: histogramas globales (/api/metrics) y desglose del job
+        self.stage_timer = timer = StageTimer()
+        
+        # Decodificación y redimensionado corren en hilos propios mientras
+        # este hilo hace inferencia y conteo
+        self.pipeline = FramePipeline(
+            cap,
+            frame_skip=frame_skip,
+            size=(width, height) if scale_factor < 1.0 else None,
+            batch_size=batch_size,
+            queue_size=queue_size,
+            cancel_event=cancel_event,
+            sample_fps=sample_fps,
+            decode_mode=decode_mode,
+            seek_threshold=seek_threshold,
+            gate=gate,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            timer=timer
+        )
+        
+        # 'wait' es el tiempo esperando lotes del pipeline (alto: la
+        # decodificación es el cuello de botella)
+        clock = time.perf_counter
+        
+        with self.pipeline, self.detection_log or nullcontext(), self.renderer or nullcontext():
+            waited = clock()
+            for batch in self.pipeline:
+                started = clock()
+                timer.add('wait', started - waited)
+                frames = [frame for _, frame in batch]
+                detections = self._detect_batch(frames, conf_threshold, imgsz, crop)
+                timer.add('inference', clock() - started)
+                count_frames(len(batch))
                 
-                if result.boxes is not None and len(result.boxes) > 0:
-                    boxes_xyxy = result.boxes.xyxy.cpu().numpy()
-                    boxes_id = result.boxes.id.int().cpu().numpy() if result.boxes.id is not None else []
-                    boxes_cls = result.boxes.cls.int().cpu().numpy()
-                    
-                    # Vectorizar procesamiento
-                    for i, class_id in enumerate(boxes_cls):
-                        class_id = int(class_id)
-                        if class_id not in self.vehicle_classes:
-                            continue
-                        
-                        track_id = int(boxes_id[i]) if i < len(boxes_id) else -1
-                        if track_id == -1:
-                            continue
-                            
-                        vehicle_type = self.vehicle_classes[class_id]
-                        
-                        vehicle_ids.add(track_id)
-                        vehicle_ids_by_type[vehicle_type].add(track_id)
-                        vehicle_detections_by_type[vehicle_type] += 1
-                        
-                        # Verificar regiones solo si existen
-                        if regions and polygon_points:
-                            box = boxes_xyxy[i]
-                            point = (box[0], box[1])
-                            for idx, region in enumerate(regions):
-                                if self._point_in_polygon_fast(point, region):
-                                    results['vehicles_by_region'][f'region_{idx}']['count'] += 1
-                                    results['vehicles_by_region'][f'region_{idx}']['unique_ids'].add(track_id)
-                                    results['vehicles_by_region'][f'region_{idx}']['types'][vehicle_type] = \
-                                        results['vehicles_by_region'][f'region_{idx}']['types'].get(vehicle_type, 0) + 1
+                # Una pasada por lote; el tracker recibe los frames en orden
+                for (frame_index, frame), boxes in zip(batch, detections):
+                    started = clock()
+                    tracks = self.tracker.update(boxes, frame)
+                    tracked = clock()
+                    timer.add('tracking', tracked - started)
+                    if frame_index < count_start:
+                        if resume_tail is not None:
+                            record_boxes(warmup_boxes, frame_index, tracks)
+                    else:
+                        if resume_tail is not None:
+                            id_map = {new: old for old, new in match_tracks(resume_tail, warmup_boxes)}
+                            resume_tail = None
+                        if id_map:
+                            tracks[:, 4] = [id_map.get(int(i), i) for i in tracks[:, 4]]
+                        counter.add_tracks(tracks, frame_index)
+                        counted = clock()
+                        timer.add('regions', counted - tracked)
+                        if self.detection_log:
+                            self.detection_log.write(frame_index, counter.vehicle_tracks(tracks))
+                        if self.renderer:
+                            self.renderer.submit(frame, tracks, frame_index)
+                        timer.add('output', clock() - counted)
+                        recent_tracks.append((frame_index, tracks))
+                    if on_tracks:
+                        on_tracks(frame_index, tracks)
+                
+                last_frame = batch[-1][0]
+                if checkpoint and last_frame >= count_start and \
+                        last_frame - last_checkpoint >= checkpoint_every:
+                    checkpoint(self._make_checkpoint(last_frame, recent_tracks))
+                    last_checkpoint = last_frame
+                
+                if on_progress:
+                    on_progress(last_frame, total_frames)
+                waited = clock()
             
-            if on_progress:
-                on_progress(frame_count, total_frames)
+            # Frames finales sin inferencia (motion gate): el video anotado llega al final
+            if self.renderer and total_frames:
+                self.renderer.pad_to(min(end_frame or total_frames, total_frames))
+        
+        results['pipeline'] = self.pipeline.get_queue_depths()
+        results['decode'] = self.pipeline.get_decode_stats()
+        if gate is not None:
+            results['motion_gate'] = gate.get_stats()
+        if self.renderer:
+            results['render'] = self.renderer.get_stats()
+        results.update(counter.summary())
+        results['track_table'] = counter.tracks.get_stats()
+        results['timeline'] = self.timeline.summary()
+        if timeline_path:
+            with timer.time('serialization'):
+                self.timeline.save(timeline_path)
+                self.timeline.discard_spill()
+        results['stages'] = timer.summary()
+        if self.detection_log:
+            results['detection_log'] = {
+                'format': detection_log_format,
+                'rows': self.detection_log.rows,
+                'bytes': os.path.getsize(detection_log),
+                'classes': self.vehicle_classes
+            }
+        
+        return results
+    
+    def process_stream(self, source, regions=None, conf_threshold=0.5, loop=False,
+                       stop_event=None, anchor='top_left', roi=False, roi_margin=16,
+                       windows=DEFAULT_WINDOWS, track_ttl=60.0, reconnect_delay=2.0,
+                       max_reconnects=None, imgsz=384):
+        """
+        Procesa un stream continuo (cámara RTSP/HTTP o archivo en bucle) hasta
+        que se activa stop_event o el stream termina
+        
+        Siempre se infiere sobre el frame más reciente: si la inferencia se
+        atrasa se descartan frames en lugar de acumular latencia. Los conteos
+        quedan en self.counter (RollingVehicleCounter) y las estadísticas en
+        self.stream_stats, ambos legibles desde otro hilo mientras corre.
+        
+        Args:
+            source: URL del stream o ruta de un archivo local
+            loop: Reproducir el archivo en bucle a tiempo real
+            stop_event: threading.Event que detiene el procesamiento
+            windows: Segundos de cada ventana deslizante de conteo
+            track_ttl: Segundos sin ver un track antes de olvidar su ID
+            reconnect_delay: Espera antes de reabrir un stream caído
+            max_reconnects: Reintentos seguidos antes de terminar (None: sin límite)
+            imgsz: Tamaño de entrada del modelo
+        
+        Returns:
+            dict con el resumen final de conteos y estadísticas
+        """
+        stop_event = stop_event or threading.Event()
+        reader = LatestFrameReader(source, loop=loop, reconnect_delay=reconnect_delay,
+                                   max_reconnects=max_reconnects)
+        fps = reader.fps if reader.fps > 0 else 30.0
+        width, height = reader.width, reader.height
         
-        cap.release()
+        scale_factor = 1.0
+        if width > 1280 or height > 720:
+            scale_factor = 0.5
+            width = int(width * scale_factor)
+            height = int(height * scale_factor)
         
-        # Contar vehículos ÚNICOS por tipo
-        for vehicle_type, track_ids in vehicle_ids_by_type.items():
-            results['vehicles_by_type_unique'][vehicle_type] = len(track_ids)
+        self.counter = counter = RollingVehicleCounter(
+            self.vehicle_classes, regions, (width, height), anchor, windows, track_ttl
+        )
+        self.tracker = TrackerSession(self.tracker_cfg, frame_rate=int(round(fps)))
         
-        # Contar detecciones (instancias) por tipo
-        results['vehicles_by_type'] = dict(vehicle_detections_by_type)
+        crop = roi_bounds(regions, width, height, roi_margin) if roi else None
+        if crop:
+            x0, y0, x1, y1 = crop
+            fraction = max(x1 - x0, y1 - y0) / max(width, height)
+            imgsz = max(32, int(np.ceil(imgsz * fraction / 32)) * 32)
         
-        # Total de vehículos únicos
-        results['total_vehicles'] = len(vehicle_ids)
+        stats = self.stream_stats = {
+            'source_fps': fps,
+            'width': width,
+            'height': height,
+            'processed': 0,
+            'latency_ms': 0.0,
+            'processing_fps': 0.0,
+            'reader': reader.stats
+        }
+        started = time.monotonic()
+        self.stage_timer = timer = StageTimer()
         
-        # Convertir region IDs a conteo único
-        for region_key in results['vehicles_by_region']:
-            unique_count = len(results['vehicles_by_region'][region_key]['unique_ids'])
-            results['vehicles_by_region'][region_key]['unique_count'] = unique_count
-            del results['vehicles_by_region'][region_key]['unique_ids']
+        with reader:
+            while not stop_event.is_set():
+                item = reader.get(timeout=1.0)
+                if item is None:
+                    if reader.finished:
+                        break
+                    continue
+                
+                _, captured_at, frame = item
+                if scale_factor < 1.0:
+                    with timer.time('resize'):
+                        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+                
+                with timer.time('inference'):
+                    boxes = self._detect_batch([frame], conf_threshold, imgsz, crop)[0]
+                count_frames(1, source='stream')
+                with timer.time('tracking'):
+                    tracks = self.tracker.update(boxes, frame)
+                with timer.time('regions'):
+                    counter.add_tracks(tracks, captured_at)
+                
+                # Latencia captura -> conteo (media móvil exponencial)
+                latency = (time.time() - captured_at) * 1000
+                stats['latency_ms'] = round(0.9 * stats['latency_ms'] + 0.1 * latency, 1) \
+                    if stats['processed'] else round(latency, 1)
+                stats['processed'] += 1
+                stats['processing_fps'] = round(stats['processed'] / max(1e-6, time.monotonic() - started), 2)
         
-        results['vehicles_by_region'] = dict(results['vehicles_by_region'])
+        if reader.error is not None:
+            raise reader.error
         
+        results = counter.summary()
+        results['stream'] = dict(stats, reader=dict(reader.stats))
+        results['stages'] = timer.summary()
         return results
     
-    @staticmethod
-    def _point_in_polygon_fast(point, polygon):
-        """Versión vectorizada rápida de detección punto en polígono"""
-        x, y = point
-        n = len(polygon)
-        inside = False
-        
-        p1x, p1y = polygon[0]
-        for i in range(1, n + 1):
-            p2x, p2y = polygon[i % n]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        
-        return inside
-
-    @staticmethod
-    def _point_in_polygon(point, polygon):
-        """Verifica si un punto está dentro de un polígono"""
-        return VideoProcessor._point_in_polygon_fast(point, polygon)
+    def _make_checkpoint(self, frame_index, recent_tracks):
+        """Estado serializable para retomar después de `frame_index`"""
+        tail = {}
+        for tail_frame, tracks in recent_tracks:
+            record_boxes(tail, tail_frame, tracks)
+        return {
+            'frame_index': frame_index,
+            'state': self.counter.get_state(),
+            'timeline': self.timeline.checkpoint_state(),
+            'tail': tail,
+            'next_id': self.tracker.last_id + 1,
+            # Al retomar se descarta lo registrado después del checkpoint
+            'detection_log_offset': self.detection_log.sync() if self.detection_log else None,
+            'detection_log_rows': self.detection_log.rows if self.detection_log else 0
+        }
     
-    def annotate_frame(self, frame, detections, regions=None):
-        """Anotación de frame con detecciones y regiones"""
-        result = detections[0] if detections else None
+    def get_queue_depths(self):
+        """Ocupación de las colas del pipeline en curso (o del último video)"""
+        return self.pipeline.get_queue_depths() if self.pipeline else {}
+    
+    def _detect_batch(self, frames, conf_threshold, imgsz=384, crop=None):
+        """
+        Detecta en un lote de frames con una sola pasada del modelo
+        
+        Args:
+            crop: (x0, y0, x1, y1) para detectar solo en ese recorte; las cajas
+                se devuelven en coordenadas del frame completo
         
+        Returns:
+            Lista de Detections, una por frame
+        """
+        offset = (0, 0)
+        if crop:
+            x0, y0, x1, y1 = crop
+            frames = [frame[y0:y1, x0:x1] for frame in frames]
+            offset = (x0, y0)
+        
+        detections = self.model.predict(
+            frames,
+            conf=conf_threshold,
+            imgsz=imgsz,  # Tamaño optimizado para velocidad
+            verbose=False
+        )
+        return [Detections.from_boxes(result.boxes, offset) for result in detections]
+    
+    def annotate_frame(self, frame, tracks, regions=None):
+        """
+        Anotación de frame con tracks y regiones
+        
+        Args:
+            tracks: np.ndarray (N, >=7) con [x1, y1, x2, y2, track_id, conf, cls, ...]
+        """
         # Dibujar regiones
         if regions:
             for region in regions:
-                pts = np.array([region], np.int32)
-                cv2.polylines(frame, pts, True, (0, 255, 0), 2)
-        
-        # Dibujar detecciones
-        if result and result.boxes is not None:
-            for box, track_id, conf, class_id in zip(
-                result.boxes.xyxy.cpu(),
-                result.boxes.id.int().cpu() if result.boxes.id is not None else [],
-                result.boxes.conf.cpu(),
-                result.boxes.cls.int().cpu()
-            ):
-                x1, y1, x2, y2 = map(int, box)
-                class_id = int(class_id)
-                
-                if class_id in self.vehicle_classes:
-                    label = f"{self.vehicle_classes[class_id]} {int(track_id)} {float(conf):.2f}"
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(frame, label, (x1, y1 - 10),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                # Pares [[x, y], ...] o lista plana [x1, y1, x2, y2, ...]
+                pts = np.asarray(region, np.float64).round().astype(np.int32).reshape(-1, 1, 2)
+                cv2.polylines(frame, [pts], True, (0, 255, 0), 2)
+        
+        # Dibujar tracks de vehículos
+        for x1, y1, x2, y2, track_id, conf, class_id in tracks[:, :7].tolist():
+            class_id = int(class_id)
+            
+            if class_id in self.vehicle_classes:
+                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                label = f"{self.vehicle_classes[class_id]} {int(track_id)} {conf:.2f}"
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.putText(frame, label, (x1, y1 - 10),
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
         
         return frame
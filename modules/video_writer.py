@@ -0,0 +1,205 @@
+"""
+Video Writer - Video anotado y vista previa MJPEG en un hilo de codificación
+"""
+import queue
+import threading
+import time
+
+import cv2
+
+_END = object()
+
+
+class PreviewFrame:
+    """Último JPEG de vista previa; los clientes esperan a que cambie"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self.closed = False
+
+    def update(self, jpeg):
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def wait(self, after=0, timeout=10):
+        """
+        Returns:
+            (seq, jpeg) más nuevo que `after`, o None si no cambió (o terminó)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after or self.closed, timeout)
+            if self._seq > after:
+                return self._seq, self._jpeg
+            return None
+
+
+class AnnotatedVideoWriter:
+    """
+    Dibuja y codifica frames anotados en un hilo propio
+
+    El hilo de inferencia solo encola (frame, tracks); el dibujo, el
+    redimensionado y cv2.VideoWriter corren en el hilo codificador. La cola
+    es acotada: si el codificador se atrasa de forma sostenida, la inferencia
+    espera (el tiempo de espera queda en las estadísticas).
+
+    Con `source_fps` cada frame va al instante de su índice en el video
+    original: los huecos (frame_skip, sample_fps, motion gate) se rellenan
+    repitiendo el frame anterior, así el video dura lo mismo que el original.
+    """
+
+    def __init__(self, draw, path=None, fps=30.0, source_fps=None, size=None, scale=1.0, every=1,
+                 codec='mp4v', queue_size=32, preview_width=480, preview_quality=60,
+                 preview_interval=0.5):
+        """
+        Args:
+            draw: Callable(frame, tracks) que dibuja sobre el frame
+            path: Archivo de video de salida (None: solo vista previa)
+            fps: FPS del video de salida
+            source_fps: FPS del video original (ubica los frames por su índice)
+            size: (ancho, alto) de los frames recibidos
+            scale: Escala del video de salida (p.ej. 0.5)
+            every: Escribir solo uno de cada N frames recibidos (sin source_fps;
+                con él ya está incluido en `fps`)
+            preview_width: Ancho del JPEG de vista previa
+            preview_interval: Segundos mínimos entre JPEGs de vista previa
+        """
+        self.draw = draw
+        self.path = path
+        self.fps = fps
+        self.source_fps = source_fps
+        self.every = max(1, int(every))
+        self.preview_width = preview_width
+        self.preview_quality = preview_quality
+        self.preview_interval = preview_interval
+        self.preview = PreviewFrame()
+
+        self.out_size = None
+        self._writer = None
+        if path:
+            width, height = size
+            self.out_size = (max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2))
+            self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, self.out_size)
+            if not self._writer.isOpened():
+                raise RuntimeError(f"No se pudo abrir el video de salida: {path}")
+
+        self._received = 0
+        self._first_index = None
+        self._last_slot = -1
+        self._last_out = None
+        self._last_preview = 0.0
+        self._error = None
+        self.stats = {'written': 0, 'repeated': 0, 'previews': 0, 'wait_s': 0.0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name='video-encoder', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def submit(self, frame, tracks, frame_index=None):
+        """Encola un frame procesado (el frame no debe modificarse después)"""
+        self._received += 1
+        repeat = 0
+        if self._writer is None:
+            write = False
+        elif frame_index is None or not self.source_fps:
+            write = (self._received - 1) % self.every == 0
+        else:
+            if self._first_index is None:
+                self._first_index = frame_index
+            slot = self._slot(frame_index)
+            write = slot > self._last_slot
+            if write:
+                repeat = max(0, slot - self._last_slot - 1) if self._last_slot >= 0 else 0
+                self._last_slot = slot
+        preview = time.monotonic() - self._last_preview >= self.preview_interval
+        if not (write or preview):
+            return
+        if preview:
+            self._last_preview = time.monotonic()
+        if self._error is not None:
+            raise self._error
+
+        started = time.perf_counter()
+        self._queue.put((frame, tracks, write, preview, repeat))
+        self.stats['wait_s'] += time.perf_counter() - started
+
+    def pad_to(self, frame_index):
+        """Repite el último frame escrito hasta el instante de `frame_index`"""
+        if self._writer is None or not self.source_fps or self._last_slot < 0:
+            return
+        slot = self._slot(frame_index)
+        if slot > self._last_slot:
+            self._queue.put((None, None, False, False, slot - self._last_slot))
+            self._last_slot = slot
+
+    def _slot(self, frame_index):
+        # Posición en el video de salida según el tiempo del frame en el original
+        return int((frame_index - self._first_index) * self.fps / self.source_fps + 1e-6)
+
+    def close(self):
+        self._queue.put(_END)
+        self._thread.join()
+        if self._writer is not None:
+            self._writer.release()
+        self.preview.close()
+        if self._error is not None:
+            raise self._error
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['wait_s'] = round(stats['wait_s'], 3)
+        stats['size'] = list(self.out_size) if self.out_size else None
+        return stats
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._encode(*item)
+            except Exception as e:
+                self._error = e
+
+    def _encode(self, frame, tracks, write, preview, repeat=0):
+        # Hueco desde el último frame escrito: se mantiene ese frame en pantalla
+        if repeat and self._last_out is not None:
+            for _ in range(repeat):
+                self._writer.write(self._last_out)
+            self.stats['repeated'] += repeat
+        if frame is None:
+            return
+        self.draw(frame, tracks)
+
+        if write:
+            if (frame.shape[1], frame.shape[0]) != self.out_size:
+                out = cv2.resize(frame, self.out_size, interpolation=cv2.INTER_AREA)
+            else:
+                out = frame
+            self._writer.write(out)
+            self._last_out = out
+            self.stats['written'] += 1
+
+        if preview:
+            height = int(frame.shape[0] * self.preview_width / frame.shape[1])
+            small = cv2.resize(frame, (self.preview_width, height), interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, self.preview_quality])
+            if ok:
+                self.preview.update(jpeg.tobytes())
+                self.stats['previews'] += 1
@@ -12,6 +12,7 @@ class DataTrackApp {
         this.jobId = null;
         this.currentResults = null;
         this.typeChart = null;
+        this.progressStream = null;
         
         this.init();
     }
@@ -254,26 +255,62 @@ class DataTrackApp {
         this.updatePolygonsList();
     }
     
+    async uploadVideo(file) {
+        // Subida por partes: ante un corte se consulta el offset y se continúa
+        const createResponse = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        
+        const upload = await createResponse.json();
+        if (!upload.success) return upload;
+        
+        let offset = 0;
+        let retries = 0;
+        while (true) {
+            const chunk = file.slice(offset, offset + upload.chunk_size);
+            try {
+                const response = await fetch(`/api/uploads/${upload.upload_id}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: chunk
+                });
+                const data = await response.json();
+                if (data.filename) return data;
+                
+                if (data.success) {
+                    offset = data.offset;
+                    retries = 0;
+                    const percent = Math.round(offset / file.size * 100);
+                    document.getElementById('progressPercent').textContent = `Subiendo ${percent}%`;
+                    continue;
+                }
+                if (response.status === 404) return data;
+            } catch (e) {
+                console.warn('Error subiendo parte, reintentando...', e);
+            }
+            
+            if (++retries > 5) return { success: false, error: 'Upload interrupted' };
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+            
+            const status = await fetch(`/api/uploads/${upload.upload_id}`).then(r => r.json()).catch(() => null);
+            if (status && status.success) offset = status.offset;
+        }
+    }
+    
     async processVideo() {
         if (!this.videoFile) {
             alert('Carga un video primero');
             return;
         }
         
-        // Upload video
-        const formData = new FormData();
-        formData.append('video', this.videoFile);
-        
         document.getElementById('processBtn').disabled = true;
         document.getElementById('progressContainer').classList.remove('hidden');
         
         try {
-            const uploadResponse = await fetch('/api/upload', {
-                method: 'POST',
-                body: formData
-            });
-            
-            const uploadData = await uploadResponse.json();
+            // Upload video
+            const uploadData = await this.uploadVideo(this.videoFile);
             if (!uploadData.success) {
                 alert('Error al subir video: ' + uploadData.error);
                 return;
@@ -301,7 +338,7 @@ class DataTrackApp {
             }
             
             this.jobId = processData.job_id;
-            this.pollStatus();
+            this.watchProgress();
             
         } catch (e) {
             alert('Error: ' + e.message);
@@ -310,32 +347,59 @@ class DataTrackApp {
         }
     }
     
-    async pollStatus() {
+    watchProgress() {
         if (!this.jobId) return;
         
-        try {
-            const response = await fetch(`/api/status/${this.jobId}`);
-            const data = await response.json();
+        // El servidor empuja el progreso (SSE) en lugar de consultar /api/status
+        if (this.progressStream) this.progressStream.close();
+        const stream = new EventSource(`/api/events/${this.jobId}`);
+        this.progressStream = stream;
+        
+        stream.onmessage = (e) => {
+            const data = JSON.parse(e.data);
             
-            if (data.status === 'processing') {
+            if (data.status === 'queued') {
+                document.getElementById('progressPercent').textContent = `En cola (#${data.queue_position})`;
+            } else if (data.status === 'processing') {
                 const progress = Math.min(data.progress, 99);
                 document.getElementById('progressFill').style.width = progress + '%';
                 document.getElementById('progressPercent').textContent = Math.round(progress) + '%';
+                this.showProgressDetails(data);
+            } else {
+                stream.close();
+                this.progressStream = null;
+                document.getElementById('progressDetails').textContent = '';
                 
-                setTimeout(() => this.pollStatus(), 500);
-            } else if (data.status === 'completed') {
-                document.getElementById('progressFill').style.width = '100%';
-                document.getElementById('progressPercent').textContent = '100%';
-                
-                this.loadResults();
-            } else if (data.status === 'error') {
-                alert('Error en procesamiento: ' + data.error);
-                document.getElementById('progressContainer').classList.add('hidden');
-                document.getElementById('processBtn').disabled = false;
+                if (data.status === 'completed') {
+                    document.getElementById('progressFill').style.width = '100%';
+                    document.getElementById('progressPercent').textContent = '100%';
+                    
+                    this.loadResults();
+                } else if (data.status === 'error') {
+                    alert('Error en procesamiento: ' + data.error);
+                    document.getElementById('progressContainer').classList.add('hidden');
+                    document.getElementById('processBtn').disabled = false;
+                } else if (data.status === 'cancelled') {
+                    document.getElementById('progressContainer').classList.add('hidden');
+                    document.getElementById('processBtn').disabled = false;
+                }
             }
-        } catch (e) {
-            console.error('Error polling status:', e);
+        };
+        
+        // EventSource reconecta solo; retoma desde el último evento recibido
+        stream.onerror = () => console.warn('Stream de progreso interrumpido, reconectando...');
+    }
+    
+    showProgressDetails(data) {
+        const parts = [];
+        if (data.fps) parts.push(`${data.fps} fps`);
+        if (data.eta_s != null) {
+            const minutes = Math.floor(data.eta_s / 60);
+            const seconds = Math.round(data.eta_s % 60).toString().padStart(2, '0');
+            parts.push(`ETA ${minutes}:${seconds}`);
         }
+        if (data.counts) parts.push(`${data.counts.total_vehicles} vehículos`);
+        document.getElementById('progressDetails').textContent = parts.join(' · ');
     }
     
     async loadResults() {